@@ -6,9 +6,14 @@ from fastapi.responses import JSONResponse
 
 class InvalidInputException(Exception):
     def __init__(self, name: str, value: str):
+        super().__init__(f"Error reading {name}, check again: {value}")
         self.name = name
         self.value = value
 
+    def __reduce__(self):
+        # Pickled with its arguments, to be raised again by the model service clients
+        return (InvalidInputException, (self.name, self.value))
+
 
 async def input_exception_handler(request: Request, exc: InvalidInputException):
     """Custom exception handler for InvalidInputException.
@@ -24,3 +29,28 @@ async def input_exception_handler(request: Request, exc: InvalidInputException):
         status_code=422,
         content={"detail": f"Error reading {exc.name}, check again: {exc.value}"},
     )
+
+
+class ServiceOverloadedException(Exception):
+    def __init__(self, name: str, retry_after: int = 1):
+        self.name = name
+        self.retry_after = retry_after
+
+
+async def overload_exception_handler(
+    request: Request, exc: ServiceOverloadedException
+):
+    """Custom exception handler for ServiceOverloadedException.
+
+    Args:
+        request (Request): The FastAPI Request object.
+        exc (ServiceOverloadedException): The ServiceOverloadedException instance.
+
+    Returns:
+        JSONResponse: A 503 response telling the client when to retry.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"The {exc.name} queue is full, try again later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
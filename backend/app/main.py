@@ -1,18 +1,30 @@
 from __future__ import annotations
 
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi import status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.responses import RedirectResponse
 from fastapi_versioning import VersionedFastAPI
 
 from .routers import stout
 from .routers import decimer
+from .routers import depict
+from .routers import jobs
 from app.exception_handlers import input_exception_handler
 from app.exception_handlers import InvalidInputException
+from app.exception_handlers import overload_exception_handler
+from app.exception_handlers import ServiceOverloadedException
+from app.modules import decimer_wrapper
+from app.modules import engines
+from app.modules import executor
+from app.modules import jobs as job_queue
+from app.modules import loader
 from app.schemas.healthcheck import HealthCheck
+from app.schemas.healthcheck import ReadinessCheck
 
 app = FastAPI(
     title="STOUT API Microservice",
@@ -31,12 +43,35 @@ app = FastAPI(
 
 app.include_router(stout.router)
 app.include_router(decimer.router)
+app.include_router(jobs.router)
+app.include_router(depict.router)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop the API.
+
+    Loads the models according to STARTUP_MODE (eager, background or lazy)
+    and runs the local bulk translation workers (STOUT_JOB_WORKERS) until
+    shutdown.
+    """
+    if loader.startup_mode == "eager":
+        loader.load_all()
+    elif loader.startup_mode == "background":
+        loader.start_background_loading()
+    job_workers = []
+    if job_queue.job_workers > 0:
+        job_workers = job_queue.start_workers(job_queue.job_workers)
+    yield
+    job_queue.stop_workers(job_workers)
+
 
 app = VersionedFastAPI(
     app,
     version_format="{major}",
     prefix_format="/v{major}",
     enable_latest=True,
+    lifespan=lifespan,
     terms_of_service="https://decimer.ai",
     contact={
         "name": "Kohulan Rajan",
@@ -79,6 +114,10 @@ for sub_app in app.routes:
             InvalidInputException,
             input_exception_handler,
         )
+        sub_app.app.add_exception_handler(
+            ServiceOverloadedException,
+            overload_exception_handler,
+        )
 
 
 @app.get("/", include_in_schema=False)
@@ -105,3 +144,72 @@ def get_health() -> HealthCheck:
         HealthCheck: Returns a JSON response with the health status
     """
     return HealthCheck(status="OK")
+
+
+@app.get(
+    "/ready",
+    tags=["healthcheck"],
+    summary="Perform a Readiness Check",
+    response_description="Return HTTP Status Code 200 (OK) once the models are loaded",
+    status_code=status.HTTP_200_OK,
+    response_model=ReadinessCheck,
+    responses={503: {"description": "Models are still loading", "model": ReadinessCheck}},
+)
+def get_ready():
+    """## Perform a Readiness Check.
+
+    Unlike /health, this endpoint returns 503 (Service Unavailable) until the
+    STOUT and DECIMER models, the tokenizers and the OPSIN JVM are loaded, so an
+    orchestrator only routes traffic to containers that can answer right away.
+    With STARTUP_MODE=lazy the service is ready immediately and each component
+    is loaded on its first use.
+    Returns:
+        ReadinessCheck: Returns the readiness and the load status of every component
+    """
+    readiness = ReadinessCheck(
+        ready=loader.is_ready(), mode=loader.startup_mode, components=loader.status()
+    )
+    return JSONResponse(
+        status_code=status.HTTP_200_OK
+        if readiness.ready
+        else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=readiness.model_dump(),
+    )
+
+
+@app.get(
+    "/queues",
+    tags=["healthcheck"],
+    summary="Report the inference queue depths",
+    response_description="Queue depth of every engine and worker pool",
+    status_code=status.HTTP_200_OK,
+)
+def get_queues() -> dict:
+    """## Report the inference queue depths.
+
+    Endpoint an orchestrator can scale on. `queue_depth` is the total number of
+    molecules and tasks waiting across all engines and worker pools; requests
+    are rejected with 503 and a `Retry-After` header once a queue is full.
+    The DECIMER interpreter pool is reported once it is loaded in this process.
+    Returns:
+        dict: Total queue depth and statistics per engine and pool
+    """
+    engine_stats = engines.stats()
+    pool_stats = {
+        pool.name: pool.stats()
+        for pool in (
+            executor.model_pool,
+            executor.opsin_pool,
+            executor.rdkit_pool,
+            executor.image_pool,
+        )
+    }
+    return {
+        "queue_depth": sum(
+            stats["queue_depth"]
+            for stats in [*engine_stats.values(), *pool_stats.values()]
+        ),
+        "engines": engine_stats,
+        "pools": pool_stats,
+        "decimer_interpreters": decimer_wrapper.stats(),
+    }
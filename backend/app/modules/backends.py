@@ -0,0 +1,181 @@
+"""Inference backends of the STOUT translators.
+
+Every backend loads an exported translator as a callable with the
+signature of the SavedModel: it takes a batch of padded token ids and
+returns the predicted token ids and their confidence. STOUT_BACKEND selects
+the backend:
+
+- savedmodel: the TensorFlow SavedModel as downloaded.
+- tflite: a TFLite conversion with float weights.
+- tflite-dynamic: a TFLite conversion with dynamic-range quantized weights.
+- onnx: an ONNX conversion run by ONNX Runtime, which has to be installed.
+
+The conversions are created next to the SavedModels with:
+    python -m app.modules.convert_models --backend tflite-dynamic
+
+The converted backends have not been validated against the SavedModel on
+the trained weights yet, so STOUT_BACKEND only accepts them with
+STOUT_EXPERIMENTAL_BACKENDS=1. Compare them first with:
+    python -m benchmarks.backends
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+stout_backend = os.getenv("STOUT_BACKEND", "savedmodel")
+# Allow STOUT_BACKEND to select a backend that has not been validated
+experimental_backends = os.getenv("STOUT_EXPERIMENTAL_BACKENDS", "0") == "1"
+# Backends whose accuracy has been checked against the SavedModel
+validated_backends = ("savedmodel",)
+# Threads of the TFLite and ONNX Runtime backends, 0 for the runtime default
+backend_threads = int(os.getenv("STOUT_BACKEND_THREADS", "0"))
+
+# File name suffix of each converted backend
+backend_suffixes: Dict[str, str] = {
+    "tflite": ".tflite",
+    "tflite-dynamic": ".dynamic.tflite",
+    "onnx": ".onnx",
+}
+
+
+def backend_path(saved_model_path: str, backend: str) -> str:
+    """Returns the path of a translator for a backend.
+
+    Args:
+        saved_model_path (str): Directory of the SavedModel, e.g. models/translator_forward.
+        backend (str): Name of the backend.
+
+    Returns:
+        str: The SavedModel directory or the converted model file next to it.
+    """
+    if backend == "savedmodel":
+        return saved_model_path
+    if backend not in backend_suffixes:
+        raise ValueError(f"Unknown STOUT backend {backend!r}")
+    return saved_model_path.rstrip("/") + backend_suffixes[backend]
+
+
+def _sorted_outputs(outputs: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    # Converted tuple outputs are named output_0, output_1: token ids, then confidence
+    values = [outputs[name] for name in sorted(outputs)]
+    return values[0], values[1] if len(values) > 1 else None
+
+
+class TFLiteTranslator:
+    """A translator converted to TFLite.
+
+    Interpreters are not thread-safe, calls are serialized. Batch size and
+    sequence length are resized on every call by the signature runner.
+
+    Args:
+        path (str): Path of the .tflite file.
+        num_threads (int, optional): Interpreter threads, 0 for the default.
+    """
+
+    def __init__(self, path: str, num_threads: int = 0):
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(
+            model_path=path, num_threads=num_threads or None
+        )
+        self.runner = self.interpreter.get_signature_runner()
+        ((self.input_name, details),) = self.runner.get_input_details().items()
+        self.input_type = details["dtype"]
+        shape = details["shape_signature"]
+        self.single_input = shape[0] == 1
+        self.input_length = int(shape[1]) if shape[1] > 0 else None
+        self._lock = threading.Lock()
+
+    def __call__(self, tokenized_input: np.ndarray):
+        with self._lock:
+            outputs = self.runner(
+                **{self.input_name: np.asarray(tokenized_input, dtype=self.input_type)}
+            )
+        return _sorted_outputs(outputs)
+
+
+class ONNXTranslator:
+    """A translator converted to ONNX, run by ONNX Runtime.
+
+    Args:
+        path (str): Path of the .onnx file.
+        num_threads (int, optional): Intra-op threads, 0 for the default.
+    """
+
+    def __init__(self, path: str, num_threads: int = 0):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError(
+                "STOUT_BACKEND=onnx requires onnxruntime, install it with pip install onnxruntime"
+            ) from e
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_type = np.int64 if "int64" in model_input.type else np.int32
+        self.single_input = model_input.shape[0] == 1
+        self.input_length = (
+            model_input.shape[1] if isinstance(model_input.shape[1], int) else None
+        )
+        self.output_names = [output.name for output in self.session.get_outputs()]
+
+    def __call__(self, tokenized_input: np.ndarray):
+        values = self.session.run(
+            None,
+            {self.input_name: np.asarray(tokenized_input, dtype=self.input_type)},
+        )
+        return _sorted_outputs(dict(zip(self.output_names, values)))
+
+
+def _load_saved_model(path: str, num_threads: int = 0):
+    import tensorflow as tf
+
+    return tf.saved_model.load(path)
+
+
+loaders: Dict[str, Callable] = {
+    "savedmodel": _load_saved_model,
+    "tflite": TFLiteTranslator,
+    "tflite-dynamic": TFLiteTranslator,
+    "onnx": ONNXTranslator,
+}
+
+
+def load_translator(saved_model_path: str, backend: Optional[str] = None):
+    """Loads a translator with an inference backend.
+
+    Args:
+        saved_model_path (str): Directory of the SavedModel.
+        backend (str, optional): Name of the backend, STOUT_BACKEND by default.
+
+    Returns:
+        Callable: The translator, called with padded token ids.
+
+    Raises:
+        ValueError: If STOUT_BACKEND selects a backend that has not been
+            validated, without STOUT_EXPERIMENTAL_BACKENDS=1.
+        FileNotFoundError: If the translator was not converted for the backend.
+    """
+    if backend is None:
+        backend = stout_backend
+        if backend not in validated_backends and not experimental_backends:
+            raise ValueError(
+                f"STOUT backend {backend!r} has not been validated against the SavedModel,"
+                " set STOUT_EXPERIMENTAL_BACKENDS=1 to use it anyway"
+            )
+    path = backend_path(saved_model_path, backend)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"{path} does not exist, create it with python -m app.modules.convert_models --backend {backend}"
+        )
+    return loaders[backend](path, backend_threads)
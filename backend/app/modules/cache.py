@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with optional time-to-live.
+
+    Args:
+        maxsize (int): Maximum number of entries, 0 disables the cache.
+        ttl (float, optional): Seconds after which an entry expires, 0 keeps entries forever.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached value or None if it is missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, created = item
+            if self.ttl and time.time() - created > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, created: float = None):
+        """Stores a value and evicts the least recently used entries."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, created or time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore:
+    """Persistent key-value table in a SQLite database.
+
+    Entries older than `ttl` are treated as missing and purged, and once the
+    table grows past `max_entries` the oldest entries are deleted.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        table (str): Name of the table holding the entries.
+        max_entries (int, optional): Maximum number of rows, 0 for no limit.
+        ttl (float, optional): Seconds after which an entry expires, 0 keeps entries forever.
+    """
+
+    # number of writes between two size checks
+    evict_interval = 1000
+
+    def __init__(self, path: str, table: str, max_entries: int = 0, ttl: float = 0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_created ON {table} (created)"
+            )
+        self.purge()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[str, float]]:
+        """Returns the (value, created) pairs of all stored, unexpired keys."""
+        found = {}
+        oldest = time.time() - self.ttl if self.ttl else 0
+        with self._lock:
+            # stay below SQLite's limit on host parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, value, created FROM {self.table} "
+                    f"WHERE created >= ? AND key IN ({','.join('?' * len(chunk))})",
+                    [oldest, *chunk],
+                )
+                found.update((key, (value, created)) for key, value, created in rows)
+        return found
+
+    def set_many(self, items: Iterable[Tuple[str, str]]):
+        """Stores (key, value) pairs, replacing existing entries."""
+        now = time.time()
+        rows = [(key, value, now) for key, value in items]
+        if not rows:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._writes += len(rows)
+        if self._writes >= self.evict_interval:
+            self.purge()
+
+    def add_many(self, items: Iterable[Tuple[str, str]]) -> List[str]:
+        """Stores (key, value) pairs whose key is not stored yet.
+
+        Returns:
+            List[str]: The keys that were stored.
+        """
+        now = time.time()
+        rows = [(key, value, now) for key, value in dict(items).items()]
+        if not rows:
+            return []
+        oldest = now - self.ttl if self.ttl else 0
+        with self._lock, self._connection:
+            existing = set()
+            for start in range(0, len(rows), 500):
+                chunk = [key for key, _, _ in rows[start : start + 500]]
+                existing.update(
+                    key
+                    for (key,) in self._connection.execute(
+                        f"SELECT key FROM {self.table} "
+                        f"WHERE created >= ? AND key IN ({','.join('?' * len(chunk))})",
+                        [oldest, *chunk],
+                    )
+                )
+            rows = [row for row in rows if row[0] not in existing]
+            # Expired entries are still in the table until the next purge
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._writes += len(rows)
+        if self._writes >= self.evict_interval:
+            self.purge()
+        return [key for key, _, _ in rows]
+
+    def purge(self):
+        """Deletes expired entries and the oldest entries above max_entries."""
+        with self._lock, self._connection:
+            self._writes = 0
+            if self.ttl:
+                self._connection.execute(
+                    f"DELETE FROM {self.table} WHERE created < ?",
+                    (time.time() - self.ttl,),
+                )
+            if self.max_entries:
+                self._connection.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+                    "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()[0]
+
+
+class TwoTierCache:
+    """In-process LRU backed by an optional SQLite store that survives restarts.
+
+    Args:
+        name (str): Name of the cache, used as the table name on disk.
+        maxsize (int): Maximum number of entries kept in memory.
+        path (str, optional): SQLite database path, None keeps the cache in memory only.
+        max_entries (int, optional): Maximum number of entries kept on disk, 0 for no limit.
+        ttl (float, optional): Seconds after which an entry expires, 0 keeps entries forever.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 1024,
+        path: str = None,
+        max_entries: int = 0,
+        ttl: float = 0,
+    ):
+        self.name = name
+        self.memory = LRUCache(maxsize, ttl)
+        self.disk = SQLiteStore(path, name, max_entries, ttl) if path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached value for key or None."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Looks keys up in memory first, then on disk.
+
+        Args:
+            keys (List[str]): Keys to look up.
+
+        Returns:
+            Dict[str, str]: The values of all keys that were found.
+        """
+        found = {}
+        missing = []
+        keys = list(dict.fromkeys(keys))
+        for key in keys:
+            value = self.memory.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        self.memory_hits += len(found)
+
+        if missing and self.disk is not None:
+            for key, (value, created) in self.disk.get_many(missing).items():
+                self.memory.set(key, value, created)
+                found[key] = value
+                self.disk_hits += 1
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: str):
+        """Stores a value in memory and on disk."""
+        self.set_many([(key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, str]]):
+        """Stores (key, value) pairs in memory and on disk."""
+        items = list(items)
+        for key, value in items:
+            self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set_many(items)
+
+    def add_many(self, items: Iterable[Tuple[str, str]]):
+        """Stores (key, value) pairs whose key is not cached yet, keeping existing values."""
+        items = [(key, value) for key, value in items if self.memory.get(key) is None]
+        if self.disk is not None:
+            added = set(self.disk.add_many(items))
+            items = [(key, value) for key, value in items if key in added]
+        for key, value in items:
+            if self.memory.get(key) is None:
+                self.memory.set(key, value)
+
+    def stats(self) -> dict:
+        """Returns hit and miss counters and the current number of entries."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+        }
@@ -0,0 +1,174 @@
+"""Cached 3D conformer generation with a per-request time budget.
+
+Conformers are cached by canonical SMILES. A request waits at most
+CONFORMER_TIME_BUDGET seconds, expensive molecules keep embedding in the
+background and are reported as pending, to be fetched later from
+GET /depict/3d/{key}.
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional
+
+import pystow
+from rdkit import Chem
+
+from app.modules.cache import TwoTierCache
+from app.modules.rdkit_wrapper import canonical_smiles, embed_conformer
+
+# Seconds a request waits for a conformer before it is reported as pending
+conformer_budget = float(os.getenv("CONFORMER_TIME_BUDGET", "3"))
+# Seconds after which RDKit gives up embedding a molecule
+conformer_timeout = int(os.getenv("CONFORMER_TIMEOUT", "60"))
+conformer_workers = int(os.getenv("CONFORMER_WORKERS", "2"))
+
+# An empty CONFORMER_CACHE_DIR keeps the conformers in memory only
+conformer_cache_dir = os.getenv(
+    "CONFORMER_CACHE_DIR", str(pystow.join("STOUT-V2", "cache"))
+)
+conformer_cache_path = (
+    os.path.join(conformer_cache_dir, "conformers.sqlite")
+    if conformer_cache_dir
+    else None
+)
+conformer_cache_size = int(os.getenv("CONFORMER_CACHE_SIZE", "512"))
+conformer_max_entries = int(os.getenv("CONFORMER_MAX_ENTRIES", "100000"))
+
+# key -> MolBlock, "" for molecules that could not be embedded
+molblock_cache = TwoTierCache(
+    "conformers", conformer_cache_size, conformer_cache_path, conformer_max_entries
+)
+# key -> canonical SMILES and hydrogen flag, to compute referenced conformers
+source_cache = TwoTierCache(
+    "conformer_sources",
+    conformer_cache_size * 8,
+    conformer_cache_path,
+    conformer_max_entries,
+)
+
+_pool = ThreadPoolExecutor(max_workers=conformer_workers, thread_name_prefix="conformer")
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+
+class ConformerResult(NamedTuple):
+    """State of a conformer request.
+
+    Attributes:
+        key (str): Key of the conformer, used by GET /depict/3d/{key}.
+        status (str): "done", "pending" or "failed".
+        molblock (str): The conformer as MolBlock once done.
+    """
+
+    key: str
+    status: str
+    molblock: Optional[str] = None
+
+
+def _from_cache(key: str, molblock: str) -> ConformerResult:
+    if molblock:
+        return ConformerResult(key, "done", molblock)
+    return ConformerResult(key, "failed")
+
+
+def _compute(key: str, canonical: str, hydrogens: bool) -> str:
+    # Only molecules that cannot be embedded are cached as failed. Timeouts
+    # and other errors are raised, so that a later request tries again.
+    try:
+        mol = Chem.MolFromSmiles(canonical)
+        molblock = embed_conformer(mol, hydrogens, conformer_timeout) if mol else None
+        molblock_cache.set(key, molblock or "")
+        return molblock or ""
+    finally:
+        with _pending_lock:
+            _pending.pop(key, None)
+
+
+def _submit(key: str, source: str) -> Future:
+    """Starts computing a conformer unless it is already being computed."""
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is None:
+            canonical, hydrogens = json.loads(source)
+            future = _pool.submit(_compute, key, canonical, hydrogens)
+            _pending[key] = future
+        return future
+
+
+def _wait(key: str, future: Future, budget: float) -> ConformerResult:
+    try:
+        error = future.exception(timeout=budget)
+    except concurrent.futures.TimeoutError:
+        return ConformerResult(key, "pending")
+    if error is not None:
+        print(f"Conformer {key} failed: {error}")
+        return ConformerResult(key, "failed")
+    return _from_cache(key, future.result())
+
+
+def conformer_key(smiles: str, hydrogens: bool = True) -> Optional[str]:
+    """Registers a conformer and returns its key without computing it.
+
+    Args:
+        smiles (str): SMILES string of the molecule.
+        hydrogens (bool, optional): Keep explicit hydrogen atoms.
+
+    Returns:
+        str: Key of the conformer, None if the SMILES cannot be parsed.
+    """
+    canonical = canonical_smiles(smiles)
+    if not canonical:
+        return None
+    source = json.dumps([canonical, hydrogens])
+    key = hashlib.sha256(source.encode()).hexdigest()[:32]
+    if source_cache.memory.get(key) is None:
+        source_cache.set(key, source)
+    return key
+
+
+def get_conformer(
+    smiles: str, hydrogens: bool = True, budget: Optional[float] = conformer_budget
+) -> Optional[ConformerResult]:
+    """Returns the conformer of a molecule, waiting at most budget seconds.
+
+    Args:
+        smiles (str): SMILES string of the molecule.
+        hydrogens (bool, optional): Keep explicit hydrogen atoms.
+        budget (float, optional): Seconds to wait, CONFORMER_TIME_BUDGET by default, None to wait until done.
+
+    Returns:
+        ConformerResult: The conformer or its pending state, None if the SMILES is invalid.
+    """
+    key = conformer_key(smiles, hydrogens)
+    if key is None:
+        return None
+    return lookup(key, budget)
+
+
+def lookup(key: str, budget: Optional[float] = 0) -> Optional[ConformerResult]:
+    """Returns the state of a registered conformer, computing it if necessary.
+
+    Args:
+        key (str): Key from conformer_key.
+        budget (float, optional): Seconds to wait for a conformer that is not cached, None to wait until done.
+
+    Returns:
+        ConformerResult: The conformer or its pending state, None if the key is unknown.
+    """
+    molblock = molblock_cache.get(key)
+    if molblock is not None:
+        return _from_cache(key, molblock)
+    source = source_cache.get(key)
+    if source is None:
+        return None
+    return _wait(key, _submit(key, source), budget)
+
+
+def stats() -> dict:
+    """Returns the cache counters and the number of conformers being computed."""
+    return {**molblock_cache.stats(), "pending": len(_pending)}
@@ -0,0 +1,130 @@
+"""Converts the STOUT SavedModels for the other inference backends.
+
+Usage:
+    python -m app.modules.convert_models [--backend tflite-dynamic] [--direction forward]
+
+The converted models are written next to the SavedModels, see
+app.modules.backends for the file names. TFLite conversions keep the
+TensorFlow ops TFLite has no builtin for (SELECT_TF_OPS), tflite-dynamic
+also quantizes the weights to int8 (dynamic-range quantization). ONNX
+conversions require tf2onnx.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from app.modules import backends
+from app.modules.stout_wrapper import default_path, ensure_trained_weights
+
+saved_models = {
+    "forward": "translator_forward",
+    "reverse": "translator_reverse",
+}
+
+
+def translator_function(reloaded):
+    """Wraps a translator in a tf.function for token ids of any shape.
+
+    The call is traced for batches of any size and length, falling back to
+    single sequences for translators that do not accept batches. The token
+    ids and the confidence are returned as output_0 and output_1.
+
+    Returns:
+        Tuple[tf.function, tf.TensorSpec]: The function and its input signature.
+    """
+    import tensorflow as tf
+
+    function = tf.function(lambda tokens: reloaded(tokens))
+    for shape in ([None, None], [1, None]):
+        for dtype in (tf.int32, tf.int64):
+            spec = tf.TensorSpec(shape, dtype, name="tokens")
+            try:
+                function.get_concrete_function(spec)
+                return function, spec
+            except (TypeError, ValueError):
+                continue
+    raise ValueError("The translator could not be traced for token id inputs")
+
+
+def convert_tflite(saved_model_path: str, output_path: str, quantize: bool):
+    """Converts a translator to TFLite, optionally with dynamic-range quantized weights."""
+    import tensorflow as tf
+
+    reloaded = tf.saved_model.load(saved_model_path)
+    function, spec = translator_function(reloaded)
+    converter = tf.lite.TFLiteConverter.from_concrete_functions(
+        [function.get_concrete_function(spec)], reloaded
+    )
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS,
+        tf.lite.OpsSet.SELECT_TF_OPS,
+    ]
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(output_path, "wb") as file:
+        file.write(converter.convert())
+
+
+def convert_onnx(saved_model_path: str, output_path: str, opset: int = 15):
+    """Converts a translator to ONNX with tf2onnx."""
+    import tensorflow as tf
+
+    try:
+        import tf2onnx
+    except ImportError as e:
+        raise ImportError("ONNX conversion requires tf2onnx, install it with pip install tf2onnx") from e
+
+    reloaded = tf.saved_model.load(saved_model_path)
+    function, spec = translator_function(reloaded)
+    tf2onnx.convert.from_function(
+        function, input_signature=[spec], opset=opset, output_path=output_path
+    )
+
+
+def convert(direction: str, backend: str) -> str:
+    """Converts one translator for one backend.
+
+    Args:
+        direction (str): "forward" (SMILES to IUPAC) or "reverse".
+        backend (str): "tflite", "tflite-dynamic" or "onnx".
+
+    Returns:
+        str: Path of the converted model.
+    """
+    ensure_trained_weights()
+    saved_model_path = os.path.join(default_path.as_posix(), saved_models[direction])
+    output_path = backends.backend_path(saved_model_path, backend)
+    if backend == "onnx":
+        convert_onnx(saved_model_path, output_path)
+    else:
+        convert_tflite(saved_model_path, output_path, quantize=backend == "tflite-dynamic")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--backend",
+        choices=sorted(backends.backend_suffixes),
+        default="tflite-dynamic",
+    )
+    parser.add_argument(
+        "--direction", choices=["forward", "reverse", "both"], default="both"
+    )
+    args = parser.parse_args()
+
+    directions = list(saved_models) if args.direction == "both" else [args.direction]
+    for direction in directions:
+        start = time.perf_counter()
+        path = convert(direction, args.backend)
+        size = os.path.getsize(path) / 2**20
+        print(
+            f"Converted {direction} translator to {path} ({size:.1f} MiB)"
+            f" in {time.perf_counter() - start:.0f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
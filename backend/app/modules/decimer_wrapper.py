@@ -1,16 +1,32 @@
-import tensorflow as tf
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Iterator, List, Union
+
 import numpy as np
-from typing import List
 import app.modules.config as config
-import pickle
+from app.modules import loader
+from app.modules.vocabulary import load_vocabulary
+
+if TYPE_CHECKING:
+    # TensorFlow is imported when the models are loaded, see app.modules.loader
+    import tensorflow as tf
 
-with open("app/modules/assets/tokenizer_new2023.pkl", "rb") as f:
-    tokenizer = pickle.load(f)
+decimer_model_path = "app/modules/assets/DECIMER_model.tflite"
+# Interpreters of the DECIMER model, each predicting one batch at a time
+decimer_interpreters = int(os.getenv("DECIMER_INTERPRETERS", "1"))
+# Threads of each interpreter, 0 for the TFLite default
+decimer_threads = int(os.getenv("DECIMER_THREADS", "0"))
 
-# Pre-compute index_word dictionary for faster lookup
-index_word = tokenizer.index_word
-start_token = "<start>"
-end_token = "<end>"
+# Loaded on first use or by the startup loader, see app.modules.loader
+decimer_tokenizer = loader.register(
+    "decimer_tokenizer",
+    lambda: load_vocabulary("app/modules/assets/tokenizer_new2023.pkl"),
+)
 
 
 def detokenize_output(predicted_array: np.ndarray) -> str:
@@ -23,21 +39,38 @@ def detokenize_output(predicted_array: np.ndarray) -> str:
     Returns:
         str: SMILES string
     """
-    outputs = np.vectorize(lambda i: index_word.get(i, ""))(predicted_array[0])
-    return "".join(outputs).replace(start_token, "").replace(end_token, "")
+    return detokenize_output_batch(predicted_array[:1])[0]
+
+
+def detokenize_output_batch(predicted_array: np.ndarray) -> List[str]:
+    """
+    Convert a batch of predicted token arrays to SMILES strings.
+
+    Args:
+        predicted_array (np.ndarray): Transformer Decoder output array, one row per image
+
+    Returns:
+        List[str]: SMILES strings
+    """
+    return decimer_tokenizer.get().decode_batch(predicted_array, stop_at_end=False)
 
 
-def load_tflite_model(model_path: str) -> tf.lite.Interpreter:
+def load_tflite_model(model_path: str, num_threads: int = 0) -> tf.lite.Interpreter:
     """
     Load a TFLite model and allocate tensors.
 
     Args:
         model_path (str): Path to the TFLite model file
+        num_threads (int, optional): Interpreter threads, 0 for the TFLite default
 
     Returns:
         tf.lite.Interpreter: Loaded TFLite interpreter
     """
-    interpreter = tf.lite.Interpreter(model_path=model_path)
+    import tensorflow as tf
+
+    interpreter = tf.lite.Interpreter(
+        model_path=model_path, num_threads=num_threads or None
+    )
     interpreter.allocate_tensors()
     return interpreter
 
@@ -63,15 +96,188 @@ def predict_smiles(interpreter: tf.lite.Interpreter, image: np.ndarray) -> str:
     return detokenize_output(output_data)
 
 
-interpreter = load_tflite_model("app/modules/assets/DECIMER_model.tflite")
+class PooledInterpreter:
+    """A TFLite interpreter with its tensor indices looked up once.
+
+    Args:
+        interpreter (tf.lite.Interpreter): Interpreter with allocated tensors.
+    """
+
+    def __init__(self, interpreter: tf.lite.Interpreter):
+        self.interpreter = interpreter
+        input_details = interpreter.get_input_details()[0]
+        self.input_index = input_details["index"]
+        self.input_shape = tuple(input_details["shape"])
+        self.output_index = interpreter.get_output_details()[0]["index"]
+        # The shipped DECIMER model takes a single (512, 512, 3) image. Without
+        # a batch dimension, or once a resized batch input failed to run, the
+        # images of a batch are run one interpreter call at a time.
+        self.batch_dimension = len(self.input_shape) == 4
+        self.batched = self.batch_dimension
+        self.invocations = 0
+
+    def run(self, images: np.ndarray) -> np.ndarray:
+        """Runs the interpreter, resizing its input to the shape of images if needed."""
+        if self.input_shape != images.shape:
+            self.interpreter.resize_tensor_input(self.input_index, images.shape)
+            self.interpreter.allocate_tensors()
+            self.input_shape = images.shape
+        self.interpreter.set_tensor(self.input_index, np.asarray(images, dtype=np.float32))
+        self.interpreter.invoke()
+        self.invocations += 1
+        return self.interpreter.get_tensor(self.output_index)
+
+    def predict(self, images: np.ndarray) -> List[str]:
+        """
+        Predict SMILES strings for a batch of images in one interpreter call.
+
+        The batch dimension of the input tensor is resized to the number of
+        images. Models without a batch dimension, like the shipped DECIMER
+        model, or that fail to run a resized input, predict one image per
+        interpreter call.
+
+        Args:
+            images (np.ndarray): Input images, stacked along the first axis
+
+        Returns:
+            List[str]: Predicted SMILES strings in the order of the images
+        """
+        if not self.batch_dimension:
+            return [detokenize_output(self.run(image)) for image in images]
+        if self.batched and len(images) > 1:
+            try:
+                return detokenize_output_batch(self.run(images))
+            except (RuntimeError, ValueError) as e:
+                print(f"DECIMER batch inference failed, predicting one image at a time: {e}")
+                self.batched = False
+        return [detokenize_output(self.run(image[np.newaxis])) for image in images]
+
+
+class InterpreterPool:
+    """Interpreters of one model, each used by one thread at a time.
+
+    TFLite interpreters are not thread-safe. The pool creates all of them
+    up front and hands each caller an idle one, callers wait while all are
+    busy.
+
+    Args:
+        create_interpreter (Callable[[], Any]): Returns a new interpreter with allocated tensors.
+        size (int, optional): Number of interpreters.
+        num_threads (int, optional): Threads of each interpreter, reported by stats.
+    """
+
+    def __init__(
+        self,
+        create_interpreter: Callable[[], Any],
+        size: int = 1,
+        num_threads: int = 0,
+    ):
+        self.size = size
+        self.num_threads = num_threads
+        self._interpreters = [PooledInterpreter(create_interpreter()) for _ in range(size)]
+        self._idle = queue.SimpleQueue()
+        for interpreter in self._interpreters:
+            self._idle.put(interpreter)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.busy = 0
+        self.calls = 0
+        self.images = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    @contextmanager
+    def acquire(self) -> Iterator[PooledInterpreter]:
+        """Waits for an idle interpreter and returns it to the pool afterwards."""
+        start = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        interpreter = self._idle.get()
+        with self._lock:
+            self.waiting -= 1
+            self.busy += 1
+            self.wait_seconds += time.perf_counter() - start
+        try:
+            yield interpreter
+        finally:
+            with self._lock:
+                self.busy -= 1
+            self._idle.put(interpreter)
+
+    def predict(self, images: np.ndarray) -> List[str]:
+        """Predicts SMILES for stacked images on an idle interpreter, see PooledInterpreter.predict."""
+        with self.acquire() as interpreter:
+            start = time.perf_counter()
+            smiles = interpreter.predict(images)
+            with self._lock:
+                self.calls += 1
+                self.images += len(images)
+                self.run_seconds += time.perf_counter() - start
+        return smiles
+
+    def stats(self) -> dict:
+        """Returns the pool size, its use and the mean wait and call times.
+
+        `batched` tells whether the interpreters run several images per
+        interpreter call, `invocations` counts the interpreter calls made
+        for the `calls` batches of `images` images.
+        """
+        return {
+            "interpreters": self.size,
+            "threads": self.num_threads,
+            "batched": all(interpreter.batched for interpreter in self._interpreters),
+            "busy": self.busy,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "images": self.images,
+            "invocations": sum(interpreter.invocations for interpreter in self._interpreters),
+            "mean_wait_ms": self.wait_seconds / self.calls * 1000 if self.calls else 0.0,
+            "mean_call_ms": self.run_seconds / self.calls * 1000 if self.calls else 0.0,
+        }
+
+
+decimer_model = loader.register(
+    "decimer_model",
+    lambda: InterpreterPool(
+        lambda: load_tflite_model(decimer_model_path, decimer_threads),
+        decimer_interpreters,
+        decimer_threads,
+    ),
+)
+
+
+def stats() -> dict:
+    """Returns the statistics of the interpreter pool, empty until it is loaded."""
+    return decimer_model.value.stats() if decimer_model.loaded else {}
+
+
+def get_decimer_batch(images: List[Union[str, bytes, np.ndarray]]) -> List[str]:
+    """
+    Runs DECIMER on a batch of images on an idle interpreter of the pool.
+
+    The images are resized together, but are run in one interpreter call
+    only if the model has a batch dimension, see PooledInterpreter.predict.
+
+    Args:
+        images (List[str | bytes | np.ndarray]): Paths or contents of the
+            input images, or images already returned by config.preprocess_image.
+
+    Returns:
+        List[str]: Predicted SMILES in the order of the input.
+    """
+    preprocessed = [
+        image if isinstance(image, np.ndarray) else config.preprocess_image(image)
+        for image in images
+    ]
+    return decimer_model.get().predict(np.asarray(config.model_inputs(preprocessed)))
 
 
-def get_decimer(image_path: str):
-    # Process the image
+def get_decimer(image: Union[str, bytes]):
+    # Process the image, read from a path or already in memory
 
-    image = config.decode_image(image_path)
+    image = config.decode_image(image)
 
     # Predict SMILES
-    smiles = predict_smiles(interpreter, image)
+    smiles = decimer_model.get().predict(np.asarray(image)[np.newaxis])[0]
 
     return smiles
@@ -0,0 +1,158 @@
+"""Content-addressed cache of 2D structure depictions.
+
+A depiction is identified by a key encoding the canonical SMILES and the
+render options, so the same molecule drawn the same way is rendered once.
+Tables can reference depictions by URL (GET /depict/{key}) instead of
+embedding the SVG, which are rendered when first requested. As the key
+holds everything needed to render the depiction, any web worker can answer
+the URL, whether or not the cache is shared.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import zlib
+from typing import Callable, Optional, Tuple
+
+import pystow
+from rdkit import Chem
+
+from app.modules.cache import TwoTierCache
+from app.modules.rdkit_wrapper import canonical_smiles, get_rdkit_depiction
+
+# An empty DEPICTION_CACHE_DIR keeps the depictions in memory only
+depiction_cache_dir = os.getenv(
+    "DEPICTION_CACHE_DIR", str(pystow.join("STOUT-V2", "cache"))
+)
+depiction_cache_path = (
+    os.path.join(depiction_cache_dir, "depictions.sqlite")
+    if depiction_cache_dir
+    else None
+)
+depiction_cache_size = int(os.getenv("DEPICTION_CACHE_SIZE", "1024"))
+depiction_max_entries = int(os.getenv("DEPICTION_MAX_ENTRIES", "100000"))
+
+# Largest width or height of a depiction requested by key
+max_depiction_size = 4096
+
+# hash of the canonical SMILES and render options -> SVG
+svg_cache = TwoTierCache(
+    "depictions", depiction_cache_size, depiction_cache_path, depiction_max_entries
+)
+
+invalid_smiles_text = "Error reading SMILES string, check again."
+
+
+def depiction_key(
+    smiles: str, size: Tuple[int, int] = (512, 512), rotate: int = 0, kekulize: bool = True
+) -> Optional[str]:
+    """Returns the key of a depiction without rendering it.
+
+    The key is the compressed canonical SMILES and render options, encoded
+    for URLs.
+
+    Args:
+        smiles (str): SMILES string of the molecule.
+        size (Tuple[int, int], optional): Width and height in pixels.
+        rotate (int, optional): Rotation in degrees.
+        kekulize (bool, optional): Draw Kekulé structures.
+
+    Returns:
+        str: Key of the depiction, None if the SMILES cannot be parsed.
+    """
+    canonical = canonical_smiles(smiles)
+    if not canonical:
+        return None
+    source = json.dumps([canonical, list(size), rotate, kekulize], separators=(",", ":"))
+    return base64.urlsafe_b64encode(zlib.compress(source.encode(), 9)).rstrip(b"=").decode()
+
+
+def _decode_key(key: str) -> Optional[tuple]:
+    """Returns the canonical SMILES and render options of a key, None if it is not valid."""
+    try:
+        compressed = base64.urlsafe_b64decode(key + "=" * (-len(key) % 4))
+        # A key never decompresses to more than a long SMILES
+        decompressor = zlib.decompressobj()
+        source = decompressor.decompress(compressed, 2**16)
+        if decompressor.unconsumed_tail:
+            return None
+        canonical, size, rotate, kekulize = json.loads(source)
+        width, height = (int(value) for value in size)
+    except (binascii.Error, zlib.error, ValueError, TypeError):
+        return None
+    if not isinstance(canonical, str) or not (
+        0 < width <= max_depiction_size and 0 < height <= max_depiction_size
+    ):
+        return None
+    return canonical, (width, height), int(rotate), bool(kekulize)
+
+
+def get_depiction(key: str) -> Optional[str]:
+    """Returns the SVG of a depiction, rendering it on first use.
+
+    Args:
+        key (str): Key from depiction_key.
+
+    Returns:
+        str: The SVG, None if the key is not valid.
+    """
+    source = _decode_key(key)
+    if source is None:
+        return None
+    cache_key = hashlib.sha256(json.dumps(source).encode()).hexdigest()[:32]
+    svg = svg_cache.get(cache_key)
+    if svg is not None:
+        return svg
+    canonical, size, rotate, kekulize = source
+    mol = Chem.MolFromSmiles(canonical)
+    if mol is None:
+        return None
+    svg = get_rdkit_depiction(mol, size, rotate, kekulize)
+    svg_cache.set(cache_key, svg)
+    return svg
+
+
+def depict(
+    smiles: str, size: Tuple[int, int] = (512, 512), rotate: int = 0, kekulize: bool = True
+) -> str:
+    """Returns the cached SVG depiction of a molecule.
+
+    Args:
+        smiles (str): SMILES string of the molecule.
+        size (Tuple[int, int], optional): Width and height in pixels.
+        rotate (int, optional): Rotation in degrees.
+        kekulize (bool, optional): Draw Kekulé structures.
+
+    Returns:
+        str: The SVG, or an error message if the SMILES is invalid.
+    """
+    key = depiction_key(smiles, size, rotate, kekulize)
+    svg = get_depiction(key) if key else None
+    return svg if svg is not None else invalid_smiles_text
+
+
+def stats() -> dict:
+    """Returns the hit and miss counters of the depiction cache."""
+    return svg_cache.stats()
+
+
+def url_depicter(base_url: str) -> Callable[[str], str]:
+    """Returns a function mapping a SMILES to the URL of its depiction.
+
+    Used in place of get_svg_2d to build tables that reference depictions.
+
+    Args:
+        base_url (str): URL of the depiction endpoint, ending with a slash.
+
+    Returns:
+        Callable[[str], str]: Function returning the URL, or an error message for invalid SMILES.
+    """
+
+    def depiction_url(smiles: str) -> str:
+        key = depiction_key(smiles)
+        return base_url + key if key else invalid_smiles_text
+
+    return depiction_url
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import os
+from app.modules.decimer_wrapper import decimer_interpreters, get_decimer_batch
+from app.modules import model_service
+from app.modules.executor import model_pool
+from app.modules.scheduler import MicroBatcher
+from app.modules.stout_wrapper import predict_IUPAC_scored, predict_SMILES_scored
+
+
+# The STOUT engines return stout_wrapper.Prediction tuples.
+# In service mode the batches run in the model service, see app.modules.model_service
+if model_service.model_mode == "service":
+    model_service.use_service()
+    iupac_batch_function = model_service.remote("predict_iupac")
+    smiles_batch_function = model_service.remote("predict_smiles")
+    decimer_batch_function = model_service.remote_decimer
+else:
+    iupac_batch_function = predict_IUPAC_scored
+    smiles_batch_function = predict_SMILES_scored
+    decimer_batch_function = get_decimer_batch
+
+# Each engine has its own queue, batch size and maximum wait time
+stout_forward = MicroBatcher(
+    "stout_forward",
+    iupac_batch_function,
+    model_pool,
+    max_batch_size=int(os.getenv("STOUT_FORWARD_MAX_BATCH", "16")),
+    max_wait_ms=float(os.getenv("STOUT_FORWARD_MAX_WAIT_MS", "5")),
+    max_queue=int(os.getenv("STOUT_FORWARD_MAX_QUEUE", "1024")),
+)
+stout_reverse = MicroBatcher(
+    "stout_reverse",
+    smiles_batch_function,
+    model_pool,
+    max_batch_size=int(os.getenv("STOUT_REVERSE_MAX_BATCH", "16")),
+    max_wait_ms=float(os.getenv("STOUT_REVERSE_MAX_WAIT_MS", "5")),
+    max_queue=int(os.getenv("STOUT_REVERSE_MAX_QUEUE", "1024")),
+)
+decimer = MicroBatcher(
+    "decimer",
+    decimer_batch_function,
+    model_pool,
+    max_batch_size=int(os.getenv("DECIMER_MAX_BATCH", "4")),
+    max_wait_ms=float(os.getenv("DECIMER_MAX_WAIT_MS", "5")),
+    max_queue=int(os.getenv("DECIMER_MAX_QUEUE", "256")),
+    # One batch per interpreter of the pool, see decimer_wrapper.InterpreterPool.
+    # The shipped model has no batch dimension and runs a batch image by image.
+    max_concurrent_batches=decimer_interpreters,
+)
+
+
+def stats() -> dict:
+    """Returns the queue statistics of all engines."""
+    return {
+        engine.name: engine.stats()
+        for engine in (stout_forward, stout_reverse, decimer)
+    }
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.exception_handlers import ServiceOverloadedException
+
+# Seconds clients are asked to wait before retrying a rejected request
+retry_after = int(os.getenv("RETRY_AFTER", "2"))
+
+
+class BoundedExecutor:
+    """Thread pool for blocking work with a bounded number of waiting tasks.
+
+    Tasks beyond `max_workers` running and `max_queue` waiting are rejected
+    with ServiceOverloadedException instead of queueing without limit.
+
+    Args:
+        name (str): Name of the pool, used in errors and statistics.
+        max_workers (int): Number of worker threads.
+        max_queue (int): Number of tasks allowed to wait for a free worker.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.rejected = 0
+        self.completed = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ServiceOverloadedException(self.name, retry_after)
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    async def run(self, function: Callable, *args, **kwargs) -> Any:
+        """Runs a blocking function on the pool without blocking the event loop.
+
+        Args:
+            function (Callable): Function to run.
+            *args: Positional arguments for function.
+            **kwargs: Keyword arguments for function.
+
+        Returns:
+            Any: The return value of function.
+
+        Raises:
+            ServiceOverloadedException: If the queue of the pool is full.
+        """
+        self._acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool, functools.partial(function, *args, **kwargs)
+            )
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        """Returns the number of running and waiting tasks of the pool."""
+        pending = self._pending
+        return {
+            "workers": self.max_workers,
+            "running": min(pending, self.max_workers),
+            "queue_depth": max(pending - self.max_workers, 0),
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+# TensorFlow and TFLite inference, one batch per engine at a time, and one
+# per DECIMER interpreter
+model_pool = BoundedExecutor(
+    "model",
+    int(os.getenv("MODEL_WORKERS", str(2 + int(os.getenv("DECIMER_INTERPRETERS", "1"))))),
+    int(os.getenv("MODEL_QUEUE", "16")),
+)
+# OPSIN parsing and retranslation through JPype
+opsin_pool = BoundedExecutor(
+    "opsin",
+    int(os.getenv("OPSIN_WORKERS", "2")),
+    int(os.getenv("OPSIN_QUEUE", "32")),
+)
+# RDKit depictions, conformers and validation
+rdkit_pool = BoundedExecutor(
+    "rdkit",
+    int(os.getenv("RDKIT_WORKERS", str(os.cpu_count() or 1))),
+    int(os.getenv("RDKIT_QUEUE", "64")),
+)
+# Decoding and preprocessing of uploaded images for DECIMER
+image_pool = BoundedExecutor(
+    "image",
+    int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1))),
+    int(os.getenv("IMAGE_QUEUE", "64")),
+)
@@ -0,0 +1,117 @@
+"""Cache of DECIMER predictions keyed by image content.
+
+Uploads are looked up in two levels. The first is keyed by a hash of the
+uploaded bytes and answers repeated uploads of the same file without
+decoding it. The second is keyed by a hash of the image returned by
+config.preprocess_image, so copies of an image that were re-encoded, had
+their metadata stripped or were converted to another lossless format also
+hit, at the cost of preprocessing them. Only predicted images are stored.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pystow
+
+from app.modules import config
+from app.modules.cache import TwoTierCache
+
+# An empty DECIMER_CACHE_DIR keeps the predictions in memory only
+image_cache_dir = os.getenv("DECIMER_CACHE_DIR", str(pystow.join("STOUT-V2", "cache")))
+image_cache_path = (
+    os.path.join(image_cache_dir, "images.sqlite") if image_cache_dir else None
+)
+image_cache_size = int(os.getenv("DECIMER_CACHE_SIZE", "1024"))
+image_cache_max_entries = int(os.getenv("DECIMER_CACHE_MAX_ENTRIES", "100000"))
+
+# hash of the uploaded bytes -> SMILES
+upload_cache = TwoTierCache(
+    "decimer_uploads", image_cache_size, image_cache_path, image_cache_max_entries
+)
+# hash of the preprocessed image -> SMILES
+preprocessed_cache = TwoTierCache(
+    "decimer_images", image_cache_size, image_cache_path, image_cache_max_entries
+)
+
+
+class CachedImage(NamedTuple):
+    """An upload looked up in the cache.
+
+    Attributes:
+        upload_key (str): Hash of the uploaded bytes.
+        image_key (str): Hash of the preprocessed image, None on a hit of the upload level.
+        image (np.ndarray): Preprocessed image, None on a hit of the upload level.
+        smiles (str): Cached prediction, None on a miss.
+    """
+
+    upload_key: str
+    image_key: Optional[str] = None
+    image: Optional[np.ndarray] = None
+    smiles: Optional[str] = None
+
+
+def upload_key(data: bytes) -> str:
+    """Returns the key of uploaded bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def image_key(image: np.ndarray) -> str:
+    """Returns the key of a preprocessed image, including its shape."""
+    digest = hashlib.blake2b(str(image.shape).encode(), digest_size=16)
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+def lookup(data: bytes) -> CachedImage:
+    """Looks an upload up, preprocessing it if its bytes are not cached.
+
+    Args:
+        data (bytes): Content of the uploaded image.
+
+    Returns:
+        CachedImage: The keys, the preprocessed image if it was needed and
+        the cached SMILES, if any.
+    """
+    key = upload_key(data)
+    smiles = upload_cache.get(key)
+    if smiles is not None:
+        return CachedImage(key, smiles=smiles)
+    image = config.preprocess_image(data)
+    preprocessed_key = image_key(image)
+    smiles = preprocessed_cache.get(preprocessed_key)
+    if smiles is not None:
+        upload_cache.set(key, smiles)
+    return CachedImage(key, preprocessed_key, image, smiles)
+
+
+def store(predictions: Iterable[Tuple[CachedImage, str]]):
+    """Stores the predicted SMILES of looked up uploads in both levels.
+
+    Args:
+        predictions (Iterable[Tuple[CachedImage, str]]): (looked up upload, SMILES) pairs.
+    """
+    predictions = list(predictions)
+    upload_cache.set_many((entry.upload_key, smiles) for entry, smiles in predictions)
+    preprocessed_cache.set_many(
+        (entry.image_key, smiles) for entry, smiles in predictions if entry.image_key
+    )
+
+
+def stats() -> dict:
+    """Returns the counters of both levels and the overall hit rate per upload."""
+    uploads, images = upload_cache.stats(), preprocessed_cache.stats()
+    lookups = uploads["memory_hits"] + uploads["disk_hits"] + uploads["misses"]
+    hits = (
+        uploads["memory_hits"]
+        + uploads["disk_hits"]
+        + images["memory_hits"]
+        + images["disk_hits"]
+    )
+    return {
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "uploads": uploads,
+        "images": images,
+    }
@@ -0,0 +1,233 @@
+"""Function calls between local processes over Unix sockets.
+
+A server process exposes named functions on a socket with serve(), web
+workers call them through a Client, which keeps a pool of connections to
+one or more servers exposing the same functions. Messages are pickled and
+authenticated by multiprocessing.connection, so the sockets live in a
+directory only the user running the service can access, created by
+private_directory. The key is IPC_AUTHKEY if set, otherwise a random key
+generated once per socket directory and kept next to the sockets in a file
+only that user can read. Exceptions
+raised by a remote function are raised again in the caller, as RemoteError
+if they cannot be pickled.
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import pickle
+import queue
+import secrets
+import stat
+import tempfile
+import threading
+from multiprocessing.connection import AuthenticationError, Client as connect
+from multiprocessing.connection import Connection, Listener
+from typing import Any, Callable, Dict, List
+
+# Shared key of all sockets, a key per socket directory is generated if empty
+ipc_authkey = os.getenv("IPC_AUTHKEY", "").encode()
+authkey_filename = "ipc.key"
+
+_authkeys: Dict[str, bytes] = {}
+_authkeys_lock = threading.Lock()
+
+
+class RemoteError(Exception):
+    """Raised by Client.call when the remote function raised an exception."""
+
+
+class ServiceUnavailableError(ConnectionError):
+    """Raised by Client.call when no server answered."""
+
+
+def private_directory(path: str) -> str:
+    """Creates a directory only the current user can access, or checks an existing one.
+
+    Args:
+        path (str): Path of the directory.
+
+    Returns:
+        str: The path.
+
+    Raises:
+        PermissionError: If the directory belongs to another user or can be
+            accessed by other users.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    status = os.stat(path)
+    if status.st_uid != os.getuid() or stat.S_IMODE(status.st_mode) & 0o077:
+        raise PermissionError(
+            f"{path} must belong to the current user and have mode 0700,"
+            f" it has mode {stat.S_IMODE(status.st_mode):04o}"
+        )
+    return path
+
+
+def authkey(address: str) -> bytes:
+    """Returns the key authenticating the connections to a socket.
+
+    Without IPC_AUTHKEY, the key of the socket directory is read from its
+    key file, which is created with a random key by the first process that
+    needs it.
+
+    Args:
+        address (str): Path of the socket.
+
+    Returns:
+        bytes: The key.
+    """
+    if ipc_authkey:
+        return ipc_authkey
+    directory = os.path.dirname(os.path.abspath(address))
+    with _authkeys_lock:
+        if directory not in _authkeys:
+            private_directory(directory)
+            path = os.path.join(directory, authkey_filename)
+            if not os.path.exists(path):
+                # Written completely before it appears, concurrent processes keep the first key
+                descriptor, temporary = tempfile.mkstemp(dir=directory)
+                with os.fdopen(descriptor, "w") as f:
+                    f.write(secrets.token_hex(32))
+                try:
+                    os.link(temporary, path)
+                except FileExistsError:
+                    pass
+                finally:
+                    os.unlink(temporary)
+            with open(path) as f:
+                _authkeys[directory] = f.read().encode()
+        return _authkeys[directory]
+
+
+def _portable(error: Exception) -> Exception:
+    """Returns the exception if it survives pickling, a RemoteError otherwise."""
+    try:
+        return pickle.loads(pickle.dumps(error))
+    except Exception:
+        return RemoteError(f"{type(error).__name__}: {error}")
+
+
+def _handle(
+    connection: Connection,
+    functions: Dict[str, Callable],
+    initializer: Callable[[], None] = None,
+):
+    if initializer is not None:
+        initializer()
+    with connection:
+        while True:
+            try:
+                method, args = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = ("ok", functions[method](*args))
+            except Exception as e:
+                reply = ("error", _portable(e))
+            connection.send(reply)
+
+
+def serve(
+    address: str,
+    functions: Dict[str, Callable],
+    initializer: Callable[[], None] = None,
+):
+    """Answers calls on a Unix socket until the process is terminated.
+
+    Each connection is served by its own thread, a client keeps its
+    connections open between calls.
+
+    Args:
+        address (str): Path of the socket, replaced if it exists.
+        functions (Dict[str, Callable]): Functions by the name clients call them with.
+        initializer (Callable[[], None], optional): Called once in every connection thread.
+    """
+    if os.path.exists(address):
+        os.unlink(address)
+    with Listener(address, "AF_UNIX", authkey=authkey(address)) as listener:
+        while True:
+            try:
+                connection = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                print(f"Rejected connection on {address}: {e}")
+                continue
+            threading.Thread(
+                target=_handle,
+                args=(connection, functions, initializer),
+                daemon=True,
+            ).start()
+
+
+class Client:
+    """Thread-safe pool of connections to servers exposing the same functions.
+
+    New connections go to the servers in turn, skipping servers that do not
+    accept connections. A call on a connection that breaks, e.g. because its
+    server crashed or was restarted, is retried once on another connection.
+
+    Args:
+        addresses (List[str]): Socket paths of the servers.
+        timeout (float, optional): Seconds to wait for the reply to a call.
+    """
+
+    def __init__(self, addresses: List[str], timeout: float = 60):
+        self.addresses = addresses
+        self.timeout = timeout
+        self._idle = queue.SimpleQueue()
+        self._next = itertools.count()
+
+    def _connect(self) -> Connection:
+        for _ in range(len(self.addresses)):
+            address = self.addresses[next(self._next) % len(self.addresses)]
+            try:
+                return connect(address, "AF_UNIX", authkey=authkey(address))
+            except (OSError, EOFError, AuthenticationError):
+                continue
+        raise ServiceUnavailableError(f"No server is listening on {self.addresses}")
+
+    def call(self, method: str, *args) -> Any:
+        """Calls a remote function and returns its result.
+
+        Args:
+            method (str): Name of the function on the server.
+            *args: Positional arguments, they have to be picklable.
+
+        Returns:
+            Any: The return value of the function.
+
+        Raises:
+            Exception: The exception raised by the function, or a RemoteError.
+            ServiceUnavailableError: If no server answered in time.
+        """
+        for _ in range(2):
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+            try:
+                connection.send((method, args))
+                answered = connection.poll(self.timeout)
+                if answered:
+                    status, value = connection.recv()
+            except (EOFError, OSError):
+                connection.close()
+                continue
+            if not answered:
+                connection.close()
+                raise ServiceUnavailableError(
+                    f"{method} did not answer within {self.timeout} seconds"
+                )
+            self._idle.put(connection)
+            if status == "error":
+                raise value
+            return value
+        raise ServiceUnavailableError(f"The connection broke while calling {method}")
+
+    def close(self):
+        """Closes the idle connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,507 @@
+"""Bulk translation jobs stored in a local SQLite database.
+
+Jobs are worked through in batches by local worker processes, started with
+the API (STOUT_JOB_WORKERS for the whole deployment, whatever the number of
+web workers) or separately with:
+    python -m app.modules.jobs
+
+Items are leased while a worker translates them, so jobs resume after a
+restart or a crashed worker from the first untranslated item. Workers that
+exit are restarted, and the items they had leased are released right away.
+A batch that fails is released and retried up to STOUT_JOB_MAX_ATTEMPTS
+times, then its items get an error record and the job goes on. Uploads
+that were interrupted are expired after STOUT_JOB_UPLOAD_TIMEOUT seconds.
+"""
+from __future__ import annotations
+
+import csv
+import fcntl
+import io
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from itertools import islice
+from typing import IO, Iterator, List, Optional, Tuple
+
+import pystow
+
+jobs_dir = os.getenv("STOUT_JOBS_DIR", str(pystow.join("STOUT-V2", "jobs")))
+jobs_path = os.path.join(jobs_dir, "jobs.sqlite")
+# Number of worker processes started by the API of a deployment, 0 to run workers separately
+job_workers = int(os.getenv("STOUT_JOB_WORKERS", "1"))
+job_batch_size = int(os.getenv("STOUT_JOB_BATCH_SIZE", "64"))
+# Seconds a claimed batch stays reserved for a worker
+job_lease_seconds = float(os.getenv("STOUT_JOB_LEASE_SECONDS", "600"))
+# Attempts at translating a batch before its items get an error record
+job_max_attempts = int(os.getenv("STOUT_JOB_MAX_ATTEMPTS", "3"))
+# Seconds before a failed batch is retried, doubled with every attempt
+job_retry_delay = float(os.getenv("STOUT_JOB_RETRY_DELAY", "10"))
+# Seconds without progress after which an upload is considered interrupted
+job_upload_timeout = float(os.getenv("STOUT_JOB_UPLOAD_TIMEOUT", "3600"))
+poll_interval = float(os.getenv("STOUT_JOB_POLL_INTERVAL", "1"))
+
+# Workers exiting sooner than this after their start are restarted with a delay
+restart_delay = 5
+
+# Held by the web worker that started the job workers of the deployment
+_workers_lock = None
+# Set to stop supervising the job workers, see stop_workers
+_stop_supervising = threading.Event()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT,
+    status TEXT NOT NULL,
+    retranslate INTEGER NOT NULL,
+    visualize INTEGER NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    smiles TEXT NOT NULL,
+    result TEXT,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, position)
+);
+CREATE INDEX IF NOT EXISTS job_items_pending ON job_items (job_id, result);
+"""
+
+
+def read_smiles(file: IO[bytes], filename: str = "") -> Iterator[str]:
+    """Yields the SMILES of an uploaded SMILES or CSV file.
+
+    SMILES files hold one molecule per line, the SMILES being the first
+    whitespace separated field. CSV files need a header, the column named
+    "smiles" (any case) is used, otherwise the first column.
+
+    Args:
+        file (IO[bytes]): The uploaded file.
+        filename (str, optional): Name of the file, a .csv suffix selects the CSV reader.
+
+    Yields:
+        str: SMILES strings in file order.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8", errors="replace", newline="")
+    if filename.lower().endswith(".csv"):
+        reader = csv.reader(text)
+        header = [column.strip().lower() for column in next(reader, [])]
+        column = header.index("smiles") if "smiles" in header else 0
+        for row in reader:
+            if len(row) > column and row[column].strip():
+                yield row[column].strip()
+    else:
+        for line in text:
+            fields = line.split()
+            if fields:
+                yield fields[0]
+
+
+class JobStore:
+    """Jobs and their items in a SQLite database shared by API and workers.
+
+    Every operation opens its own connection, so the store can be used from
+    any thread or process.
+
+    Args:
+        path (str): Path of the SQLite database file.
+    """
+
+    def __init__(self, path: str = jobs_path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            columns = [row["name"] for row in connection.execute("PRAGMA table_info(job_items)")]
+            if "attempts" not in columns:
+                # Databases created before batches were retried
+                connection.execute(
+                    "ALTER TABLE job_items ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"
+                )
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def create(
+        self,
+        smiles: Iterator[str],
+        filename: str = None,
+        retranslate: bool = False,
+        visualize: bool = False,
+    ) -> str:
+        """Creates a job from an iterator of SMILES, inserting them in chunks.
+
+        Returns:
+            str: The job id.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, filename, status, retranslate, visualize, created, updated) "
+                "VALUES (?, ?, 'uploading', ?, ?, ?, ?)",
+                (job_id, filename, int(retranslate), int(visualize), now, now),
+            )
+            total = 0
+            smiles = iter(smiles)
+            while True:
+                chunk = list(islice(smiles, 1000))
+                if not chunk:
+                    break
+                connection.execute("BEGIN")
+                connection.executemany(
+                    "INSERT INTO job_items (job_id, position, smiles) VALUES (?, ?, ?)",
+                    [(job_id, total + i, item) for i, item in enumerate(chunk)],
+                )
+                # Keeps the upload from being expired while it makes progress
+                connection.execute(
+                    "UPDATE jobs SET updated = ? WHERE id = ?", (time.time(), job_id)
+                )
+                connection.execute("COMMIT")
+                total += len(chunk)
+            connection.execute(
+                "UPDATE jobs SET status = ?, total = ?, updated = ? WHERE id = ?",
+                ("queued" if total else "completed", total, time.time(), job_id),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Returns the job with its progress, or None if it does not exist."""
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["retranslate"] = bool(job["retranslate"])
+        job["visualize"] = bool(job["visualize"])
+        job["progress"] = job["processed"] / job["total"] if job["total"] else 1.0
+        return job
+
+    def results(self, job_id: str, offset: int, limit: int) -> List[dict]:
+        """Returns the translated items of a job between offset and offset + limit."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT position, smiles, result FROM job_items WHERE job_id = ? "
+                "AND position >= ? AND position < ? ORDER BY position",
+                (job_id, offset, offset + limit),
+            ).fetchall()
+        return [
+            {"position": row["position"], "status": "done", **json.loads(row["result"])}
+            if row["result"] is not None
+            else {"position": row["position"], "status": "pending", "Original SMILES": row["smiles"]}
+            for row in rows
+        ]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a job that has not finished yet."""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+        return cursor.rowcount > 0
+
+    def resume(self, job_id: str) -> bool:
+        """Queues a cancelled or failed job again, from its first untranslated item."""
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "UPDATE job_items SET lease_until = NULL, attempts = 0 "
+                "WHERE job_id = ? AND result IS NULL",
+                (job_id,),
+            )
+            cursor = connection.execute(
+                "UPDATE jobs SET status = CASE WHEN processed >= total THEN 'completed' ELSE 'queued' END, "
+                "error = NULL, updated = ? WHERE id = ? AND status IN ('cancelled', 'failed') AND total > 0",
+                (time.time(), job_id),
+            )
+            connection.execute("COMMIT")
+        return cursor.rowcount > 0
+
+    def claim(
+        self, worker: str, size: int, lease_seconds: float = job_lease_seconds
+    ) -> Optional[Tuple[dict, List[Tuple[int, str, int]]]]:
+        """Leases the next batch of untranslated items of the oldest active job.
+
+        Items whose lease has expired, e.g. because their worker died, are
+        handed out again. Every claim counts as an attempt.
+
+        Returns:
+            tuple: The job and its (position, SMILES, attempts) items, or None
+            if there is no work. attempts includes this claim.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                jobs = connection.execute(
+                    "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY created"
+                ).fetchall()
+                job, items = None, []
+                for job in jobs:
+                    items = connection.execute(
+                        "SELECT position, smiles, attempts FROM job_items WHERE job_id = ? AND result IS NULL "
+                        "AND (lease_until IS NULL OR lease_until < ?) ORDER BY position LIMIT ?",
+                        (job["id"], now, size),
+                    ).fetchall()
+                    if items:
+                        break
+                if items:
+                    connection.executemany(
+                        "UPDATE job_items SET worker = ?, lease_until = ?, attempts = attempts + 1 "
+                        "WHERE job_id = ? AND position = ?",
+                        [
+                            (worker, now + lease_seconds, job["id"], item["position"])
+                            for item in items
+                        ],
+                    )
+                    connection.execute(
+                        "UPDATE jobs SET status = 'running', updated = ? "
+                        "WHERE id = ? AND status = 'queued'",
+                        (now, job["id"]),
+                    )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        if not items:
+            return None
+        return dict(job), [
+            (item["position"], item["smiles"], item["attempts"] + 1) for item in items
+        ]
+
+    def complete_items(self, job_id: str, results: List[Tuple[int, dict]]):
+        """Stores the results of translated items and updates the progress."""
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "UPDATE job_items SET result = ?, lease_until = NULL "
+                "WHERE job_id = ? AND position = ? AND result IS NULL",
+                [(json.dumps(result), job_id, position) for position, result in results],
+            )
+            processed = connection.execute(
+                "SELECT COUNT(*) FROM job_items WHERE job_id = ? AND result IS NOT NULL",
+                (job_id,),
+            ).fetchone()[0]
+            connection.execute(
+                "UPDATE jobs SET processed = ?, updated = ?, "
+                "status = CASE WHEN ? >= total AND status = 'running' THEN 'completed' ELSE status END "
+                "WHERE id = ?",
+                (processed, time.time(), processed, job_id),
+            )
+            connection.execute("COMMIT")
+
+    def release(self, job_id: str, positions: List[int], delay: float = 0):
+        """Ends the lease of items that could not be translated, so that they are claimed again.
+
+        Args:
+            job_id (str): The job id.
+            positions (List[int]): Positions of the items.
+            delay (float, optional): Seconds before the items can be claimed again.
+        """
+        with self._connect() as connection:
+            connection.executemany(
+                "UPDATE job_items SET worker = NULL, lease_until = ? "
+                "WHERE job_id = ? AND position = ? AND result IS NULL",
+                [(time.time() + delay, job_id, position) for position in positions],
+            )
+
+    def release_worker(self, worker: str) -> int:
+        """Ends the leases of a worker that exited, so that its items are claimed again.
+
+        Returns:
+            int: Number of released items.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE job_items SET worker = NULL, lease_until = NULL "
+                "WHERE worker = ? AND result IS NULL AND lease_until IS NOT NULL",
+                (worker,),
+            )
+        return cursor.rowcount
+
+    def expire_uploads(self, timeout: float = job_upload_timeout) -> int:
+        """Marks jobs whose upload stopped making progress as failed and drops their items.
+
+        Returns:
+            int: Number of expired jobs.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            expired = [
+                row["id"]
+                for row in connection.execute(
+                    "SELECT id FROM jobs WHERE status = 'uploading' AND updated < ?",
+                    (now - timeout,),
+                )
+            ]
+            for job_id in expired:
+                connection.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                    ("The upload was interrupted", now, job_id),
+                )
+            connection.execute("COMMIT")
+        return len(expired)
+
+
+def run_worker(path: str = jobs_path, worker: str = None):
+    """Works through the jobs of a store until the process is terminated.
+
+    Uses the same validation, STOUT, OPSIN retranslation and depiction stages
+    as the interactive endpoints. The models are loaded on the first batch.
+    A batch that raises, e.g. because the OPSIN or model service restarted,
+    is released and retried after a growing delay. After
+    STOUT_JOB_MAX_ATTEMPTS attempts its items get an error record instead,
+    also when earlier attempts ended with the worker process exiting.
+
+    Args:
+        path (str, optional): Path of the job database.
+        worker (str, optional): Worker name recorded on leased items.
+    """
+    from app.modules.pipeline import translate_records
+
+    store = JobStore(path)
+    worker = worker or f"{os.uname().nodename}-{os.getpid()}"
+    print(f"Job worker {worker} started")
+    while True:
+        claim = store.claim(worker, job_batch_size)
+        if claim is None:
+            if store.expire_uploads():
+                print("Expired interrupted job uploads")
+            time.sleep(poll_interval)
+            continue
+        job, items = claim
+        attempts = max(item[2] for item in items)
+        if attempts > job_max_attempts:
+            # Earlier attempts ended with their worker process exiting
+            print(f"Job {job['id']}: batch stopped its worker, recording the error")
+            error = "Translation failed: the worker stopped"
+            store.complete_items(
+                job["id"],
+                [
+                    (position, {"Original SMILES": smiles, "error": error})
+                    for position, smiles, _ in items
+                ],
+            )
+            continue
+        try:
+            records = translate_records(
+                [smiles for _, smiles, _ in items], job["retranslate"], job["visualize"]
+            )
+        except Exception as e:
+            if attempts < job_max_attempts:
+                delay = job_retry_delay * 2 ** (attempts - 1)
+                print(f"Job {job['id']}: batch failed ({e}), retrying in {delay:g} seconds")
+                store.release(job["id"], [position for position, _, _ in items], delay)
+                continue
+            print(f"Job {job['id']}: batch failed {attempts} times ({e}), recording the error")
+            records = [
+                {"Original SMILES": smiles, "error": f"Translation failed: {e}"}
+                for _, smiles, _ in items
+            ]
+        store.complete_items(
+            job["id"], [(item[0], record) for item, record in zip(items, records)]
+        )
+
+
+def start_workers(count: int = job_workers, path: str = jobs_path) -> List[multiprocessing.Process]:
+    """Starts the local worker processes of the deployment and restarts those that exit.
+
+    Only the first web worker calling this starts the workers, the others
+    find the lock next to the job database taken and start none. The lock is
+    released when that web worker exits, so a restarted one takes over. The
+    processes are spawned rather than forked, so they do not inherit the
+    threads of the web server. A thread of the web worker supervises them
+    until stop_workers is called.
+
+    Args:
+        count (int, optional): Number of processes.
+        path (str, optional): Path of the job database.
+
+    Returns:
+        List[multiprocessing.Process]: The running processes, updated when
+        one is restarted, none if another web worker started them.
+    """
+    global _workers_lock
+    if _workers_lock is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock = open(os.path.join(directory, "workers.lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return []
+        _workers_lock = lock
+    store = JobStore(path)
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    started = []
+
+    def start(i: int):
+        # Named after their slot, so the leases of a worker that exited,
+        # possibly before a restart of the deployment, are found again
+        name = f"{os.uname().nodename}-job-worker-{i}"
+        if store.release_worker(name):
+            print(f"Released the items leased by {name}")
+        process = context.Process(
+            target=run_worker, args=(path, name), name=f"job-worker-{i}", daemon=True
+        )
+        process.start()
+        if i < len(processes):
+            processes[i], started[i] = process, time.monotonic()
+        else:
+            processes.append(process)
+            started.append(time.monotonic())
+
+    def supervise():
+        while not _stop_supervising.wait(1):
+            for i, process in enumerate(processes):
+                if process.is_alive() or time.monotonic() - started[i] < restart_delay:
+                    continue
+                print(f"Job worker {i} exited with {process.exitcode}, restarting")
+                start(i)
+
+    _stop_supervising.clear()
+    for i in range(count):
+        start(i)
+    threading.Thread(target=supervise, name="job-supervisor", daemon=True).start()
+    return processes
+
+
+def stop_workers(processes: List[multiprocessing.Process]):
+    """Stops supervising and terminates the worker processes from start_workers."""
+    _stop_supervising.set()
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(5)
+
+
+if __name__ == "__main__":
+    run_worker()
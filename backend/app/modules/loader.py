@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+# eager: load everything before serving, background: load in a thread after
+# startup, lazy: load each resource on its first use
+startup_mode = os.getenv("STARTUP_MODE", "background")
+
+
+class LazyResource:
+    """A model, tokenizer or runtime that is loaded once, on first use.
+
+    Loading is thread-safe: concurrent callers wait for the same load. A
+    failed load is recorded and retried on the next call.
+
+    Args:
+        name (str): Name reported by the readiness endpoint.
+        load (Callable[[], Any]): Function returning the loaded resource.
+    """
+
+    def __init__(self, name: str, load: Callable[[], Any]):
+        self.name = name
+        self.load = load
+        self.value = None
+        self.loaded = False
+        self.loading = False
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """Returns the resource, loading it if necessary."""
+        if self.loaded:
+            return self.value
+        with self._lock:
+            if not self.loaded:
+                self.loading = True
+                start = time.perf_counter()
+                try:
+                    self.value = self.load()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                finally:
+                    self.loading = False
+                self.load_seconds = time.perf_counter() - start
+                self.error = None
+                self.loaded = True
+        return self.value
+
+    def override(self, value: Any):
+        """Replaces the resource, e.g. with a stub engine for benchmarks."""
+        with self._lock:
+            self.value = value
+            self.loaded = True
+            self.error = None
+
+    def status(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "loading": self.loading,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+        }
+
+
+resources: Dict[str, LazyResource] = {}
+
+
+def register(name: str, load: Callable[[], Any]) -> LazyResource:
+    """Registers a resource so that it is reported by /ready and load_all.
+
+    Args:
+        name (str): Name of the resource.
+        load (Callable[[], Any]): Function returning the loaded resource.
+
+    Returns:
+        LazyResource: The registered resource.
+    """
+    resources[name] = LazyResource(name, load)
+    return resources[name]
+
+
+def unregister(name: str):
+    """Stops reporting and loading a resource, e.g. one loaded by another process."""
+    resources.pop(name, None)
+
+
+def load_all():
+    """Loads all registered resources, logging instead of raising failures."""
+    for resource in list(resources.values()):
+        try:
+            resource.get()
+            print(f"Loaded {resource.name} in {resource.load_seconds:.1f}s")
+        except Exception as e:
+            print(f"Failed to load {resource.name}: {e}")
+
+
+def start_background_loading() -> threading.Thread:
+    """Loads all registered resources in a daemon thread."""
+    thread = threading.Thread(target=load_all, name="model-loader", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    """Returns whether requests can be served.
+
+    In lazy mode the service is ready as long as no load has failed,
+    otherwise every resource has to be loaded.
+    """
+    if startup_mode == "lazy":
+        return not any(resource.error for resource in resources.values())
+    return all(resource.loaded for resource in resources.values())
+
+
+def status() -> dict:
+    """Returns the load status of every registered resource."""
+    return {name: resource.status() for name, resource in resources.items()}
@@ -0,0 +1,164 @@
+"""Model service: one process owning the STOUT and DECIMER models.
+
+With MODEL_MODE=service the web workers do not load any model. The
+engines send their micro-batches to this service over a Unix socket in
+MODEL_SOCKET_DIR, so the model weights are held in memory once however
+many uvicorn workers parse requests, run RDKit and serialize results.
+
+The first web worker that needs a model starts the service unless
+MODEL_SERVICE_AUTOSTART=0, it can also be started separately with:
+    python -m app.modules.model_service
+Only one service runs per socket directory.
+"""
+from __future__ import annotations
+
+import fcntl
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, List, Union
+
+import numpy as np
+import pystow
+
+from app.modules import ipc
+from app.modules import loader
+
+# local: load the models in every web worker, service: use the model service
+model_mode = os.getenv("MODEL_MODE", "local")
+model_socket_dir = os.getenv(
+    "MODEL_SOCKET_DIR", str(pystow.join("STOUT-V2", "run", ensure_exists=False))
+)
+model_socket_path = os.path.join(model_socket_dir, "models.sock")
+model_service_autostart = os.getenv("MODEL_SERVICE_AUTOSTART", "1") == "1"
+# Seconds to wait for the service to answer after starting it
+model_service_start_timeout = float(os.getenv("MODEL_SERVICE_START_TIMEOUT", "300"))
+# Seconds to wait for a batch, including loading its model on first use
+model_call_timeout = float(os.getenv("MODEL_CALL_TIMEOUT", "600"))
+
+# Resources loaded by the service instead of the web workers
+model_resources = ("stout_forward", "stout_backward", "decimer_tokenizer", "decimer_model")
+
+
+def _one_at_a_time(function: Callable) -> Callable:
+    """Serializes the calls of a model, as its engine does within one web worker."""
+    lock = threading.Lock()
+
+    def call(*args):
+        with lock:
+            return function(*args)
+
+    return call
+
+
+def run_service():
+    """Loads the models according to STARTUP_MODE and answers batches until terminated.
+
+    Returns immediately if a service is already running for the socket
+    directory.
+    """
+    ipc.private_directory(model_socket_dir)
+    lock = open(os.path.join(model_socket_dir, "models.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"A model service is already running in {model_socket_dir}")
+        return
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # The service runs the models itself, whatever MODEL_MODE it inherited.
+    # Run with -m, the engines import this module again under its own name.
+    global model_mode
+    model_mode = os.environ["MODEL_MODE"] = "local"
+    from app.modules.engines import get_decimer_batch
+    from app.modules.stout_wrapper import predict_IUPAC_scored, predict_SMILES_scored
+
+    for name in list(loader.resources):
+        if name not in model_resources:
+            loader.unregister(name)
+    if loader.startup_mode != "lazy":
+        loader.load_all()
+    print(f"Model service listening on {model_socket_path}")
+    ipc.serve(
+        model_socket_path,
+        {
+            "predict_iupac": _one_at_a_time(predict_IUPAC_scored),
+            "predict_smiles": _one_at_a_time(predict_SMILES_scored),
+            # Runs on the interpreter pool, one batch per interpreter
+            "decimer": get_decimer_batch,
+            "status": loader.status,
+        },
+    )
+
+
+def start_service():
+    """Starts the service as a detached process."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    subprocess.Popen(
+        [sys.executable, "-m", "app.modules.model_service"],
+        cwd=backend_dir,
+        start_new_session=True,
+    )
+
+
+def connect() -> ipc.Client:
+    """Returns a client of the service once it answers, starting it if needed.
+
+    Raises:
+        ipc.ServiceUnavailableError: If the service does not answer within
+            MODEL_SERVICE_START_TIMEOUT seconds.
+    """
+    client = ipc.Client([model_socket_path], model_call_timeout)
+    deadline = time.monotonic() + model_service_start_timeout
+    started = False
+    while True:
+        try:
+            client.call("status")
+            return client
+        except ipc.ServiceUnavailableError:
+            if time.monotonic() > deadline:
+                raise
+        if model_service_autostart and not started:
+            start_service()
+            started = True
+        time.sleep(0.5)
+
+
+_client = None
+
+
+def use_service():
+    """Replaces the local model resources by the connection to the service.
+
+    The connection is reported by /ready as "model_service".
+    """
+    global _client
+    for name in model_resources:
+        loader.unregister(name)
+    _client = loader.register("model_service", connect)
+
+
+def remote(method: str) -> Callable[[List], List]:
+    """Returns a batch function running method in the model service."""
+
+    def call(items: List) -> List:
+        return _client.get().call(method, items)
+
+    return call
+
+
+def remote_decimer(images: List[Union[str, bytes, np.ndarray]]) -> List[str]:
+    """Runs DECIMER in the model service, which may have another working directory.
+
+    Images and their contents are sent as they are, image paths are made absolute.
+    """
+    return remote("decimer")(
+        [os.path.abspath(image) if isinstance(image, str) else image for image in images]
+    )
+
+
+if __name__ == "__main__":
+    run_service()
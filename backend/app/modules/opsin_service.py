@@ -0,0 +1,140 @@
+"""OPSIN service: a fixed pool of JVM-hosting processes shared by the web workers.
+
+With OPSIN_MODE=service the web workers do not start a JVM. They parse
+names through the OPSIN_POOL_SIZE worker processes of this service, each
+running one JVM with OPSIN_HEAP of heap and listening on its own Unix
+socket in OPSIN_SOCKET_DIR. The JVM memory therefore stays fixed however
+many uvicorn workers are started, and a crashed JVM only takes its worker
+process down, which the service restarts.
+
+The first web worker that needs OPSIN starts the service unless
+OPSIN_SERVICE_AUTOSTART=0, it can also be started separately with:
+    python -m app.modules.opsin_service
+Only one service runs per socket directory.
+"""
+from __future__ import annotations
+
+import fcntl
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List
+
+import pystow
+
+from app.modules import ipc
+
+opsin_socket_dir = os.getenv(
+    "OPSIN_SOCKET_DIR", str(pystow.join("STOUT-V2", "run", ensure_exists=False))
+)
+opsin_pool_size = int(os.getenv("OPSIN_POOL_SIZE", "2"))
+opsin_service_autostart = os.getenv("OPSIN_SERVICE_AUTOSTART", "1") == "1"
+# Seconds to wait for the service to answer after starting it
+opsin_service_start_timeout = float(os.getenv("OPSIN_SERVICE_START_TIMEOUT", "120"))
+# Seconds to wait for a batch of names to be parsed
+opsin_call_timeout = float(os.getenv("OPSIN_CALL_TIMEOUT", "60"))
+# Workers exiting sooner than this after their start are restarted with a delay
+restart_delay = 5
+
+
+def socket_paths() -> List[str]:
+    """Returns the socket paths of the worker processes."""
+    return [
+        os.path.join(opsin_socket_dir, f"opsin-{i}.sock")
+        for i in range(opsin_pool_size)
+    ]
+
+
+def run_worker(address: str):
+    """Starts a JVM and answers parse calls on a socket until terminated."""
+    from app.modules import opsin_wrapper
+
+    opsin_wrapper._nametostruct.get()
+    print(f"OPSIN worker {os.getpid()} listening on {address}")
+    ipc.serve(
+        address,
+        {"parse": opsin_wrapper._parse_chunk, "ping": os.getpid},
+        initializer=opsin_wrapper._attach_thread,
+    )
+
+
+def run_service():
+    """Runs the worker processes and restarts those that exit.
+
+    Returns immediately if a service is already running for the socket
+    directory.
+    """
+    ipc.private_directory(opsin_socket_dir)
+    lock = open(os.path.join(opsin_socket_dir, "opsin.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"An OPSIN service is already running in {opsin_socket_dir}")
+        return
+    # Exit through sys.exit, so that the daemonic workers are terminated too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    context = multiprocessing.get_context("spawn")
+    workers = {}
+    started = {}
+
+    def start(address: str):
+        process = context.Process(
+            target=run_worker, args=(address,), name="opsin-worker", daemon=True
+        )
+        process.start()
+        workers[address] = process
+        started[address] = time.monotonic()
+
+    for address in socket_paths():
+        start(address)
+    print(f"OPSIN service started {len(workers)} workers in {opsin_socket_dir}")
+    while True:
+        time.sleep(1)
+        for address, process in list(workers.items()):
+            if process.is_alive():
+                continue
+            if time.monotonic() - started[address] < restart_delay:
+                continue
+            print(f"OPSIN worker on {address} exited with {process.exitcode}, restarting")
+            start(address)
+
+
+def start_service():
+    """Starts the service as a detached process."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    subprocess.Popen(
+        [sys.executable, "-m", "app.modules.opsin_service"],
+        cwd=backend_dir,
+        start_new_session=True,
+    )
+
+
+def connect() -> ipc.Client:
+    """Returns a client of the service once it answers, starting it if needed.
+
+    Raises:
+        ipc.ServiceUnavailableError: If the service does not answer within
+            OPSIN_SERVICE_START_TIMEOUT seconds.
+    """
+    client = ipc.Client(socket_paths(), opsin_call_timeout)
+    deadline = time.monotonic() + opsin_service_start_timeout
+    started = False
+    while True:
+        try:
+            client.call("ping")
+            return client
+        except ipc.ServiceUnavailableError:
+            if time.monotonic() > deadline:
+                raise
+        if opsin_service_autostart and not started:
+            start_service()
+            started = True
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    run_service()
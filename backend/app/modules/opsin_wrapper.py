@@ -1,16 +1,36 @@
 from __future__ import annotations
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Callable, List, NamedTuple, Optional
 import pystow
 from jpype import (
     getDefaultJVMPath,
     isJVMStarted,
+    JClass,
     JPackage,
     JVMNotFoundException,
     startJVM,
 )
 from rdkit import Chem
-import pandas as pd
+from app.modules import loader
+from app.modules import opsin_service
+from app.modules.rdkit_wrapper import same_molecule
+from app.modules.tables import TranslationRow
 from app.modules.visualize_wrapper import get_svg_2d
+from app.modules.translation_cache import normalize_name, opsin_cache
+
+# local: start a JVM in this process, service: use the OPSIN service processes
+opsin_mode = os.getenv("OPSIN_MODE", "local")
+# Maximum heap of each JVM
+opsin_heap = os.getenv("OPSIN_HEAP", "4096M")
+# Predictions with at least this confidence are not retranslated, empty to retranslate all
+retranslation_threshold = (
+    float(os.environ["RETRANSLATION_THRESHOLD"])
+    if os.getenv("RETRANSLATION_THRESHOLD")
+    else None
+)
 
 
 def setup_jvm():
@@ -37,14 +57,138 @@ def setup_jvm():
             if not os.path.exists(jar_paths[key]):
                 pystow.ensure("STOUT-V2", url=url)
 
-        startJVM("-ea", "-Xmx4096M", classpath=[jar_paths[key] for key in jar_paths])
+        startJVM("-ea", f"-Xmx{opsin_heap}", classpath=[jar_paths[key] for key in jar_paths])
         print(jar_paths)
 
 
-setup_jvm()
-opsin_base = JPackage("uk").ac.cam.ch.wwmm.opsin
-_nametostruct = opsin_base.NameToStructure.getInstance()
-_restoinchi = opsin_base.NameToInchi.convertResultToInChI
+def load_opsin():
+    """Start the JVM and return the OPSIN NameToStructure instance."""
+    setup_jvm()
+    opsin_base = JPackage("uk").ac.cam.ch.wwmm.opsin
+    return opsin_base.NameToStructure.getInstance()
+
+
+# The JVM is started on first use or by the startup loader, see app.modules.loader.
+# In service mode only the connection to the service is loaded here.
+if opsin_mode == "service":
+    _nametostruct = loader.LazyResource("opsin", load_opsin)
+    _service = loader.register("opsin", opsin_service.connect)
+else:
+    _nametostruct = loader.register("opsin", load_opsin)
+    _service = None
+
+
+class ParsedName(NamedTuple):
+    """Result of parsing one name with OPSIN.
+
+    Attributes:
+        name (str): The parsed name.
+        smiles (str): SMILES of the parsed structure, None if parsing failed.
+        status (str): "SUCCESS" or "FAILURE".
+        message (str): OPSIN's explanation of a failure, empty on success.
+    """
+
+    name: str
+    smiles: Optional[str]
+    status: str
+    message: str = ""
+
+    @property
+    def failure_text(self) -> str:
+        """The error text returned by get_smiles_opsin for failed names."""
+        return f"Failed to convert '{self.name}' to SMILES\n{self.message} using OPSIN"
+
+
+# Threads parsing names in parallel, each attached to the JVM once
+opsin_threads = int(os.getenv("OPSIN_THREADS", "4"))
+# Names handed to a thread in one task
+opsin_chunk_size = int(os.getenv("OPSIN_CHUNK_SIZE", "32"))
+
+_parser_pool = None
+_parser_pool_lock = threading.Lock()
+
+
+def _attach_thread():
+    JClass("java.lang.Thread").attachAsDaemon()
+
+
+def get_parser_pool() -> ThreadPoolExecutor:
+    """Returns the thread pool parsing names, starting the JVM on first use.
+
+    In service mode the threads only wait for the OPSIN service.
+    """
+    global _parser_pool
+    if _parser_pool is None:
+        with _parser_pool_lock:
+            if _parser_pool is None:
+                if _service is None:
+                    _nametostruct.get()
+                _parser_pool = ThreadPoolExecutor(
+                    max_workers=opsin_threads,
+                    thread_name_prefix="opsin",
+                    initializer=None if _service else _attach_thread,
+                )
+    return _parser_pool
+
+
+def _parse_chunk(names: List[str]) -> List[ParsedName]:
+    """Parses names one after another in the calling thread.
+
+    parseToSmiles needs a single call into the JVM per name, the full
+    OpsinResult is only requested to explain failures.
+    """
+    nametostruct = _nametostruct.get()
+    results = []
+    for name in names:
+        smiles = nametostruct.parseToSmiles(name)
+        if smiles is not None:
+            results.append(ParsedName(name, str(smiles), "SUCCESS"))
+        else:
+            message = str(nametostruct.parseChemicalName(name).getMessage())
+            results.append(ParsedName(name, None, "FAILURE", message))
+    return results
+
+
+def _parse_remote(names: List[str]) -> List[ParsedName]:
+    """Parses names in one of the OPSIN service processes."""
+    if not names:
+        return []
+    return _service.get().call("parse", names)
+
+
+def parse_names(names: List[str]) -> List[ParsedName]:
+    """Converts a list of IUPAC names to SMILES with OPSIN.
+
+    Cached names are answered without calling OPSIN, duplicates are parsed
+    once and the remaining names are split into chunks parsed in parallel
+    by the OPSIN threads, or by the OPSIN service processes in service mode.
+
+    Args:
+        names (List[str]): IUPAC names.
+
+    Returns:
+        List[ParsedName]: One result per name in input order.
+    """
+    keys = [normalize_name(name) for name in names]
+    parsed = {
+        key: ParsedName(key, smiles, "SUCCESS")
+        for key, smiles in opsin_cache.get_many(keys).items()
+    }
+    missing = [key for key in dict.fromkeys(keys) if key not in parsed]
+    parse = _parse_chunk if _service is None else _parse_remote
+    if len(missing) <= opsin_chunk_size:
+        results = parse(missing)
+    else:
+        chunks = [
+            missing[i : i + opsin_chunk_size]
+            for i in range(0, len(missing), opsin_chunk_size)
+        ]
+        results = list(chain.from_iterable(get_parser_pool().map(parse, chunks)))
+    opsin_cache.set_many(
+        (result.name, result.smiles) for result in results if result.smiles is not None
+    )
+    parsed.update((result.name, result) for result in results)
+    return [parsed[key]._replace(name=name) for name, key in zip(names, keys)]
 
 
 def get_smiles_opsin(input_text: str) -> str:
@@ -54,29 +198,13 @@ def get_smiles_opsin(input_text: str) -> str:
     - input_text (str): The IUPAC chemical name to be converted.
 
     Returns:
-    - str: The SMILES notation corresponding to the given IUPAC name.
-
-    Raises:
-    - Exception: If the IUPAC name is not valid or if there are issues in the conversion process. The exception message will guide the user to check the data again.
+    - str: The SMILES notation corresponding to the given IUPAC name, or a
+      "Failed to convert" message if OPSIN cannot parse the name.
     """
-    try:
-        # print(input_text)
-        OpsinResult = _nametostruct.parseChemicalName(input_text)
-        # print(OpsinResult)
-        if str(OpsinResult.getStatus()) == "FAILURE":
-            raise Exception(
-                (
-                    "Failed to convert '%s' to format '%s'\n%s using OPSIN"
-                    % (input_text, format, OpsinResult.getMessage())
-                ),
-            )
-        # print(OpsinResult.getSmiles())
-        return str(OpsinResult.getSmiles())
-    except Exception:
-        return str(
-            "Failed to convert '%s' to format '%s'\n%s using OPSIN"
-            % (input_text, format, OpsinResult.getMessage()),
-        )
+    parsed = parse_names([input_text])[0]
+    if parsed.smiles is None:
+        return parsed.failure_text
+    return parsed.smiles
 
 
 def generate_inchi_from_smiles(smiles: str) -> str:
@@ -102,132 +230,157 @@ def generate_inchi_from_smiles(smiles: str) -> str:
 
 
 def process_predicted_smiles(
-    smiles: str, predicted_IUPAC: str, retranslate: bool = True, visualize: bool = False
-) -> str:
+    smiles: str,
+    predicted_IUPAC: str,
+    retranslate: bool = True,
+    visualize: bool = False,
+    parsed: ParsedName = None,
+    depict: Callable[[str], str] = get_svg_2d,
+    confidence: Optional[float] = None,
+) -> TranslationRow:
     """
     Process predicted IUPAC name into SMILES representation.
 
     Args:
         smiles (str): The original SMILES representation.
         predicted_IUPAC (str): The predicted IUPAC name.
+        parsed (ParsedName, optional): OPSIN result of the predicted name if it was already parsed.
+        depict (Callable[[str], str], optional): Returns the structure column for a SMILES, the inline SVG by default.
+        confidence (float, optional): Confidence of STOUT in the prediction, reported in the row.
 
     Returns:
-        str: A formatted string containing the processed data.
-             The string format is "<original_smiles>,<predicted_IUPAC>,<success_status>,<translated_smiles>".
+        TranslationRow: The input, the prediction and, if requested, the retranslation and depictions.
 
     Notes:
-        - If OPSIN restranslation is successful, the success_status is "True", and translated_smiles contains the SMILES representation.
-        - If restranslation fails, the success_status is "False", and translated_smiles is the string "Failed to retranslate".
+        - If OPSIN retranslation gives the input molecule, the retranslation is "same as input", otherwise "not same as input".
+        - If retranslation fails, the retranslation is "unable to assess" and the retranslated SMILES "failed to retranslate".
+        - Without retranslate, OPSIN is not called and only the input and the prediction are returned.
     """
-    predicted_smiles = get_smiles_opsin(predicted_IUPAC.replace(";", " "))
-
-    if "Failed to convert" not in predicted_smiles:
-        if generate_inchi_from_smiles(smiles) == generate_inchi_from_smiles(
-            predicted_smiles
-        ):
-            if visualize:
-                if retranslate:
-                    return f"{smiles}\t{get_svg_2d(smiles)}\t{predicted_IUPAC}\tsame as input\t{predicted_smiles}\t{get_svg_2d(smiles)}"
-                else:
-                    return f"{smiles}\t{get_svg_2d(smiles)}\t{predicted_IUPAC}"
-            else:
-                if retranslate:
-                    return f"{smiles}\t{predicted_IUPAC}\tsame as input\t{predicted_smiles}"
-                else:
-                    return f"{smiles}\t{predicted_IUPAC}"
-
-        else:
-            # Translation successful but wrong molecule
-            if visualize:
-                if retranslate:
-                    return f"{smiles}\t{get_svg_2d(smiles)}\t{predicted_IUPAC}\tnot same as input\t{predicted_smiles}\t{get_svg_2d(predicted_smiles)}"
-                else:
-                    return f"{smiles}\t{get_svg_2d(smiles)}\t{predicted_IUPAC}"
-            else:
-                if retranslate:
-                    return f"{smiles}\t{predicted_IUPAC}\tnot same as input\t{predicted_smiles}"
-                else:
-                    return f"{smiles}\t{predicted_IUPAC}"
-    else:
-        # Translation failed
-        if visualize:
-            return f"{smiles}\t{get_svg_2d(smiles)}\t{predicted_IUPAC}\tunable to assess\tfailed to retranslate"
-        else:
-            return (
-                f"{smiles}\t{predicted_IUPAC}\tunable to assess\tfailed to retranslate"
-            )
+    structure = depict(smiles) if visualize else None
+    if not retranslate:
+        return TranslationRow(smiles, predicted_IUPAC, structure, confidence=confidence)
 
+    if parsed is None:
+        parsed = parse_names([predicted_IUPAC.replace(";", " ")])[0]
+    predicted_smiles = parsed.smiles
 
-def convert_to_table(data: list) -> pd.DataFrame:
-    """
-    Convert a list of strings into a DataFrame representing a table.
+    if predicted_smiles is None:
+        # Translation failed
+        return TranslationRow(
+            smiles,
+            predicted_IUPAC,
+            structure,
+            "unable to assess",
+            "failed to retranslate",
+            confidence=confidence,
+        )
+    if same_molecule(smiles, predicted_smiles):
+        return TranslationRow(
+            smiles,
+            predicted_IUPAC,
+            structure,
+            "same as input",
+            predicted_smiles,
+            structure,
+            confidence,
+        )
+    # Translation successful but wrong molecule
+    return TranslationRow(
+        smiles,
+        predicted_IUPAC,
+        structure,
+        "not same as input",
+        predicted_smiles,
+        depict(predicted_smiles) if visualize else None,
+        confidence,
+    )
+
+
+def needs_retranslation(
+    confidence: Optional[float], threshold: Optional[float] = retranslation_threshold
+) -> bool:
+    """Returns whether a prediction is checked by retranslation.
 
     Args:
-        data (list): A list of strings where each string represents a row of the table.
-
-    Returns:
-        pd.DataFrame: A DataFrame representing the table.
+        confidence (float): Confidence of STOUT in the prediction, None if unknown.
+        threshold (float, optional): Predictions with at least this confidence are
+            not checked, None to check every prediction. RETRANSLATION_THRESHOLD by default.
     """
-    # Split each string into columns based on comma separator and convert to DataFrame
-    df = pd.DataFrame([row.split("\t") for row in data])
-
-    # Set the first row as column names
-    df.columns = df.iloc[0]
-
-    # Remove the first row (header row)
-    df = df[1:]
-
-    return df
+    return threshold is None or confidence is None or confidence < threshold
 
 
 def get_opsin_convertion(
-    iupac_list: list, retranslate: bool = True, visualize: bool = False
-) -> pd.DataFrame:
+    iupac_list: list,
+    retranslate: bool = True,
+    visualize: bool = False,
+    depict: Callable[[str], str] = get_svg_2d,
+    confidences: List[Optional[float]] = None,
+    confidence_threshold: Optional[float] = retranslation_threshold,
+) -> List[TranslationRow]:
     """
     Convert a list of IUPAC names into SMILES representations using Open Parser for Systematic IUPAC Nomenclature (OPSIN).
 
     Args:
         iupac_list (list): A list of SMILES, IUPAC names.
+        retranslate (bool, optional): Retranslate the predicted names using OPSIN.
+        visualize (bool, optional): Add depictions of the input and retranslated structures.
+        depict (Callable[[str], str], optional): Returns the structure columns, e.g. a depiction URL instead of the SVG.
+        confidences (List[float], optional): Confidence of STOUT in each predicted name.
+        confidence_threshold (float, optional): Names with at least this confidence are not retranslated,
+            None to retranslate all. RETRANSLATION_THRESHOLD by default.
 
     Returns:
-        pd.DataFrame: A DataFrame representing the processed data with columns:
-                      "Original SMILES", "Predicted IUPAC name", "Retranslation", "Retranslated SMILES".
+        List[TranslationRow]: One row per entry, see app.modules.tables for the JSON and HTML forms.
 
     Notes:
         - Each item in iupac_list is expected to be a tab-separated string containing the original SMILES and
           predicted IUPAC name.
-        - The function iterates through each entry in the iupac_list, processes it using the process_predicted_smiles
-          function, and collects the processed data in a list.
-        - The first entry in the returned list is the header row.
+        - All predicted names that need retranslation are parsed by OPSIN in one batch before the rows are built.
+        - Names that are not retranslated because of their confidence get the retranslation "not retranslated",
+          they can be checked later with GET /stout/retranslate.
     """
-    # Initialize the list to store processed data
-    all_iupac = []
-
-    if visualize:
-        if retranslate:
-            # Append header row
-            all_iupac.append(
-                "Original SMILES\tOriginal Structure\tPredicted IUPAC name\tRetranslated Structure\tRetranslated SMILES\tRetranslated Structure"
-            )
-        else:
-            all_iupac.append(
-                "Original SMILES\tOriginal Structure\tPredicted IUPAC name"
+    entries = [entry.split("\t") for entry in iupac_list]
+    if confidences is None:
+        confidences = [None] * len(entries)
+    checked = [
+        retranslate and needs_retranslation(confidence, confidence_threshold)
+        for confidence in confidences
+    ]
+    # Parse the names to check in one batch
+    parsed = iter(
+        parse_names(
+            [
+                iupac.replace(";", " ")
+                for (_, iupac), check in zip(entries, checked)
+                if check
+            ]
+        )
+        if any(checked)
+        else []
+    )
+
+    rows = []
+    for (smiles, predicted_IUPAC), confidence, check in zip(entries, confidences, checked):
+        if retranslate and not check:
+            rows.append(
+                TranslationRow(
+                    smiles,
+                    predicted_IUPAC,
+                    depict(smiles) if visualize else None,
+                    "not retranslated",
+                    confidence=confidence,
+                )
             )
-    else:
-        if retranslate:
-            # Append header row
-            all_iupac.append(
-                "Original SMILES\tPredicted IUPAC name\tRetranslated Structure\tRetranslated SMILES"
+            continue
+        rows.append(
+            process_predicted_smiles(
+                smiles,
+                predicted_IUPAC,
+                retranslate,
+                visualize,
+                next(parsed) if check else None,
+                depict,
+                confidence,
             )
-        else:
-            all_iupac.append("Original SMILES\tPredicted IUPAC name")
-
-    # Iterate through each entry in iupac_list
-    for entry in iupac_list:
-        # Process each entry and append to the result list
-        processed_entry = process_predicted_smiles(
-            *entry.split("\t"), retranslate, visualize
         )
-        all_iupac.append(processed_entry)
-
-    return convert_to_table(all_iupac)
+    return rows
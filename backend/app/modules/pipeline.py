@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from typing import List
+
+from app.exception_handlers import InvalidInputException
+from app.modules.opsin_wrapper import get_opsin_convertion
+from app.modules.rdkit_wrapper import filter_valid_smiles
+from app.modules.engines import iupac_batch_function
+from app.modules.tables import legacy_columns, to_legacy_record, TranslationRow
+
+
+def build_records(
+    smiles_list: List[str],
+    valid_smiles: List[str],
+    rows: List[TranslationRow],
+    retranslate: bool = False,
+    visualize: bool = False,
+) -> List[dict]:
+    """Aligns the rows of a translation table with the input SMILES.
+
+    Args:
+        smiles_list (List[str]): All input SMILES.
+        valid_smiles (List[str]): The inputs that were translated, in input order.
+        rows (List[TranslationRow]): Rows from get_opsin_convertion for valid_smiles.
+        retranslate (bool, optional): Whether the rows were retranslated.
+        visualize (bool, optional): Whether the rows hold depictions.
+
+    Returns:
+        List[dict]: One record per input keyed by the table column names,
+        invalid SMILES get an error record.
+    """
+    columns = legacy_columns(retranslate, visualize)
+    records = (to_legacy_record(row, columns) for row in rows)
+    valid = set(valid_smiles)
+    return [
+        next(records)
+        if smiles in valid
+        else {"Original SMILES": smiles, "error": "Invalid SMILES string"}
+        for smiles in smiles_list
+    ]
+
+
+def translate_records(
+    smiles_list: List[str], retranslate: bool = False, visualize: bool = False
+) -> List[dict]:
+    """Runs validation, STOUT, OPSIN retranslation and depiction on a list of SMILES.
+
+    This is the blocking equivalent of the SMILE2IUPAC endpoints, used by
+    background jobs. SMILES with characters STOUT does not know get an error
+    record instead of failing the whole list. Confident predictions are
+    only retranslated below RETRANSLATION_THRESHOLD.
+
+    Args:
+        smiles_list (List[str]): Input SMILES.
+        retranslate (bool, optional): Retranslate the predicted names using OPSIN.
+        visualize (bool, optional): Add SVG depictions to the records.
+
+    Returns:
+        List[dict]: One record per input in input order.
+    """
+    valid_smiles = filter_valid_smiles(smiles_list)
+    try:
+        predictions = iupac_batch_function(valid_smiles)
+    except InvalidInputException:
+        if len(smiles_list) == 1:
+            return [{"Original SMILES": smiles_list[0], "error": "Unsupported characters"}]
+        return [
+            record
+            for smiles in smiles_list
+            for record in translate_records([smiles], retranslate, visualize)
+        ]
+    all_data = [
+        smiles + "\t" + prediction.text
+        for smiles, prediction in zip(valid_smiles, predictions)
+    ]
+    rows = get_opsin_convertion(
+        all_data,
+        retranslate=retranslate,
+        visualize=visualize,
+        confidences=[prediction.confidence for prediction in predictions],
+    )
+    return build_records(smiles_list, valid_smiles, rows, retranslate, visualize)
@@ -1,9 +1,170 @@
 from __future__ import annotations
-from typing import Tuple
+import os
+import time
+from typing import List, Optional, Tuple
 from rdkit import Chem
 from rdkit.Chem import AllChem
 from rdkit.Chem import rdDepictor
 from rdkit.Chem.Draw import rdMolDraw2D
+from app.modules.cache import LRUCache
+
+# SMILES -> canonical SMILES and SMILES -> InChIKey, "" for unparsable SMILES
+identity_cache_size = int(os.getenv("IDENTITY_CACHE_SIZE", "100000"))
+_canonical_cache = LRUCache(identity_cache_size)
+_inchikey_cache = LRUCache(identity_cache_size)
+
+# Threads used to embed and optimize conformers, 0 uses all cores
+conformer_threads = int(os.getenv("CONFORMER_THREADS", "0"))
+# Conformers embedded in parallel per molecule, the lowest energy one is kept.
+# Each one costs a full embedding and optimization.
+conformer_count = int(os.getenv("CONFORMER_COUNT", "1"))
+# Molecules with more atoms, hydrogens included, start from random coordinates
+random_coords_atoms = 200
+
+
+def canonical_smiles(smiles: str) -> Optional[str]:
+    """Returns the canonical Kekulé SMILES STOUT is trained on.
+
+    The molecule is parsed without sanitization, so the canonical form is
+    also available for inputs RDKit would reject chemically.
+
+    Args:
+        smiles (str): Input SMILES string.
+
+    Returns:
+        str: Canonical SMILES or None if the SMILES cannot be parsed.
+    """
+    mol = Chem.MolFromSmiles(smiles.replace("\\/", "/"), sanitize=False)
+    if mol:
+        return Chem.MolToSmiles(mol, kekuleSmiles=True)
+
+
+def filter_valid_smiles(smiles_list: List[str]) -> List[str]:
+    """Returns the SMILES strings RDKit can parse and sanitize.
+
+    Args:
+        smiles_list (List[str]): Input SMILES strings.
+
+    Returns:
+        List[str]: The valid SMILES strings in the order of the input.
+    """
+    return [smiles for smiles in smiles_list if Chem.MolFromSmiles(smiles)]
+
+
+def _identity(smiles: str) -> str:
+    """Returns the memoized RDKit canonical SMILES, "" if the SMILES is invalid."""
+    canonical = _canonical_cache.get(smiles)
+    if canonical is None:
+        mol = Chem.MolFromSmiles(smiles.replace("\\/", "/"))
+        canonical = Chem.MolToSmiles(mol) if mol else ""
+        _canonical_cache.set(smiles, canonical)
+    return canonical
+
+
+def inchikey_from_smiles(smiles: str) -> str:
+    """Returns the memoized InChIKey of a SMILES string.
+
+    Args:
+        smiles (str): Input SMILES string.
+
+    Returns:
+        str: InChIKey, "" if the SMILES is invalid or has no InChI.
+    """
+    key = _inchikey_cache.get(smiles)
+    if key is None:
+        canonical = _identity(smiles)
+        # SMILES spelled differently share the key of their canonical form
+        key = _inchikey_cache.get(canonical) if canonical else ""
+        if key is None:
+            key = Chem.MolToInchiKey(Chem.MolFromSmiles(canonical)) or ""
+            _inchikey_cache.set(canonical, key)
+        _inchikey_cache.set(smiles, key)
+    return key
+
+
+def same_molecule(smiles: str, other_smiles: str) -> bool:
+    """Checks whether two SMILES strings describe the same molecule.
+
+    Equal canonical SMILES are a match without computing InChIs. Otherwise
+    the InChIKeys are compared, so that e.g. tautomers still match as they
+    did with the full InChI. Both results are memoized per SMILES string.
+
+    Args:
+        smiles (str): First SMILES string.
+        other_smiles (str): Second SMILES string.
+
+    Returns:
+        bool: True if both are valid and describe the same molecule.
+    """
+    if smiles == other_smiles:
+        return bool(_identity(smiles))
+    canonical, other_canonical = _identity(smiles), _identity(other_smiles)
+    if not canonical or not other_canonical:
+        return False
+    if canonical == other_canonical:
+        return True
+    key = inchikey_from_smiles(smiles)
+    return bool(key) and key == inchikey_from_smiles(other_smiles)
+
+
+def embed_conformer(
+    molecule: Chem.Mol, hydrogens: bool = True, timeout: int = 0
+) -> Optional[str]:
+    """Generates a low energy 3D conformer with ETKDGv3 and MMFF.
+
+    CONFORMER_COUNT conformers are embedded and optimized, one by default,
+    and the one with the lowest force field energy is returned. Large
+    molecules are embedded from random coordinates, which is faster for
+    them. Molecules ETKDG cannot embed are retried once from random
+    coordinates with another seed.
+
+    Args:
+        molecule (Chem.Mol): RDKit molecule object.
+        hydrogens (bool, optional): Keep the explicit hydrogen atoms in the result.
+        timeout (int, optional): Seconds after which RDKit gives up embedding, 0 for no limit.
+
+    Returns:
+        str: MolBlock of the conformer, None if no conformer could be embedded.
+
+    Raises:
+        TimeoutError: If embedding gave up after `timeout` seconds.
+    """
+    mol = Chem.AddHs(molecule)
+    params = AllChem.ETKDGv3()
+    params.randomSeed = 0xF00D
+    params.numThreads = conformer_threads
+    params.useRandomCoords = mol.GetNumAtoms() > random_coords_atoms
+    if timeout:
+        params.timeout = timeout
+
+    def embed() -> List[int]:
+        start = time.monotonic()
+        conformer_ids = list(AllChem.EmbedMultipleConfs(mol, conformer_count, params))
+        if not conformer_ids and timeout and time.monotonic() - start >= timeout:
+            raise TimeoutError(f"No conformer embedded within {timeout} s")
+        return conformer_ids
+
+    conformer_ids = embed()
+    if not conformer_ids:
+        params.randomSeed += 1
+        params.useRandomCoords = True
+        conformer_ids = embed()
+    if not conformer_ids:
+        return None
+
+    if AllChem.MMFFHasAllMoleculeParams(mol):
+        energies = AllChem.MMFFOptimizeMoleculeConfs(
+            mol, numThreads=conformer_threads, maxIters=200
+        )
+    else:
+        energies = AllChem.UFFOptimizeMoleculeConfs(
+            mol, numThreads=conformer_threads, maxIters=200
+        )
+    best = min(range(len(conformer_ids)), key=lambda i: energies[i][1])
+
+    if not hydrogens:
+        mol = Chem.RemoveHs(mol)
+    return Chem.MolToMolBlock(mol, confId=conformer_ids[best])
 
 
 def get_3d_conformers(molecule: any, depict=True) -> Chem.Mol:
@@ -14,26 +175,11 @@ def get_3d_conformers(molecule: any, depict=True) -> Chem.Mol:
         depict (bool, optional): If True, returns the molecule's 3D structure in MolBlock format. If False, returns the 3D molecule without hydrogen atoms.
 
     Returns:
-        str or rdkit.Chem.rdchem.Mol: If `depict` is True, returns the 3D structure in MolBlock format. Otherwise, returns an RDKit Mol object.
+        str: The 3D structure in MolBlock format, with hydrogen atoms if `depict` is True.
+        Cached conformers with a time budget are available from app.modules.conformers.
     """
     if molecule:
-        molecule = Chem.AddHs(molecule)
-        AllChem.EmbedMolecule(molecule, maxAttempts=5000, useRandomCoords=True)
-        print(molecule)
-        try:
-            AllChem.MMFFOptimizeMolecule(molecule)
-        except Exception:
-            AllChem.EmbedMolecule(
-                molecule,
-                maxAttempts=5000,
-                useRandomCoords=True,
-            )
-            print(molecule)
-        if depict:
-            return Chem.MolToMolBlock(molecule)
-        else:
-            molecule = Chem.RemoveHs(molecule)
-            return Chem.MolToMolBlock(molecule)
+        return embed_conformer(molecule, hydrogens=depict)
 
 
 def get_rdkit_depiction(
@@ -0,0 +1,63 @@
+"""HTML rendering with templates and assets loaded once at startup.
+
+The Jinja templates in app/templates are compiled when this module is
+imported, and the table stylesheet is read once. HTML tables are rendered
+in pieces, so a table can be streamed to the client row chunk by row chunk.
+"""
+from __future__ import annotations
+
+import os
+from typing import AsyncIterator, Callable, List, Tuple
+
+from jinja2 import Environment, FileSystemLoader
+
+from app.modules import tables
+from app.modules.tables import TranslationRow
+
+templates_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+# Number of molecules translated and sent together in streamed HTML tables
+html_chunk_size = int(os.getenv("HTML_CHUNK_SIZE", "8"))
+
+environment = Environment(loader=FileSystemLoader(templates_dir), autoescape=False)
+viewer_template = environment.get_template("viewer_3d.html")
+
+with open(os.path.join(templates_dir, "style.css"), "r") as file:
+    stylesheet = file.read()
+
+
+def render_viewer(molecule: str = None, conformer_url: str = None) -> str:
+    """Renders the 3Dmol.js viewer page.
+
+    Args:
+        molecule (str, optional): MolBlock shown by the viewer.
+        conformer_url (str, optional): URL polled for the MolBlock instead.
+
+    Returns:
+        str: The HTML page.
+    """
+    return viewer_template.render(molecule=molecule, conformer_url=conformer_url)
+
+
+async def stream_table(
+    row_chunks: AsyncIterator[List[TranslationRow]],
+    columns: List[Tuple[str, str]],
+    format_cell: Callable[[str], str] = tables.escape_cell,
+) -> AsyncIterator[str]:
+    """Yields a styled HTML table piece by piece.
+
+    The stylesheet and header are sent first, then the rows of each chunk as
+    soon as it is available, so browsers show a long table while it is
+    still being computed.
+
+    Args:
+        row_chunks (AsyncIterator[List[TranslationRow]]): Table rows in chunks.
+        columns (List[Tuple[str, str]]): Columns from tables.legacy_columns.
+        format_cell (Callable[[str], str], optional): Converts a cell value to HTML, escaping it by default.
+
+    Yields:
+        str: Consecutive pieces of the HTML document.
+    """
+    yield stylesheet + tables.html_table_head(columns)
+    async for rows in row_chunks:
+        yield tables.html_table_rows(rows, columns, format_cell)
+    yield tables.html_table_foot
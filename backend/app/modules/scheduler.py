@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, List
+
+from app.exception_handlers import ServiceOverloadedException
+from app.modules.executor import BoundedExecutor, retry_after
+
+
+class MicroBatcher:
+    """Coalesces single-item requests from concurrent callers into batches.
+
+    Items submitted by any number of coroutines are queued. A worker task
+    collects them until either `max_batch_size` items are waiting or
+    `max_wait_ms` has passed since the first item of the batch arrived, runs
+    `batch_function` once on the whole batch and hands every caller its own
+    result. Batches run on `executor`, so the event loop stays responsive, and
+    submissions that would grow the queue beyond `max_queue` items are
+    rejected with ServiceOverloadedException. If a batch fails, its items
+    are retried one by one, so that only the callers whose item fails get the
+    error. Up to `max_concurrent_batches`
+    batches run at the same time, for batch functions that are backed by
+    several model instances.
+
+    Args:
+        name (str): Name of the engine, used in errors and statistics.
+        batch_function (Callable[[List], List]): Blocking function mapping a list of items to a list of results in the same order.
+        executor (BoundedExecutor): Pool the batches run on.
+        max_batch_size (int): Maximum number of items per call of batch_function.
+        max_wait_ms (float): Maximum time the first item of a batch waits for more items.
+        max_queue (int): Maximum number of items waiting for a batch.
+        max_concurrent_batches (int): Maximum number of batches running at the same time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_function: Callable[[List], List],
+        executor: BoundedExecutor,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 1024,
+        max_concurrent_batches: int = 1,
+    ):
+        self.name = name
+        self.batch_function = batch_function
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.max_concurrent_batches = max_concurrent_batches
+        self.rejected = 0
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._worker = None
+        self._slots = None
+        self._running = set()
+
+    def _ensure_worker(self):
+        """Starts the batching task on the running event loop."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """Queues one item and waits for its result.
+
+        Args:
+            item (Any): Input item for batch_function.
+
+        Returns:
+            Any: The result of batch_function for this item.
+        """
+        return (await self.submit_many([item]))[0]
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        """Queues several items individually and waits for all their results.
+
+        The items may end up in different batches, together with items of
+        other callers.
+
+        Args:
+            items (List[Any]): Input items for batch_function.
+
+        Returns:
+            List[Any]: Results in the order of items.
+
+        Raises:
+            ServiceOverloadedException: If the queue has no room for the items.
+        """
+        self._ensure_worker()
+        if self._queue.qsize() + len(items) > self.max_queue:
+            self.rejected += 1
+            raise ServiceOverloadedException(self.name, retry_after)
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._queue.put_nowait((item, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self) -> list:
+        """Waits for the next batch of queued (item, future) pairs."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # callers that went away no longer need a result
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _run(self):
+        while True:
+            # A batch is only collected once it can run, so that it takes
+            # every item arriving while the previous batches run
+            await self._slots.acquire()
+            batch = await self._collect()
+            if not batch:
+                self._slots.release()
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: list):
+        """Runs batch_function on a batch of (item, future) pairs and frees its slot."""
+        try:
+            results = await self.executor.run(
+                self.batch_function, [item for item, _ in batch]
+            )
+        except ServiceOverloadedException as e:
+            self._resolve(batch, exception=e)
+        except Exception as e:
+            # One item may fail the whole batch, the others are not to blame
+            if len(batch) == 1:
+                self._resolve(batch, exception=e)
+            else:
+                for pair in batch:
+                    await self._run_single(pair)
+        else:
+            self._resolve(batch, results)
+        finally:
+            self._slots.release()
+
+    async def _run_single(self, pair: tuple):
+        """Runs batch_function on a single (item, future) pair."""
+        try:
+            results = await self.executor.run(self.batch_function, [pair[0]])
+        except Exception as e:
+            self._resolve([pair], exception=e)
+        else:
+            self._resolve([pair], results)
+
+    @staticmethod
+    def _resolve(batch: list, results: list = None, exception: Exception = None):
+        """Hands every waiting caller its result or the exception."""
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(results[i])
+
+    def stats(self) -> dict:
+        """Returns the queue depth and the number of batches and items processed."""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_queue": self.max_queue,
+            "running_batches": len(self._running),
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "rejected": self.rejected,
+        }
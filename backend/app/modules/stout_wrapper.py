@@ -1,11 +1,21 @@
-import tensorflow as tf
-from rdkit import Chem
-import pickle
+from __future__ import annotations
+
 import re
 import pystow
 import os
+import sys
 import zipfile
 import numpy as np
+from typing import TYPE_CHECKING, Iterator, List, NamedTuple, Optional, Tuple
+from app.modules import backends
+from app.modules import loader
+from app.modules import translation_cache
+from app.modules.rdkit_wrapper import canonical_smiles
+from app.modules.vocabulary import load_vocabulary
+
+if TYPE_CHECKING:
+    # TensorFlow is imported when the models are loaded, see app.modules.loader
+    import tensorflow as tf
 
 # Set path
 default_path = pystow.join("STOUT-V2", "models")
@@ -14,6 +24,20 @@ default_path = pystow.join("STOUT-V2", "models")
 model_url = "https://zenodo.org/records/13318286/files/models.zip?download=1"
 model_path = str(default_path) + "/translator_forward/"
 
+# Number of sequences sent through the translator in a single call
+batch_size = int(os.getenv("STOUT_BATCH_SIZE", "16"))
+
+# Maximum number of input tokens of the trained models
+inp_max_length_forward = 602
+inp_max_length_backward = 1002
+
+# Padding lengths inputs are bucketed into, the model maximum is always the last bucket
+length_buckets = tuple(
+    int(bucket)
+    for bucket in os.getenv("STOUT_LENGTH_BUCKETS", "64,128,256,512").split(",")
+    if bucket.strip()
+)
+
 
 # Downloads the model and unzips the file downloaded, if the model is not present on the working directory.
 def download_trained_weights(model_url: str, model_path: str, verbose=1):
@@ -41,35 +65,34 @@ def download_trained_weights(model_url: str, model_path: str, verbose=1):
             zip_ref.extractall(model_path.parent.as_posix())
 
 
-# download models to a default location
-if not os.path.exists(model_path):
-    download_trained_weights(model_url, default_path)
+def ensure_trained_weights():
+    """Downloads the models to the default location if they are not present yet."""
+    if not os.path.exists(model_path):
+        download_trained_weights(model_url, default_path)
 
 
 def load_model_forward():
     """
     Load the forward translation model along with the required tokenizers.
 
-    This function loads the input and target tokenizers used for translating
+    This function loads the input and target vocabularies used for translating
     SMILES to IUPAC names, along with the saved forward translation model.
 
     Returns:
         tuple: A tuple containing:
-            - inp_lang (Tokenizer): The tokenizer for the input language (SMILES).
-            - targ_lang (Tokenizer): The tokenizer for the target language (IUPAC names).
+            - inp_lang (Vocabulary): The vocabulary for the input language (SMILES).
+            - targ_lang (Vocabulary): The vocabulary for the target language (IUPAC names).
             - inp_max_length (int): The maximum length of the input sequences.
-            - reloaded (tf.Module): The loaded TensorFlow model for forward translation.
+            - reloaded (Callable): The forward translator, loaded with the STOUT_BACKEND inference backend.
     """
-    inp_lang = pickle.load(
-        open(default_path.as_posix() + "/assets/tokenizer_input.pkl", "rb")
+    ensure_trained_weights()
+    inp_lang = load_vocabulary(default_path.as_posix() + "/assets/tokenizer_input.pkl")
+    targ_lang = load_vocabulary(
+        default_path.as_posix() + "/assets/tokenizer_target.pkl"
     )
 
-    targ_lang = pickle.load(
-        open(default_path.as_posix() + "/assets/tokenizer_target.pkl", "rb")
-    )
-
-    inp_max_length = 602
-    reloaded = tf.saved_model.load(default_path.as_posix() + "/translator_forward")
+    inp_max_length = inp_max_length_forward
+    reloaded = backends.load_translator(default_path.as_posix() + "/translator_forward")
 
     return inp_lang, targ_lang, inp_max_length, reloaded
 
@@ -78,42 +101,29 @@ def load_model_backward():
     """
     Load the backward translation model along with the required tokenizers.
 
-    This function loads the input and target tokenizers used for translating
+    This function loads the input and target vocabularies used for translating
     IUPAC names to SMILES, along with the saved backward translation model.
 
     Returns:
         tuple: A tuple containing:
-            - inp_lang (Tokenizer): The tokenizer for the input language (IUPAC names).
-            - targ_lang (Tokenizer): The tokenizer for the target language (SMILES).
+            - inp_lang (Vocabulary): The vocabulary for the input language (IUPAC names).
+            - targ_lang (Vocabulary): The vocabulary for the target language (SMILES).
             - inp_max_length (int): The maximum length of the input sequences.
-            - reloaded (tf.Module): The loaded TensorFlow model for backward translation.
+            - reloaded (Callable): The backward translator, loaded with the STOUT_BACKEND inference backend.
     """
-    targ_lang = pickle.load(
-        open(default_path.as_posix() + "/assets/tokenizer_input.pkl", "rb")
-    )
+    ensure_trained_weights()
+    targ_lang = load_vocabulary(default_path.as_posix() + "/assets/tokenizer_input.pkl")
+    inp_lang = load_vocabulary(default_path.as_posix() + "/assets/tokenizer_target.pkl")
 
-    inp_lang = pickle.load(
-        open(default_path.as_posix() + "/assets/tokenizer_target.pkl", "rb")
-    )
-
-    inp_max_length = 1002
-    reloaded = tf.saved_model.load(default_path.as_posix() + "/translator_reverse")
+    inp_max_length = inp_max_length_backward
+    reloaded = backends.load_translator(default_path.as_posix() + "/translator_reverse")
 
     return inp_lang, targ_lang, inp_max_length, reloaded
 
 
-(
-    inp_lang_forward,
-    targ_lang_forward,
-    inp_max_length_forward,
-    reloaded_forward,
-) = load_model_forward()
-(
-    inp_lang_backward,
-    targ_lang_backward,
-    inp_max_length_backward,
-    reloaded_backward,
-) = load_model_backward()
+# Models are loaded on first use or by the startup loader, see app.modules.loader
+forward_model = loader.register("stout_forward", load_model_forward)
+backward_model = loader.register("stout_backward", load_model_backward)
 
 
 def preprocess_sentence(w: str) -> str:
@@ -135,20 +145,97 @@ def tokenize_input(input_SMILES: str, inp_lang, inp_max_length: int) -> np.array
 
     Args:
         input_SMILES (string): SMILES string given by the user.
-        inp_lang: keras_preprocessing.text.Tokenizer object with input language.
+        inp_lang (Vocabulary): Vocabulary of the input language.
         inp_max_length: maximum number of characters in the input language.
 
     Returns:
         tokenized_input (np.array): The SMILES get split into meaningful chunks
         and gets converted into meaningful tokens. The tokens are arrays.
     """
-    sentence = preprocess_sentence(input_SMILES)
-    inputs = [inp_lang.word_index[i] for i in sentence.split(" ")]
-    tokenized_input = tf.keras.preprocessing.sequence.pad_sequences(
-        [inputs], maxlen=inp_max_length, padding="post"
+    return tokenize_input_batch([input_SMILES], inp_lang, inp_max_length)
+
+
+def get_buckets(inp_max_length: int) -> Tuple[int, ...]:
+    """Returns the padding buckets available for a model.
+
+    Args:
+        inp_max_length (int): maximum number of tokens the model accepts.
+
+    Returns:
+        Tuple[int, ...]: Ascending padding lengths ending with inp_max_length.
+    """
+    return tuple(
+        sorted(bucket for bucket in set(length_buckets) if bucket < inp_max_length)
+    ) + (inp_max_length,)
+
+
+def bucket_length(length: int, buckets: Tuple[int, ...]) -> int:
+    """Returns the smallest bucket that fits a sequence.
+
+    Sequences longer than the largest bucket are truncated to it by
+    pad_sequences, as with the fixed padding.
+
+    Args:
+        length (int): Number of tokens in the sequence.
+        buckets (Tuple[int, ...]): Ascending padding lengths.
+
+    Returns:
+        int: Padding length for the sequence.
+    """
+    for bucket in buckets:
+        if length <= bucket:
+            return bucket
+    return buckets[-1]
+
+
+def tokenize_input_batch(
+    input_list: List[str], inp_lang, inp_max_length: int, buckets: tuple = None
+) -> np.array:
+    """Tokenizes a list of split SMILES/IUPAC names into one padded array.
+
+    The array is padded to the smallest bucket that fits the longest input
+    instead of always to inp_max_length.
+
+    Args:
+        input_list (List[str]): Space separated token strings.
+        inp_lang (Vocabulary): Vocabulary of the input language.
+        inp_max_length: maximum number of characters in the input language.
+        buckets (tuple, optional): Padding lengths, defaults to get_buckets(inp_max_length).
+
+    Returns:
+        np.array: Array of shape (len(input_list), padded length).
+
+    Raises:
+        InvalidInputException: If an input contains characters the model does not know.
+    """
+    token_lists = [preprocess_sentence(sentence).split(" ") for sentence in input_list]
+    pad_length = bucket_length(
+        max(len(tokens) for tokens in token_lists),
+        buckets or get_buckets(inp_max_length),
     )
+    return inp_lang.encode_batch(token_lists, pad_length)
+
+
+def bucket_batches(input_list: List[str], inp_max_length: int) -> Iterator[List[int]]:
+    """Groups inputs by padding bucket and splits each group into batches.
+
+    Args:
+        input_list (List[str]): Space separated token strings.
+        inp_max_length (int): maximum number of tokens the model accepts.
+
+    Yields:
+        List[int]: Indices into input_list of one batch, all in the same bucket.
+    """
+    buckets = get_buckets(inp_max_length)
+    groups = {}
+    for i, sentence in enumerate(input_list):
+        length = len(preprocess_sentence(sentence).split(" "))
+        groups.setdefault(bucket_length(length, buckets), []).append(i)
 
-    return tokenized_input
+    for bucket in sorted(groups):
+        indices = groups[bucket]
+        for start in range(0, len(indices), batch_size):
+            yield indices[start : start + batch_size]
 
 
 def detokenize_output_forward(predicted_array: tf.Tensor) -> str:
@@ -160,14 +247,21 @@ def detokenize_output_forward(predicted_array: tf.Tensor) -> str:
     Returns:
         str: Detokenized output string.
     """
-    outputs = [targ_lang_forward.index_word[i] for i in predicted_array[0].numpy()]
-    prediction = (
-        "".join([str(elem) for elem in outputs])
-        .replace("§", " ")
-        .replace("<start>", "")
-        .replace("<end>", "")
+    return detokenize_output_forward_batch(predicted_array)[0]
+
+
+def detokenize_output_forward_batch(predicted_array: tf.Tensor) -> List[str]:
+    """Detokenizes a batch of predicted IUPAC name sequences.
+
+    Args:
+        predicted_array (tf.Tensor): Predicted output sequences.
+
+    Returns:
+        List[str]: One detokenized IUPAC name per row.
+    """
+    return forward_model.get()[1].decode_batch(
+        np.asarray(predicted_array), replacements={"§": " "}
     )
-    return prediction
 
 
 def detokenize_output_backward(predicted_array: tf.Tensor) -> str:
@@ -179,13 +273,19 @@ def detokenize_output_backward(predicted_array: tf.Tensor) -> str:
     Returns:
         str: Detokenized output string.
     """
-    outputs = [targ_lang_backward.index_word[i] for i in predicted_array[0].numpy()]
-    prediction = (
-        "".join([str(elem) for elem in outputs])
-        .replace("<start>", "")
-        .replace("<end>", "")
-    )
-    return prediction
+    return detokenize_output_backward_batch(predicted_array)[0]
+
+
+def detokenize_output_backward_batch(predicted_array: tf.Tensor) -> List[str]:
+    """Detokenizes a batch of predicted SMILES sequences.
+
+    Args:
+        predicted_array (tf.Tensor): Predicted output sequences.
+
+    Returns:
+        List[str]: One detokenized SMILES string per row.
+    """
+    return backward_model.get()[1].decode_batch(np.asarray(predicted_array))
 
 
 def split_smiles(SMILES: str) -> str:
@@ -197,15 +297,23 @@ def split_smiles(SMILES: str) -> str:
     Returns:
         str: Tokenized SMILES.
     """
-    SMILES = SMILES.replace("\\/", "/")
-    mol = Chem.MolFromSmiles(SMILES, sanitize=False)
-    if mol:
-        smiles = Chem.MolToSmiles(mol, kekuleSmiles=True)
-        splitted_list = list(smiles)
-        tokenized_SMILES = re.sub(
-            r"\s+(?=[a-z])", "", " ".join(map(str, splitted_list))
-        )
-        return tokenized_SMILES
+    smiles = canonical_smiles(SMILES)
+    if smiles:
+        return split_canonical_smiles(smiles)
+
+
+def split_canonical_smiles(smiles: str) -> str:
+    """Splits an already canonical SMILES into space separated tokens.
+
+    Args:
+        smiles (str): Canonical SMILES from canonical_smiles.
+
+    Returns:
+        str: Tokenized SMILES.
+    """
+    splitted_list = list(smiles)
+    tokenized_SMILES = re.sub(r"\s+(?=[a-z])", "", " ".join(map(str, splitted_list)))
+    return tokenized_SMILES
 
 
 def split_iupac(IUPACName: str) -> str:
@@ -223,6 +331,169 @@ def split_iupac(IUPACName: str) -> str:
     return tokenized_IUPACname
 
 
+class Prediction(NamedTuple):
+    """A translation and the confidence of the model in it.
+
+    Attributes:
+        text (str): Predicted IUPAC name or SMILES.
+        confidence (float): Geometric mean of the token probabilities between 0 and 1,
+            None if unknown, e.g. for translations cached in the other direction.
+    """
+
+    text: str
+    confidence: Optional[float] = None
+
+
+def sequence_confidence(
+    scores, predicted: np.ndarray, end_id: Optional[int] = None
+) -> np.ndarray:
+    """Reduces the confidence output of a translator to one score per row.
+
+    Token probabilities are averaged geometrically over the generated
+    tokens, up to and including the first end token. Rows without an end
+    token, or all rows without end_id, are averaged over the full width.
+    Translators returning a single score per row are passed through.
+
+    Args:
+        scores: Second output of the translator, None for the benchmark stub.
+        predicted (np.ndarray): Predicted token ids, one row per input, starting with the start token.
+        end_id (int, optional): Id of the end token in the target vocabulary.
+
+    Returns:
+        np.ndarray: One score per row, NaN where the translator gave none.
+    """
+    rows = len(predicted)
+    if scores is None:
+        return np.full(rows, np.nan)
+    try:
+        scores = np.asarray(scores, dtype=np.float64).reshape(rows, -1)
+    except ValueError:
+        return np.full(rows, np.nan)
+    if scores.shape[1] == 1:
+        return scores[:, 0]
+    lengths = np.full(rows, scores.shape[1])
+    if end_id is not None:
+        # scores[:, i] is the probability of predicted[:, i + 1]
+        is_end = np.asarray(predicted)[:, 1 : scores.shape[1] + 1] == end_id
+        ended = is_end.any(axis=1)
+        lengths[ended] = is_end[ended].argmax(axis=1) + 1
+    mask = np.arange(scores.shape[1]) < lengths[:, None]
+    logs = np.log(np.clip(scores, 1e-12, 1.0))
+    return np.exp(np.where(mask, logs, 0).sum(axis=1) / lengths)
+
+
+def batch_input_errors() -> Tuple[type, ...]:
+    """Returns the errors of a translator that rejects a batched input.
+
+    TensorFlow errors are only included once TensorFlow has been imported,
+    by a SavedModel or TFLite translator: other translators cannot raise them.
+    """
+    tf = sys.modules.get("tensorflow")
+    if tf is None:
+        return (ValueError,)
+    return (ValueError, tf.errors.InvalidArgumentError)
+
+
+def run_translator_scored(
+    reloaded, tokenized_input: np.array, end_id: Optional[int] = None
+) -> Tuple[np.array, np.array]:
+    """Runs a translator on a batch of tokenized inputs, keeping its confidence.
+
+    Exported translators that only accept a single sequence per call are
+    detected on the first batched call, by an error or by fewer output rows
+    than inputs; from then on the rows are translated one at a time.
+    Converted translators with a fixed input length get their inputs padded
+    to it.
+
+    Args:
+        reloaded (Callable): Translator from backends.load_translator, or any
+            callable with the same signature such as the benchmark stub.
+        tokenized_input (np.array): Padded token ids, one row per input.
+        end_id (int, optional): Id of the end token, see sequence_confidence.
+
+    Returns:
+        Tuple[np.array, np.array]: Predicted token ids, one row per input, and
+        the confidence of each row from sequence_confidence.
+    """
+    input_length = getattr(reloaded, "input_length", None)
+    if input_length and tokenized_input.shape[1] < input_length:
+        tokenized_input = np.pad(
+            tokenized_input, ((0, 0), (0, input_length - tokenized_input.shape[1]))
+        )
+    if len(tokenized_input) > 1 and not getattr(reloaded, "single_input", False):
+        try:
+            result, scores = reloaded(tokenized_input)
+            result = np.asarray(result)
+        except batch_input_errors():
+            print("Translator does not accept batches, translating row by row")
+            reloaded.single_input = True
+        else:
+            if len(result) == len(tokenized_input):
+                return result, sequence_confidence(scores, result, end_id)
+            print(
+                f"Translator returned {len(result)} rows for {len(tokenized_input)} inputs,"
+                " translating row by row"
+            )
+            reloaded.single_input = True
+
+    rows = []
+    confidences = []
+    for row in tokenized_input:
+        result, scores = reloaded(row[None, :])
+        result = np.asarray(result)[:1]
+        rows.append(result[0])
+        confidences.append(sequence_confidence(scores, result, end_id)[0])
+    width = max(len(row) for row in rows)
+    return (
+        np.stack([np.pad(row, (0, width - len(row))) for row in rows]),
+        np.array(confidences),
+    )
+
+
+def run_translator(reloaded, tokenized_input: np.array) -> np.array:
+    """Runs a translator on a batch of tokenized inputs.
+
+    Args:
+        reloaded (Callable): Loaded translator, see run_translator_scored.
+        tokenized_input (np.array): Padded token ids, one row per input.
+
+    Returns:
+        np.array: Predicted token ids, one row per input.
+    """
+    return run_translator_scored(reloaded, tokenized_input)[0]
+
+
+def _confidence(score: float) -> Optional[float]:
+    return None if np.isnan(score) else round(float(score), 4)
+
+
+def translate_IUPAC(smiles_list: List[str]) -> List[Prediction]:
+    """Runs the forward model on canonical SMILES without consulting the cache.
+
+    Args:
+        smiles_list (List[str]): Canonical SMILES from canonical_smiles.
+
+    Returns:
+        List[Prediction]: Predicted IUPAC names in the order of the input.
+    """
+    predictions = [Prediction("")] * len(smiles_list)
+    if not smiles_list:
+        return predictions
+    inp_lang, targ_lang, inp_max_length, reloaded = forward_model.get()
+    sentences = [split_canonical_smiles(smiles) for smiles in smiles_list]
+
+    for batch in bucket_batches(sentences, inp_max_length):
+        decoded = tokenize_input_batch(
+            [sentences[j] for j in batch], inp_lang, inp_max_length
+        )
+        result, confidences = run_translator_scored(reloaded, decoded, targ_lang.end_id)
+        for j, prediction, confidence in zip(
+            batch, detokenize_output_forward_batch(result), confidences
+        ):
+            predictions[j] = Prediction(prediction, _confidence(confidence))
+    return predictions
+
+
 def predict_IUPAC(smiles: str) -> str:
     """
     Predict the IUPAC name given a SMILES string.
@@ -233,11 +504,93 @@ def predict_IUPAC(smiles: str) -> str:
     Returns:
         str: Predicted IUPAC name.
     """
-    x_can = split_smiles(smiles)
-    decoded = tokenize_input(x_can, inp_lang_forward, inp_max_length_forward)
-    result, confidence_score = reloaded_forward(tf.constant(decoded))
-    prediction = detokenize_output_forward(result)
-    return prediction
+    return predict_IUPAC_batch([smiles])[0]
+
+
+def predict_IUPAC_batch(smiles_list: List[str]) -> List[str]:
+    """
+    Predict the IUPAC names for a list of SMILES strings.
+
+    Args:
+        smiles_list (List[str]): Input SMILES strings.
+
+    Returns:
+        List[str]: Predicted IUPAC names in the order of the input, see predict_IUPAC_scored.
+    """
+    return [prediction.text for prediction in predict_IUPAC_scored(smiles_list)]
+
+
+def predict_IUPAC_scored(smiles_list: List[str]) -> List[Prediction]:
+    """
+    Predict the IUPAC names for a list of SMILES strings with their confidence.
+
+    Names are looked up in the translation cache by canonical SMILES first.
+    The remaining unique molecules are grouped by length bucket and translated
+    in batches of `batch_size`. Entries that RDKit cannot parse yield an
+    empty name.
+
+    Args:
+        smiles_list (List[str]): Input SMILES strings.
+
+    Returns:
+        List[Prediction]: Predicted IUPAC names in the order of the input.
+    """
+    keys = [canonical_smiles(smiles) for smiles in smiles_list]
+    cached = {
+        key: Prediction(*translation)
+        for key, translation in translation_cache.get_iupac(
+            [key for key in keys if key]
+        ).items()
+    }
+    pending = [key for key in dict.fromkeys(keys) if key and key not in cached]
+
+    translated = list(zip(pending, translate_IUPAC(pending)))
+    translation_cache.store_iupac(translated)
+    cached.update(translated)
+
+    return [cached.get(key, Prediction("")) if key else Prediction("") for key in keys]
+
+
+def postprocess_smiles(prediction: str) -> str:
+    """Drops the fragments of over-fragmented SMILES predictions.
+
+    Args:
+        prediction (str): Detokenized SMILES prediction.
+
+    Returns:
+        str: The first fragment if the prediction has more than five, otherwise the prediction.
+    """
+    split_prediction = prediction.split(".")
+    return split_prediction[0] if len(split_prediction) > 5 else prediction
+
+
+def translate_SMILES(iupac_list: List[str]) -> List[Prediction]:
+    """Runs the backward model on IUPAC names without consulting the cache.
+
+    Args:
+        iupac_list (List[str]): Input IUPAC names.
+
+    Returns:
+        List[Prediction]: Predicted SMILES strings in the order of the input.
+    """
+    predictions = [Prediction("")] * len(iupac_list)
+    if not iupac_list:
+        return predictions
+    inp_lang, targ_lang, inp_max_length, reloaded = backward_model.get()
+    sentences = [split_iupac(name) for name in iupac_list]
+
+    for batch in bucket_batches(sentences, inp_max_length):
+        decoded = tokenize_input_batch(
+            [sentences[j] for j in batch], inp_lang, inp_max_length
+        )
+        result, confidences = run_translator_scored(reloaded, decoded, targ_lang.end_id)
+        for j, prediction, confidence in zip(
+            batch, detokenize_output_backward_batch(result), confidences
+        ):
+            predictions[j] = Prediction(
+                postprocess_smiles(prediction), _confidence(confidence)
+            )
+    return predictions
 
 
 def predict_SMILES(iupacname: str) -> str:
@@ -250,9 +603,44 @@ def predict_SMILES(iupacname: str) -> str:
     Returns:
         str: Predicted SMILES string.
     """
-    x_can = split_iupac(iupacname)
-    decoded = tokenize_input(x_can, inp_lang_backward, inp_max_length_backward)
-    result, confidence = reloaded_backward(decoded)
-    prediction = detokenize_output_backward(result)
-    split_prediction = prediction.split(".")
-    return split_prediction[0] if len(split_prediction) > 5 else prediction
+    return predict_SMILES_batch([iupacname])[0]
+
+
+def predict_SMILES_batch(iupac_list: List[str]) -> List[str]:
+    """
+    Predict the SMILES strings for a list of IUPAC names.
+
+    Args:
+        iupac_list (List[str]): Input IUPAC names.
+
+    Returns:
+        List[str]: Predicted SMILES strings in the order of the input, see predict_SMILES_scored.
+    """
+    return [prediction.text for prediction in predict_SMILES_scored(iupac_list)]
+
+
+def predict_SMILES_scored(iupac_list: List[str]) -> List[Prediction]:
+    """
+    Predict the SMILES strings for a list of IUPAC names with their confidence.
+
+    Names are looked up in the translation cache by normalized name first,
+    the remaining unique names are translated in batches.
+
+    Args:
+        iupac_list (List[str]): Input IUPAC names.
+
+    Returns:
+        List[Prediction]: Predicted SMILES strings in the order of the input.
+    """
+    keys = [translation_cache.normalize_name(name) for name in iupac_list]
+    cached = {
+        key: Prediction(*translation)
+        for key, translation in translation_cache.get_smiles(keys).items()
+    }
+    pending = [key for key in dict.fromkeys(keys) if key not in cached]
+
+    translated = list(zip(pending, translate_SMILES(pending)))
+    translation_cache.store_smiles(translated)
+    cached.update(translated)
+
+    return [cached.get(key, Prediction("")) for key in keys]
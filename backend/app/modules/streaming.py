@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List
+
+from fastapi import Request
+
+from app.exception_handlers import ServiceOverloadedException
+
+# Number of input lines processed together in streaming responses
+stream_chunk_size = int(os.getenv("STREAM_CHUNK_SIZE", "64"))
+# Request bodies larger than this are spooled to a temporary file
+spool_max_size = int(os.getenv("STREAM_SPOOL_SIZE", str(1024 * 1024)))
+
+
+async def spool_request(request: Request) -> tempfile.SpooledTemporaryFile:
+    """Reads the request body into a spooled temporary file.
+
+    The body has to be read before a streaming response starts, since the
+    response listens on the same channel for disconnects. Spooling keeps the
+    memory use bounded for arbitrarily large uploads.
+
+    Args:
+        request (Request): The FastAPI Request object.
+
+    Returns:
+        SpooledTemporaryFile: The body, rewound to the start. The caller closes it.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_max_size)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def iter_lines(spool) -> Iterator[str]:
+    """Yields the stripped, non-empty lines of a binary file."""
+    for line in spool:
+        line = line.decode("utf-8", errors="replace").strip()
+        if line:
+            yield line
+
+
+def iter_chunks(lines: Iterator[str], size: int = None) -> Iterator[List[str]]:
+    """Groups lines into lists of at most `size` lines."""
+    size = size or stream_chunk_size
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def retry_when_overloaded(
+    function: Callable[..., Awaitable[Any]], *args, **kwargs
+) -> Any:
+    """Awaits function, waiting and retrying while a queue is full.
+
+    A streaming response has already sent its status code, so instead of
+    answering 503 the stream slows down until there is room again.
+    """
+    while True:
+        try:
+            return await function(*args, **kwargs)
+        except ServiceOverloadedException as e:
+            await asyncio.sleep(e.retry_after)
+
+
+async def close_after(iterator: AsyncIterator, resource) -> AsyncIterator:
+    """Yields from iterator and closes resource once it is exhausted or cancelled."""
+    try:
+        async for item in iterator:
+            yield item
+    finally:
+        resource.close()
@@ -0,0 +1,151 @@
+"""Typed rows of translation tables and their JSON and HTML forms.
+
+Rows are built once by get_opsin_convertion and serialized directly, the
+column names of the original tab separated tables are only used for the
+legacy JSON and HTML output.
+"""
+from __future__ import annotations
+
+import html
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import orjson
+
+
+class TranslationRow(NamedTuple):
+    """One translated molecule.
+
+    Attributes:
+        smiles (str): Input SMILES.
+        iupac (str): Predicted IUPAC name.
+        structure (str): Depiction of the input, when visualized.
+        retranslation (str): "same as input", "not same as input", "unable to assess" or,
+            for confident predictions, "not retranslated", when retranslated.
+        retranslated_smiles (str): OPSIN SMILES of the predicted name or "failed to retranslate".
+        retranslated_structure (str): Depiction of the retranslated SMILES, when visualized.
+        confidence (float): Confidence of STOUT in the predicted name, None if unknown.
+    """
+
+    smiles: str
+    iupac: str
+    structure: Optional[str] = None
+    retranslation: Optional[str] = None
+    retranslated_smiles: Optional[str] = None
+    retranslated_structure: Optional[str] = None
+    confidence: Optional[float] = None
+
+
+def legacy_columns(retranslate: bool, visualize: bool) -> List[Tuple[str, str]]:
+    """Returns the (column name, row field) pairs of the original tables.
+
+    Note that "Retranslated Structure" names the retranslation verdict and,
+    in visualized tables, also the retranslated depiction.
+    """
+    columns = [("Original SMILES", "smiles")]
+    if visualize:
+        columns.append(("Original Structure", "structure"))
+    columns.append(("Predicted IUPAC name", "iupac"))
+    columns.append(("Confidence", "confidence"))
+    if retranslate:
+        columns.append(("Retranslated Structure", "retranslation"))
+        columns.append(("Retranslated SMILES", "retranslated_smiles"))
+        if visualize:
+            columns.append(("Retranslated Structure", "retranslated_structure"))
+    return columns
+
+
+def to_legacy_record(row: TranslationRow, columns: List[Tuple[str, str]]) -> dict:
+    """Returns a row as a dictionary keyed by the original column names."""
+    return {name: getattr(row, field) for name, field in columns}
+
+
+def to_legacy_json(rows: List[TranslationRow], columns: List[Tuple[str, str]]) -> bytes:
+    """Serializes rows column by column, as DataFrame.to_json did.
+
+    Returns:
+        bytes: {"column": {"1": value, ...}, ...} with rows numbered from 1.
+    """
+    table = {name: {} for name, _ in columns}
+    for index, row in enumerate(rows, start=1):
+        for name, field in columns:
+            table[name][str(index)] = getattr(row, field)
+    return orjson.dumps(table)
+
+
+def to_records(rows: List[TranslationRow], retranslate: bool) -> List[Dict[str, Optional[str]]]:
+    """Returns the rows as dictionaries of the TranslationTable response model."""
+    if retranslate:
+        return [
+            {
+                "smiles": row.smiles,
+                "iupac": row.iupac,
+                "confidence": row.confidence,
+                "retranslation": row.retranslation,
+                "retranslated_smiles": row.retranslated_smiles,
+            }
+            for row in rows
+        ]
+    return [
+        {"smiles": row.smiles, "iupac": row.iupac, "confidence": row.confidence}
+        for row in rows
+    ]
+
+
+def escape_cell(value: str) -> str:
+    """Escapes a cell value for HTML, quotes are left as they are."""
+    return html.escape(value, quote=False)
+
+
+html_table_foot = "</tbody>\n</table>"
+
+
+def html_table_head(columns: List[Tuple[str, str]]) -> str:
+    """Returns the opening of an HTML table up to its first row."""
+    header = "".join(f"<th>{html.escape(name)}</th>" for name, _ in columns)
+    return (
+        '<table border="1" class="dataframe">\n'
+        f"<thead><tr>{header}</tr></thead>\n<tbody>\n"
+    )
+
+
+def _cell_text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def html_table_rows(
+    rows: List[TranslationRow],
+    columns: List[Tuple[str, str]],
+    format_cell: Callable[[str], str] = escape_cell,
+) -> str:
+    """Returns the rows of an HTML table, one line per row."""
+    return "".join(
+        "<tr>"
+        + "".join(
+            f"<td>{format_cell(_cell_text(getattr(row, field)))}</td>"
+            for _, field in columns
+        )
+        + "</tr>\n"
+        for row in rows
+    )
+
+
+def to_html(
+    rows: List[TranslationRow],
+    columns: List[Tuple[str, str]],
+    format_cell: Callable[[str], str] = escape_cell,
+) -> str:
+    """Renders rows as an HTML table.
+
+    Args:
+        rows (List[TranslationRow]): Table rows.
+        columns (List[Tuple[str, str]]): Columns from legacy_columns.
+        format_cell (Callable[[str], str], optional): Converts a cell value to HTML, escaping it by default.
+
+    Returns:
+        str: The HTML table.
+    """
+    return (
+        html_table_head(columns)
+        + html_table_rows(rows, columns, format_cell)
+        + html_table_foot
+    )
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import os
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pystow
+
+from app.modules.cache import TwoTierCache
+
+# An empty STOUT_CACHE_DIR keeps the caches in memory only
+cache_dir = os.getenv("STOUT_CACHE_DIR", str(pystow.join("STOUT-V2", "cache")))
+cache_path = os.path.join(cache_dir, "translations.sqlite") if cache_dir else None
+cache_size = int(os.getenv("STOUT_CACHE_SIZE", "10000"))
+cache_max_entries = int(os.getenv("STOUT_CACHE_MAX_ENTRIES", "1000000"))
+cache_ttl = float(os.getenv("STOUT_CACHE_TTL", "0"))
+
+
+def _make_cache(name: str) -> TwoTierCache:
+    return TwoTierCache(name, cache_size, cache_path, cache_max_entries, cache_ttl)
+
+
+# canonical SMILES -> STOUT IUPAC name
+iupac_cache = _make_cache("iupac")
+# normalized IUPAC name -> STOUT SMILES
+smiles_cache = _make_cache("smiles")
+# normalized IUPAC name -> OPSIN SMILES
+opsin_cache = _make_cache("opsin")
+# key and translation -> confidence of the model in the translation
+confidence_cache = _make_cache("confidence")
+
+# A translation as (text, confidence), see stout_wrapper.Prediction
+Translation = Tuple[str, Optional[float]]
+
+
+def normalize_name(name: str) -> str:
+    """Normalizes an IUPAC name for use as a cache key.
+
+    Unicode compatibility forms are folded and whitespace is collapsed. The
+    case is kept, since it carries meaning in stereo descriptors.
+
+    Args:
+        name (str): IUPAC name.
+
+    Returns:
+        str: Normalized name.
+    """
+    return " ".join(unicodedata.normalize("NFKC", name).split())
+
+
+def _confidence_key(key: str, text: str) -> str:
+    # Keyed by the translation too, so a translation stored by the other
+    # direction never gets the confidence of an earlier one
+    return f"{key}\n{text}"
+
+
+def _with_confidence(texts: Dict[str, str]) -> Dict[str, Translation]:
+    confidences = confidence_cache.get_many(
+        [_confidence_key(key, text) for key, text in texts.items()]
+    )
+    translations = {}
+    for key, text in texts.items():
+        confidence = confidences.get(_confidence_key(key, text))
+        translations[key] = (text, float(confidence) if confidence else None)
+    return translations
+
+
+def _store_confidences(pairs: List[Tuple[str, Translation]]):
+    confidence_cache.set_many(
+        (_confidence_key(key, text), str(confidence))
+        for key, (text, confidence) in pairs
+        if confidence is not None
+    )
+
+
+def get_iupac(keys: List[str]) -> Dict[str, Translation]:
+    """Returns the cached IUPAC names and their confidence by canonical SMILES."""
+    return _with_confidence(iupac_cache.get_many(keys))
+
+
+def get_smiles(keys: List[str]) -> Dict[str, Translation]:
+    """Returns the cached SMILES and their confidence by normalized IUPAC name."""
+    return _with_confidence(smiles_cache.get_many(keys))
+
+
+def store_iupac(pairs: Iterable[Tuple[str, Translation]]):
+    """Stores forward translations and their reverse direction.
+
+    The reverse direction is stored without confidence, and only for names
+    that have no cached translation yet, since its value is the input of
+    the caller rather than a model output.
+
+    Args:
+        pairs (Iterable[Tuple[str, Translation]]): (canonical SMILES, (IUPAC name, confidence)) pairs.
+    """
+    pairs = [(smiles, translation) for smiles, translation in pairs if translation[0]]
+    iupac_cache.set_many((smiles, name) for smiles, (name, _) in pairs)
+    _store_confidences(pairs)
+    smiles_cache.add_many((normalize_name(name), smiles) for smiles, (name, _) in pairs)
+
+
+def store_smiles(pairs: Iterable[Tuple[str, Translation]]):
+    """Stores reverse translations.
+
+    The forward direction is not stored: its key would be the predicted
+    SMILES and its value the name given by the caller, which would let any
+    request replace the forward translation of a molecule.
+
+    Args:
+        pairs (Iterable[Tuple[str, Translation]]): (normalized IUPAC name, (SMILES, confidence)) pairs.
+    """
+    pairs = [(name, translation) for name, translation in pairs if translation[0]]
+    smiles_cache.set_many((name, smiles) for name, (smiles, _) in pairs)
+    _store_confidences(pairs)
+
+
+def stats() -> dict:
+    """Returns the hit and miss counters of all translation caches."""
+    return {
+        cache.name: cache.stats()
+        for cache in (iupac_cache, smiles_cache, opsin_cache, confidence_cache)
+    }
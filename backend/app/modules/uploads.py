@@ -0,0 +1,198 @@
+"""Reading uploaded files into memory with a size limit.
+
+read_uploads parses a multipart/form-data request body as it arrives and
+keeps the files of one form field as bytes. Unlike UploadFile, nothing is
+spooled to a temporary file, and a body over the limit is rejected as soon
+as the limit is exceeded instead of after it was received completely.
+"""
+from __future__ import annotations
+
+import io
+import os
+import zipfile
+from typing import List, NamedTuple
+
+from fastapi import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Largest accepted request body, in MiB
+max_upload_mb = float(os.getenv("DECIMER_MAX_UPLOAD_MB", "20"))
+max_upload_bytes = int(max_upload_mb * 2**20)
+
+
+class UploadError(ValueError):
+    """Raised by read_uploads for a body that is not a valid upload."""
+
+
+class UploadTooLargeError(UploadError):
+    """Raised by read_uploads when the body exceeds the size limit."""
+
+
+class Upload(NamedTuple):
+    """An uploaded file held in memory.
+
+    Attributes:
+        filename (str): File name sent by the client, may be empty.
+        data (bytes): Content of the file.
+    """
+
+    filename: str
+    data: bytes
+
+
+def _decode(value: bytes) -> str:
+    try:
+        return value.decode()
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+async def read_uploads(
+    request: Request,
+    field: str = "file",
+    max_files: int = 1,
+    max_bytes: int = max_upload_bytes,
+) -> List[Upload]:
+    """Reads the files of a form field from a multipart request body.
+
+    Other form fields are ignored.
+
+    Args:
+        request (Request): Request with a multipart/form-data body.
+        field (str, optional): Name of the form field holding the files.
+        max_files (int, optional): Maximum number of files in the field.
+        max_bytes (int, optional): Maximum size of the request body.
+
+    Returns:
+        List[Upload]: The files in the order they were sent.
+
+    Raises:
+        UploadTooLargeError: If the body is larger than max_bytes.
+        UploadError: If the body is not multipart/form-data, has no file in
+            the field or has more than max_files.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise UploadTooLargeError(f"The upload exceeds {max_bytes / 2**20:g} MiB")
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadError("Expected a multipart/form-data upload")
+
+    uploads: List[Upload] = []
+    part = {}
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, header_name=b"", header_value=b"", data=None)
+
+    def on_header_field(data: bytes, start: int, end: int):
+        part["header_name"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        part["header_value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["header_name"].lower()] = part["header_value"]
+        part["header_name"] = part["header_value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(
+            part["headers"].get(b"content-disposition", b"")
+        )
+        if _decode(disposition.get(b"name", b"")) != field or b"filename" not in disposition:
+            return
+        if len(uploads) == max_files:
+            raise UploadError(f"At most {max_files} files can be uploaded at once")
+        part["filename"] = _decode(disposition[b"filename"])
+        part["data"] = bytearray()
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if part["data"] is not None:
+            part["data"] += data[start:end]
+
+    def on_part_end():
+        if part["data"] is not None:
+            uploads.append(Upload(part["filename"], bytes(part["data"])))
+
+    parser = MultipartParser(
+        options[b"boundary"],
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadTooLargeError(f"The upload exceeds {max_bytes / 2**20:g} MiB")
+            parser.write(chunk)
+        parser.finalize()
+    except UploadError:
+        raise
+    except ValueError as e:
+        # python-multipart parse errors are ValueErrors
+        raise UploadError(f"Invalid multipart upload: {e}") from e
+    if not uploads:
+        raise UploadError(f"No file was uploaded in the form field {field!r}")
+    return uploads
+
+
+def expand_archives(uploads: List[Upload], max_files: int, max_bytes: int) -> List[Upload]:
+    """Replaces the zip archives among uploads by the files they contain.
+
+    Directories and hidden files in the archives are skipped. The files of
+    an archive are named archive.zip/path/in/archive.
+
+    Args:
+        uploads (List[Upload]): Uploaded files.
+        max_files (int): Maximum number of files after expanding the archives.
+        max_bytes (int): Maximum total size of the files after expanding the archives.
+
+    Returns:
+        List[Upload]: The files in upload order, archives expanded in place.
+
+    Raises:
+        UploadTooLargeError: If the files exceed max_bytes once extracted.
+        UploadError: If there are more than max_files files, none, or an
+            archive cannot be extracted.
+    """
+    files: List[Upload] = []
+    total = 0
+
+    def add(filename: str, size: int, read):
+        nonlocal total
+        total += size
+        if total > max_bytes:
+            raise UploadTooLargeError(f"The extracted files exceed {max_bytes / 2**20:g} MiB")
+        if len(files) == max_files:
+            raise UploadError(f"At most {max_files} images can be processed at once")
+        files.append(Upload(filename, read()))
+
+    for upload in uploads:
+        if not zipfile.is_zipfile(io.BytesIO(upload.data)):
+            add(upload.filename, len(upload.data), lambda: upload.data)
+            continue
+        try:
+            with zipfile.ZipFile(io.BytesIO(upload.data)) as archive:
+                for info in archive.infolist():
+                    name = info.filename
+                    if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                        continue
+                    # ZipFile reads at most file_size bytes, whatever the data claims
+                    add(f"{upload.filename}/{name}", info.file_size, lambda: archive.read(info))
+        except (zipfile.BadZipFile, NotImplementedError) as e:
+            raise UploadError(f"Cannot extract {upload.filename}: {e}") from e
+    if not files:
+        raise UploadError("The archives contain no files")
+    return files
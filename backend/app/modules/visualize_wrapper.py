@@ -1,52 +1,21 @@
-from app.modules.rdkit_wrapper import Chem
-from app.modules.rdkit_wrapper import get_rdkit_depiction, get_3d_conformers
-from jinja2 import Template
+from app.modules import conformers
+from app.modules.depiction import depict
+from app.modules.rendering import render_viewer
 
 
-def html_embed_molecule(molecule: str) -> str:
+def html_embed_molecule(molecule: str, conformer_url: str = None) -> str:
     """
     Generates an HTML string that embeds a 3D molecule viewer using the 3Dmol.js library.
+    The template is compiled once, see app.modules.rendering.
 
     Args:
         molecule (str): A string representation of the molecule in a format recognized by 3Dmol.js.
+        conformer_url (str, optional): URL polled for the MolBlock when the conformer is still being computed.
 
     Returns:
         str: An HTML string containing the 3D molecule viewer.
     """
-    template_str = """
-    <html>
-    <head>
-    <title>3D Molecule Viewer</title>
-    <script src="https://code.jquery.com/jquery-3.6.3.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/3Dmol/2.0.1/3Dmol.js"></script>
-    <style>
-    head, body {
-        margin: 0;
-        border: 0;
-        padding: 0;
-        max-height: 100vh
-    }
-    </style>
-    <script>
-    $(document).ready(function() {
-        var viewer = $3Dmol.createViewer("viewer");
-        viewer.setBackgroundColor(0xffffff);
-        viewer.addModel(`{{ molecule }}`, "mol");
-        viewer.setStyle({stick:{}});
-        viewer.zoomTo();
-        viewer.render();
-    });
-    </script>
-    </head>
-    <body>
-        <div id="viewer" style="width: 100%; height: 100vh; margin: 0; padding: 0; border: 0;"></div>
-    </body>
-    </html>
-    """
-    template = Template(template_str)
-    html_output = template.render(molecule=molecule)
-
-    return html_output
+    return render_viewer(molecule, conformer_url)
 
 
 def get_svg_2d(smiles: str) -> str:
@@ -58,32 +27,32 @@ def get_svg_2d(smiles: str) -> str:
 
     Returns:
         str: An SVG string representing the 2D molecular structure, or an error message if the SMILES string is invalid.
+        Depictions are cached, see app.modules.depiction.
     """
-    smiles = smiles.replace("\\/", "/")
-    mol = Chem.MolFromSmiles(smiles)
-
-    image_size = (512, 512)
-    if mol:
-        svg_2d = get_rdkit_depiction(mol, image_size)
-
-        return svg_2d.replace("\n", "")
-    else:
-        return "Error reading SMILES string, check again."
+    return depict(smiles, (512, 512)).replace("\n", "")
 
 
-def get_html_3d(smiles: str) -> str:
+def get_html_3d(smiles: str, conformer_url: str = None) -> str:
     """
     Generates an HTML string that embeds a 3D molecule viewer for a given SMILES string.
 
     Args:
         smiles (str): A SMILES string representing the molecular structure.
+        conformer_url (str, optional): URL of the conformer endpoint, ending with a slash.
+            If the conformer is not ready within the time budget, the viewer polls it
+            from there. Without it the conformer is awaited.
 
     Returns:
-        str: An HTML string containing the 3D molecule viewer.
+        str: An HTML string containing the 3D molecule viewer, or an error message if the SMILES string is invalid.
     """
-    smiles = smiles.replace("\\/", "/")
-    mol = Chem.MolFromSmiles(smiles)
-    mol_3d = get_3d_conformers(mol)
-    html_3d = html_embed_molecule(mol_3d)
-
-    return html_3d
+    if conformer_url:
+        result = conformers.get_conformer(smiles)
+    else:
+        result = conformers.get_conformer(smiles, budget=None)
+    if result is None:
+        return "Error reading SMILES string, check again."
+    if result.status == "pending":
+        return html_embed_molecule(None, conformer_url + result.key)
+    if result.status == "failed":
+        return "Unable to generate a 3D structure for this molecule."
+    return html_embed_molecule(result.molblock)
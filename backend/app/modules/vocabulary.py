@@ -0,0 +1,213 @@
+"""Compact, TF-free vocabulary tables for the STOUT and DECIMER tokenizers.
+
+The pickled Keras tokenizers are compiled once into ``.npz`` files holding
+NumPy lookup arrays, so encoding and decoding neither import Keras nor walk
+Python dictionaries token by token.
+
+Compile tokenizers ahead of time with:
+    python -m app.modules.vocabulary path/to/tokenizer.pkl [...]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+from itertools import chain
+from typing import Dict, List
+
+import numpy as np
+
+from app.exception_handlers import InvalidInputException
+
+start_token = "<start>"
+end_token = "<end>"
+
+
+class Vocabulary:
+    """Token table with vectorized encode and decode.
+
+    Args:
+        tokens (List[str]): Token of every id, tokens[0] is the padding token "".
+    """
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = np.array(tokens, dtype=str)
+        order = np.argsort(self.tokens[1:]) + 1
+        self.sorted_tokens = self.tokens[order]
+        self.sorted_ids = order.astype(np.int32)
+        self.start_id = self.id_of(start_token)
+        self.end_id = self.id_of(end_token)
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer) -> Vocabulary:
+        """Builds the table from a Keras Tokenizer."""
+        index_word = tokenizer.index_word
+        tokens = [""] * (max(index_word) + 1)
+        for i, token in index_word.items():
+            tokens[i] = str(token)
+        return cls(tokens)
+
+    @classmethod
+    def load(cls, path: str) -> Vocabulary:
+        """Loads a table saved with save()."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["tokens"].tolist())
+
+    def save(self, path: str):
+        """Saves the table as an .npz file."""
+        with open(path, "wb") as f:
+            np.savez(f, tokens=self.tokens)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def id_of(self, token: str) -> int:
+        """Returns the id of a token, 0 if it is not in the vocabulary."""
+        ids, known = self.lookup(np.array([token], dtype=str))
+        return int(ids[0]) if known[0] else 0
+
+    def lookup(self, flat_tokens: np.ndarray):
+        """Maps an array of tokens to ids with a binary search over the sorted table.
+
+        Args:
+            flat_tokens (np.ndarray): 1-D array of tokens.
+
+        Returns:
+            tuple: The ids (0 for unknown tokens) and a boolean mask of known tokens.
+        """
+        if not len(flat_tokens):
+            return np.zeros(0, np.int32), np.ones(0, bool)
+        positions = np.searchsorted(self.sorted_tokens, flat_tokens)
+        positions = np.minimum(positions, len(self.sorted_tokens) - 1)
+        known = self.sorted_tokens[positions] == flat_tokens
+        return np.where(known, self.sorted_ids[positions], 0), known
+
+    def unknown_tokens(self, tokens: List[str]) -> List[str]:
+        """Returns the tokens of a sequence that are not in the vocabulary."""
+        flat = np.array(tokens, dtype=str)
+        _, known = self.lookup(flat)
+        return list(dict.fromkeys(flat[~known].tolist()))
+
+    def known_rows(self, token_lists: List[List[str]]) -> np.ndarray:
+        """Returns a boolean mask of the sequences made only of known tokens."""
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        _, known = self.lookup(np.array(list(chain.from_iterable(token_lists)), dtype=str))
+        rows = np.repeat(np.arange(len(token_lists)), lengths)
+        return np.bincount(rows[~known], minlength=len(token_lists)) == 0
+
+    def encode_batch(self, token_lists: List[List[str]], pad_length: int) -> np.ndarray:
+        """Encodes token sequences into one zero padded id array.
+
+        Sequences longer than pad_length lose their first tokens, as with the
+        defaults of Keras pad_sequences.
+
+        Args:
+            token_lists (List[List[str]]): Token sequences.
+            pad_length (int): Number of columns of the result.
+
+        Returns:
+            np.ndarray: int32 array of shape (len(token_lists), pad_length).
+
+        Raises:
+            InvalidInputException: If a token is not in the vocabulary.
+        """
+        n_rows = len(token_lists)
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=n_rows)
+        flat = np.array(list(chain.from_iterable(token_lists)), dtype=str)
+        ids, known = self.lookup(flat)
+        if not known.all():
+            unknown = ", ".join(repr(token) for token in dict.fromkeys(flat[~known].tolist()))
+            raise InvalidInputException("input", f"unsupported characters {unknown}")
+
+        rows = np.repeat(np.arange(n_rows), lengths)
+        starts = np.cumsum(lengths) - lengths
+        truncated = np.maximum(lengths - pad_length, 0)
+        columns = np.arange(len(flat)) - np.repeat(starts + truncated, lengths)
+        keep = columns >= 0
+
+        encoded = np.zeros((n_rows, pad_length), dtype=np.int32)
+        encoded[rows[keep], columns[keep]] = ids[keep]
+        return encoded
+
+    def decode_batch(
+        self,
+        predicted_array: np.ndarray,
+        stop_at_end: bool = True,
+        replacements: Dict[str, str] = None,
+    ) -> List[str]:
+        """Decodes a 2-D array of predicted ids into strings.
+
+        Padding, start and end tokens are dropped and unknown ids decode to "".
+
+        Args:
+            predicted_array (np.ndarray): Predicted ids, one row per sequence.
+            stop_at_end (bool, optional): Ignore everything after the first end token.
+            replacements (Dict[str, str], optional): Tokens to replace, e.g. {"§": " "}.
+
+        Returns:
+            List[str]: One decoded string per row.
+        """
+        ids = np.atleast_2d(np.asarray(predicted_array))
+        ids = np.where((ids > 0) & (ids < len(self.tokens)), ids, 0)
+        if stop_at_end:
+            ids = np.where(np.cumsum(ids == self.end_id, axis=1) > 0, 0, ids)
+
+        table = self.tokens.astype(object)
+        table[[0, self.start_id, self.end_id]] = ""
+        for token, replacement in (replacements or {}).items():
+            table[self.tokens == token] = replacement
+        return ["".join(row) for row in table[ids].tolist()]
+
+
+def compile_vocabulary(tokenizer_path: str, vocabulary_path: str = None) -> Vocabulary:
+    """Compiles a pickled Keras tokenizer into a vocabulary file.
+
+    Args:
+        tokenizer_path (str): Path of the pickled Keras tokenizer.
+        vocabulary_path (str, optional): Output path, defaults to the tokenizer path with an .npz suffix.
+
+    Returns:
+        Vocabulary: The compiled vocabulary.
+    """
+    import pickle
+
+    import tensorflow  # noqa: F401 the pickled Tokenizer lives in keras
+
+    with open(tokenizer_path, "rb") as f:
+        vocabulary = Vocabulary.from_tokenizer(pickle.load(f))
+    vocabulary.save(vocabulary_path or os.path.splitext(tokenizer_path)[0] + ".npz")
+    return vocabulary
+
+
+def load_vocabulary(tokenizer_path: str) -> Vocabulary:
+    """Loads the compiled vocabulary of a tokenizer, compiling it on first use.
+
+    Args:
+        tokenizer_path (str): Path of the pickled Keras tokenizer.
+
+    Returns:
+        Vocabulary: The vocabulary.
+    """
+    vocabulary_path = os.path.splitext(tokenizer_path)[0] + ".npz"
+    if os.path.exists(vocabulary_path) and (
+        not os.path.exists(tokenizer_path)
+        or os.path.getmtime(vocabulary_path) >= os.path.getmtime(tokenizer_path)
+    ):
+        return Vocabulary.load(vocabulary_path)
+    try:
+        return compile_vocabulary(tokenizer_path, vocabulary_path)
+    except OSError:
+        # read-only location, keep the table in memory only
+        return compile_vocabulary(tokenizer_path, os.devnull)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile Keras tokenizers into vocabulary tables")
+    parser.add_argument("tokenizers", nargs="+", help="pickled Keras tokenizers")
+    args = parser.parse_args()
+    for tokenizer_path in args.tokenizers:
+        vocabulary = compile_vocabulary(tokenizer_path)
+        print(f"{tokenizer_path}: {len(vocabulary)} tokens")
+
+
+if __name__ == "__main__":
+    main()
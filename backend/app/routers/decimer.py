@@ -1,14 +1,29 @@
 from __future__ import annotations
+
+import asyncio
 import os
+from typing import AsyncIterator, List, Literal, Optional
 
-from typing import Literal, Optional
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse, Response
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
 from app.schemas.healthcheck import HealthCheck
-from app.modules.decimer_wrapper import get_decimer
+from app.exception_handlers import ServiceOverloadedException
+from app.modules import engines
+from app.modules import image_cache
+from app.modules import streaming
+from app.modules.executor import image_pool, rdkit_pool
+from app.modules.uploads import (
+    Upload,
+    UploadError,
+    UploadTooLargeError,
+    expand_archives,
+    read_uploads,
+)
 from app.modules.visualize_wrapper import get_svg_2d, get_html_3d
+from app.routers.depict import depiction_base_url
 from app.schemas.error import BadRequestModel, NotFoundModel, ErrorResponse
 
 router = APIRouter(
@@ -29,6 +44,48 @@ class DECIMEROutputModel(BaseModel):
     Depiction: Optional[str] = None
 
 
+# Images per batch request, after extracting zip archives
+batch_max_files = int(os.getenv("DECIMER_BATCH_MAX_FILES", "200"))
+# Largest batch request body and total size of its extracted images, in MiB
+batch_max_bytes = int(float(os.getenv("DECIMER_BATCH_MAX_UPLOAD_MB", "100")) * 2**20)
+# Images of a batch request preprocessed and predicted together
+batch_chunk_size = int(
+    os.getenv("DECIMER_BATCH_CHUNK_SIZE", os.getenv("DECIMER_MAX_BATCH", "4"))
+)
+
+# Request body of the upload endpoints, which read the body themselves
+image_upload_body = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+async def read_image(request: Request) -> bytes:
+    """Returns the uploaded image, read into memory.
+
+    Raises:
+        HTTPException: 413 if the upload exceeds DECIMER_MAX_UPLOAD_MB, 400
+            if the body holds no image file.
+    """
+    try:
+        (upload,) = await read_uploads(request)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return upload.data
+
+
 @router.post(
     "/image2SMILES",
     summary="Use DECIMER to translate chemical structure images into SMILES",
@@ -39,11 +96,13 @@ class DECIMEROutputModel(BaseModel):
         },
         400: {"description": "Bad Request", "model": BadRequestModel},
         404: {"description": "Not Found", "model": NotFoundModel},
+        413: {"description": "Upload Too Large", "model": ErrorResponse},
         422: {"description": "Unprocessable Entity", "model": ErrorResponse},
     },
+    openapi_extra=image_upload_body,
 )
 async def decimer_image_to_smiles(
-    file: UploadFile = File(...),
+    request: Request,
     visualize: Optional[Literal["2D", "3D"]] = Query(
         None, description="Optional visualization type"
     ),
@@ -52,33 +111,189 @@ async def decimer_image_to_smiles(
     Generate SMILES from a given chemical structure image using DECIMER.
 
     Parameters:
-    - **file**: required (UploadFile): The image file containing the chemical structure.
+    - **file**: required (file): The image file containing the chemical structure, at most DECIMER_MAX_UPLOAD_MB.
     - **visualize**: optional (str): If provided, visualize the generated SMILES in 2D or 3D.
 
     Returns:
     - DECIMEROutputModel: Contains the SMILES string and its depiction (if visualization was requested).
     """
+    image = await read_image(request)
     try:
-        # Save the uploaded file temporarily
-        temp_file_path = f"temp_{file.filename}"
-        with open(temp_file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-
-        # Process the image with DECIMER
-        smiles = get_decimer(temp_file_path)
+        # Look the image up by content, preprocessing it in memory if needed,
+        # and predict it with DECIMER on a miss
+        cached = await image_pool.run(image_cache.lookup, image)
+        smiles = cached.smiles
+        if smiles is None:
+            smiles = await engines.decimer.submit(cached.image)
+            await image_pool.run(image_cache.store, [(cached, smiles)])
 
         # Generate depiction if visualization was requested
         depiction = None
         if visualize == "2D":
-            depiction = get_svg_2d(smiles)
+            depiction = await rdkit_pool.run(get_svg_2d, smiles)
         elif visualize == "3D":
-            depiction = get_html_3d(smiles)
-
-        # Remove the temporary file
-        os.remove(temp_file_path)
+            depiction = await rdkit_pool.run(
+                get_html_3d, smiles, depiction_base_url(request, router.prefix) + "3d/"
+            )
 
         return DECIMEROutputModel(SMILES=smiles, Depiction=depiction)
 
+    except ServiceOverloadedException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=422, detail=str(e))
+
+
+image_batch_upload_body = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                        }
+                    },
+                    "required": ["files"],
+                }
+            }
+        },
+    }
+}
+
+
+async def preprocess_chunk(chunk: List[Upload]) -> list:
+    """Looks images up in the image cache in parallel on the image pool.
+
+    The response of a batch has already started, so a full pool slows it
+    down instead of rejecting the images.
+
+    Returns:
+        list: The image_cache.CachedImage or the exception raised, per image.
+    """
+    return await asyncio.gather(
+        *(
+            streaming.retry_when_overloaded(
+                image_pool.run, image_cache.lookup, upload.data
+            )
+            for upload in chunk
+        ),
+        return_exceptions=True,
+    )
+
+
+async def stream_predictions(images: List[Upload]) -> AsyncIterator[str]:
+    """Yields one NDJSON line per image in upload order, chunk by chunk.
+
+    Chunks have the batch size of the DECIMER engine, so that each is
+    predicted in one interpreter call, and the next chunk is preprocessed
+    while the current one is predicted.
+    """
+    chunks = list(streaming.iter_chunks(iter(images), batch_chunk_size))
+    preprocessing = asyncio.ensure_future(preprocess_chunk(chunks[0]))
+    try:
+        for number, chunk in enumerate(chunks):
+            preprocessed = await preprocessing
+            if number + 1 < len(chunks):
+                preprocessing = asyncio.ensure_future(preprocess_chunk(chunks[number + 1]))
+            uncached = [
+                cached
+                for cached in preprocessed
+                if not isinstance(cached, Exception) and cached.smiles is None
+            ]
+            # Images repeated within the chunk are predicted once
+            unique = {cached.image_key: cached.image for cached in uncached}
+            results = await asyncio.gather(
+                *(
+                    streaming.retry_when_overloaded(engines.decimer.submit, image)
+                    for image in unique.values()
+                ),
+                return_exceptions=True,
+            )
+            predicted = dict(zip(unique, results))
+            await streaming.retry_when_overloaded(
+                image_pool.run,
+                image_cache.store,
+                [
+                    (cached, predicted[cached.image_key])
+                    for cached in uncached
+                    if not isinstance(predicted[cached.image_key], Exception)
+                ],
+            )
+            for offset, (upload, cached) in enumerate(zip(chunk, preprocessed)):
+                if isinstance(cached, Exception):
+                    result = cached
+                elif cached.smiles is None:
+                    result = predicted[cached.image_key]
+                else:
+                    result = cached.smiles
+                record = {"index": number * batch_chunk_size + offset, "filename": upload.filename}
+                if isinstance(result, Exception):
+                    record["error"] = str(result)
+                else:
+                    record["SMILES"] = result
+                yield orjson.dumps(record).decode() + "\n"
+    finally:
+        # Stops preprocessing ahead when the client went away
+        preprocessing.cancel()
+
+
+@router.post(
+    "/image2SMILES/batch",
+    summary="Use DECIMER to translate many chemical structure images into SMILES, streamed as NDJSON",
+    responses={
+        200: {
+            "description": "One JSON object per image",
+            "content": {"application/x-ndjson": {}},
+        },
+        400: {"description": "Bad Request", "model": BadRequestModel},
+        413: {"description": "Upload Too Large", "model": ErrorResponse},
+    },
+    openapi_extra=image_batch_upload_body,
+)
+async def decimer_images_to_smiles(request: Request):
+    """
+    Generate SMILES from several chemical structure images using DECIMER.
+
+    The images are uploaded as several files in the form field `files`, as
+    zip archives of images, or both. They are preprocessed in parallel and
+    predicted in chunks of DECIMER_BATCH_CHUNK_SIZE images. The results of a
+    chunk are streamed back as soon as the whole chunk is predicted, in
+    upload order.
+
+    Parameters:
+    - **files**: required (files): Images or zip archives, at most DECIMER_BATCH_MAX_FILES images and DECIMER_BATCH_MAX_UPLOAD_MB in total.
+
+    Images predicted before are answered from the image cache, see GET /decimer/cache.
+
+    Returns:
+    - application/x-ndjson: One JSON object per image with its `index` (archives expanded), its `filename` (archive.zip/path for extracted images) and its `SMILES`, or an `error`.
+    """
+    try:
+        uploads = await read_uploads(
+            request, "files", max_files=batch_max_files, max_bytes=batch_max_bytes
+        )
+        # Inflating archives is CPU-bound, keep it off the event loop
+        images = await image_pool.run(
+            expand_archives, uploads, batch_max_files, batch_max_bytes
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        stream_predictions(images), media_type="application/x-ndjson"
+    )
+
+
+@router.get(
+    "/cache",
+    summary="Get the DECIMER image cache statistics",
+    response_description="Hit and miss counters of the image cache levels",
+)
+def get_image_cache_stats() -> dict:
+    """Return the overall hit rate and the counters of the upload and preprocessed image levels."""
+    return image_cache.stats()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi import Header
+from fastapi import HTTPException
+from fastapi import Request
+from fastapi import status
+from fastapi.responses import JSONResponse
+from fastapi.responses import Response
+
+from app.modules import conformers
+from app.modules import depiction
+from app.modules.executor import rdkit_pool
+from app.schemas.error import BadRequestModel
+from app.schemas.error import ErrorResponse
+from app.schemas.error import NotFoundModel
+
+router = APIRouter(
+    prefix="/depict",
+    tags=["depict"],
+    dependencies=[],
+    responses={
+        200: {"description": "OK"},
+        400: {"description": "Bad Request", "model": BadRequestModel},
+        404: {"description": "Not Found", "model": NotFoundModel},
+        422: {"description": "Unprocessable Entity", "model": ErrorResponse},
+    },
+)
+
+# A key always names the same depiction, so clients may keep it forever
+cache_control = "public, max-age=31536000, immutable"
+
+
+def depiction_base_url(request: Request, prefix: str) -> str:
+    """Returns the absolute URL of this router for a request to another router.
+
+    The routers are mounted side by side under the same version prefix, so
+    the URL is derived from the request URL and the prefix of its router.
+
+    Args:
+        request (Request): The FastAPI Request object.
+        prefix (str): Prefix of the router handling the request, e.g. "/stout".
+
+    Returns:
+        str: URL of the depiction endpoints, ending with a slash.
+    """
+    api_url = str(request.url).split(prefix + "/", 1)[0]
+    return f"{api_url}{router.prefix}/"
+
+
+@router.get(
+    "/cache",
+    summary="Get the depiction cache statistics",
+    response_description="Hit and miss counters of the depiction and conformer caches",
+    status_code=status.HTTP_200_OK,
+)
+def get_depiction_cache_stats() -> dict:
+    """Return the hit and miss counters and sizes of the depiction and conformer caches."""
+    return {"depictions": depiction.stats(), "conformers": conformers.stats()}
+
+
+@router.get(
+    "/3d/{key}",
+    summary="Get a 3D conformer referenced by a 3D depiction",
+    responses={
+        200: {"description": "The conformer is done or failed"},
+        202: {"description": "The conformer is still being computed"},
+        404: {"description": "Not Found", "model": NotFoundModel},
+    },
+)
+async def get_conformer(key: str):
+    """Return the state of a 3D conformer and its MolBlock once it is done.
+
+    Keys are part of the 3D depictions returned for molecules whose
+    conformer took longer than the time budget. The viewer polls this
+    endpoint until the status is "done" or "failed".
+
+    Parameters:
+    - **key**: required (str): Key of the conformer.
+    """
+    result = await rdkit_pool.run(conformers.lookup, key)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Unknown conformer {key}")
+    if result.status == "pending":
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=result._asdict())
+    return JSONResponse(content=result._asdict(), headers={"Cache-Control": cache_control})
+
+
+@router.get(
+    "/{key}",
+    summary="Get a structure depiction referenced by a result table",
+    response_class=Response,
+    responses={
+        200: {"description": "SVG depiction", "content": {"image/svg+xml": {}}},
+        304: {"description": "Not Modified"},
+        404: {"description": "Not Found", "model": NotFoundModel},
+    },
+)
+async def get_depiction(
+    key: str,
+    if_none_match: str = Header(default=None),
+):
+    """Return the SVG depiction with the given key.
+
+    Keys are part of the depiction URLs returned by the SMILE2IUPAC
+    endpoints with `depictions=url`. Depictions are rendered on the first
+    request and cached.
+
+    Parameters:
+    - **key**: required (str): Key of the depiction.
+    """
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    svg = await rdkit_pool.run(depiction.get_depiction, key)
+    if svg is None:
+        raise HTTPException(status_code=404, detail=f"Unknown depiction {key}")
+    return Response(content=svg, media_type="image/svg+xml", headers=headers)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi import File
+from fastapi import HTTPException
+from fastapi import Query
+from fastapi import UploadFile
+from fastapi import status
+
+from app.modules.jobs import JobStore
+from app.modules.jobs import read_smiles
+from app.schemas.error import BadRequestModel
+from app.schemas.error import ErrorResponse
+from app.schemas.error import NotFoundModel
+from app.schemas.jobs import JobResultsPage
+from app.schemas.jobs import JobStatus
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"],
+    dependencies=[],
+    responses={
+        200: {"description": "OK"},
+        400: {"description": "Bad Request", "model": BadRequestModel},
+        404: {"description": "Not Found", "model": NotFoundModel},
+        422: {"description": "Unprocessable Entity", "model": ErrorResponse},
+    },
+)
+
+store = None
+
+
+def get_store() -> JobStore:
+    """Returns the job store, creating the database on first use."""
+    global store
+    if store is None:
+        store = JobStore()
+    return store
+
+
+def get_job_or_404(job_id: str) -> dict:
+    job = get_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@router.post(
+    "/",
+    summary="Submit a SMILES or CSV file for bulk translation",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=JobStatus,
+)
+def submit_job(
+    file: UploadFile = File(..., description="SMILES file (one per line) or CSV with a smiles column"),
+    retranslate: bool = Query(
+        False,
+        title="Retranslate(OPSIN)",
+        description="Retranslate the predicted IUPAC names using OPSIN",
+    ),
+    visualize: bool = Query(False, description="Add 2D SVG depictions to the results"),
+):
+    """Submit a library of molecules to be translated in the background.
+
+    The molecules are stored on local disk and worked through in batches by
+    the local job workers, using the same STOUT, OPSIN retranslation and
+    depiction stages as /stout/SMILE2IUPAC. Jobs survive restarts.
+
+    Parameters:
+    - **file**: required (UploadFile): SMILES file (.smi/.txt) or CSV file (.csv) with a "smiles" column.
+    - **retranslate**: optional (bool): Retranslate the predicted IUPAC names using OPSIN.
+    - **visualize**: optional (bool): Add 2D SVG depictions to the results.
+
+    Returns:
+    - JobStatus: The created job, poll /jobs/{job_id} for its progress.
+    """
+    job_id = get_store().create(
+        read_smiles(file.file, file.filename or ""),
+        file.filename,
+        retranslate,
+        visualize,
+    )
+    return get_job_or_404(job_id)
+
+
+@router.get(
+    "/{job_id}",
+    summary="Get the status and progress of a job",
+    response_model=JobStatus,
+)
+def get_job(job_id: str):
+    """Return the status and progress of a bulk translation job."""
+    return get_job_or_404(job_id)
+
+
+@router.get(
+    "/{job_id}/results",
+    summary="Get one page of the results of a job",
+    response_model=JobResultsPage,
+)
+def get_job_results(
+    job_id: str,
+    page: int = Query(1, ge=1, description="Page number, starting at 1"),
+    size: int = Query(100, ge=1, le=1000, description="Number of molecules per page"),
+):
+    """Return the results of a job page by page, in input order.
+
+    Pages can be fetched while the job is still running, molecules that are
+    not translated yet are marked as pending.
+    """
+    job = get_job_or_404(job_id)
+    return JobResultsPage(
+        job_id=job_id,
+        page=page,
+        size=size,
+        total=job["total"],
+        results=get_store().results(job_id, (page - 1) * size, size),
+    )
+
+
+@router.delete(
+    "/{job_id}",
+    summary="Cancel a job",
+    response_model=JobStatus,
+)
+def cancel_job(job_id: str):
+    """Cancel a queued or running job. Results translated so far are kept."""
+    get_job_or_404(job_id)
+    get_store().cancel(job_id)
+    return get_job_or_404(job_id)
+
+
+@router.post(
+    "/{job_id}/resume",
+    summary="Resume a cancelled or failed job",
+    response_model=JobStatus,
+)
+def resume_job(job_id: str):
+    """Queue a cancelled or failed job again. Molecules translated so far are not translated again."""
+    get_job_or_404(job_id)
+    get_store().resume(job_id)
+    return get_job_or_404(job_id)
@@ -1,25 +1,51 @@
 from __future__ import annotations
 
+import html
+from typing import AsyncIterator
+from typing import Callable
+from typing import List
 from typing import Literal
+from typing import Optional
 from typing import Union
 
+import orjson
 from fastapi import APIRouter
 from fastapi import Body
 from fastapi import HTTPException
 from fastapi import Query
+from fastapi import Request
 from fastapi import status
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.responses import Response
+from fastapi.responses import StreamingResponse
 
-from rdkit import Chem
+from app.exception_handlers import InvalidInputException
+from app.exception_handlers import ServiceOverloadedException
+from app.routers.depict import depiction_base_url
 from app.schemas.healthcheck import HealthCheck
 from app.schemas.stout_model import (
     STOUTtableModel,
     STOUTOutputModel,
     GenerateSMILESResponse,
+    TranslationRecord,
+    TranslationTable,
 )
-from app.modules.opsin_wrapper import get_opsin_convertion, get_smiles_opsin
-from app.modules.stout_wrapper import predict_IUPAC, predict_SMILES
+from app.modules.opsin_wrapper import (
+    get_opsin_convertion,
+    parse_names,
+    process_predicted_smiles,
+    retranslation_threshold,
+)
+from app.modules import depiction
+from app.modules import engines
+from app.modules import rendering
+from app.modules.executor import opsin_pool, rdkit_pool
+from app.modules.pipeline import build_records
+from app.modules.rdkit_wrapper import filter_valid_smiles
+from app.modules import streaming
+from app.modules import tables
+from app.modules.tables import TranslationRow
+from app.modules import translation_cache
 from app.modules.visualize_wrapper import get_svg_2d, get_html_3d
 from app.schemas.error import BadRequestModel
 from app.schemas.error import ErrorResponse
@@ -62,13 +88,104 @@ def get_health() -> HealthCheck:
     return HealthCheck(status="OK")
 
 
+@router.get(
+    "/cache",
+    summary="Get the translation cache statistics",
+    response_description="Hit and miss counters of the STOUT and OPSIN caches",
+    status_code=status.HTTP_200_OK,
+)
+def get_cache_stats() -> dict:
+    """Return the hit and miss counters and sizes of the translation caches.
+
+    Returns:
+        dict: Statistics per cache (iupac, smiles, opsin).
+    """
+    return translation_cache.stats()
+
+
+def cell_formatter(depictions: str = "inline") -> Callable[[str], str]:
+    """Returns the function converting table cells to HTML.
+
+    Inline SVGs are escaped like every other cell. Depiction URLs are turned
+    into image tags, so the browser fetches them from GET /depict/{key}.
+
+    Args:
+        depictions (str, optional): "inline" or "url".
+
+    Returns:
+        Callable[[str], str]: Cell formatter for rendering.stream_table.
+    """
+    if depictions != "url":
+        return tables.escape_cell
+
+    def format_cell(value: str) -> str:
+        value = html.escape(value)
+        if "/depict/" in value and value.startswith("http"):
+            return f'<img src="{value}" alt="depiction" loading="lazy">'
+        return value
+
+    return format_cell
+
+
+def pair_predictions(smiles_list: List[str], predictions: list) -> List[str]:
+    """Returns the tab separated SMILES and predicted name lines of get_opsin_convertion."""
+    return [
+        smiles + "\t" + prediction.text
+        for smiles, prediction in zip(smiles_list, predictions)
+    ]
+
+
+async def translate_rows(
+    smiles_chunk: List[str],
+    retranslate: bool,
+    depict: Callable[[str], str],
+    threshold: Optional[float],
+) -> List[TranslationRow]:
+    """Translates, retranslates and depicts a chunk of valid SMILES for an HTML table."""
+    predictions = await engines.stout_forward.submit_many(smiles_chunk)
+    return await opsin_pool.run(
+        get_opsin_convertion,
+        pair_predictions(smiles_chunk, predictions),
+        retranslate=retranslate,
+        visualize=True,
+        depict=depict,
+        confidences=[prediction.confidence for prediction in predictions],
+        confidence_threshold=threshold,
+    )
+
+
+async def iter_html_rows(
+    first_rows: List[TranslationRow],
+    smiles_chunks: List[List[str]],
+    retranslate: bool,
+    depict: Callable[[str], str],
+    threshold: Optional[float],
+) -> AsyncIterator[List[TranslationRow]]:
+    """Yields the rows of an HTML table, translating the remaining chunks one by one.
+
+    The response has already started, so a full queue slows the stream down
+    and a chunk that fails gets a row per molecule stating the error.
+    """
+    yield first_rows
+    for smiles_chunk in smiles_chunks:
+        try:
+            yield await streaming.retry_when_overloaded(
+                translate_rows, smiles_chunk, retranslate, depict, threshold
+            )
+        except Exception as e:
+            yield [
+                TranslationRow(smiles, f"Unable to translate: {e}")
+                for smiles in smiles_chunk
+            ]
+
+
 @router.post(
     "/SMILE2IUPAC",
     summary="Use STOUT to translate SMILES into IUPAC names",
     responses={
         200: {
             "description": "Successful response",
-            "model": Union[STOUTOutputModel, STOUTtableModel],
+            "model": Union[STOUTOutputModel, STOUTtableModel, TranslationTable],
         },
         400: {"description": "Bad Request", "model": BadRequestModel},
         404: {"description": "Not Found", "model": NotFoundModel},
@@ -76,6 +193,7 @@ def get_health() -> HealthCheck:
     },
 )
 async def stout_molecules(
+    request: Request,
     smiles_list: str = Body(
         embed=False,
         media_type="text/plain",
@@ -91,41 +209,188 @@ async def stout_molecules(
         title="Retranslate(OPSIN)",
         description="Retranslate the predicted IUPAC names using OPSIN",
     ),
-    format: Literal["text", "json", "html"] = Query(
-        default="text", description="Desired display format"
+    format: Literal["text", "json", "html", "records"] = Query(
+        default="text",
+        description="Desired display format, records returns a TranslationTable",
+    ),
+    depictions: Literal["inline", "url"] = Query(
+        default="inline",
+        description="Embed the SVG depictions in HTML tables or reference them by URL",
+    ),
+    confidence_threshold: Optional[float] = Query(
+        None,
+        ge=0,
+        le=1,
+        title="Confidence threshold",
+        description="Only retranslate predicted names with a lower confidence, RETRANSLATION_THRESHOLD by default",
     ),
 ):
-    all_iupac = []
-    all_data = []
+    if confidence_threshold is None:
+        confidence_threshold = retranslation_threshold
+    depict = get_svg_2d
+    if depictions == "url":
+        depict = depiction.url_depicter(depiction_base_url(request, router.prefix))
     chemical_formulas_list = smiles_list.split("\n")
-    for item in chemical_formulas_list[:50]:
-        smiles = item
-        mol = Chem.MolFromSmiles(smiles)
-        if mol:
-            predicted_IUPAC = predict_IUPAC(smiles)
-            all_iupac.append(predicted_IUPAC)
-            all_data.append(smiles + "\t" + predicted_IUPAC)
-    if retranslate:
-        if format == "html":
-            table_data = get_opsin_convertion(all_data, visualize=True)
-            with open("app/templates/style.css", "r") as file:
-                css_style = file.read()
-            html_table = table_data.to_html(index=False)
-            return Response(content=css_style + html_table, media_type="text/html")
-        else:
-            table_data = get_opsin_convertion(all_data)
-            return JSONResponse(content=table_data.to_json())
-    elif format == "html":
-        table_data = get_opsin_convertion(all_data, retranslate=False, visualize=True)
-        with open("app/templates/style.css", "r") as file:
-            css_style = file.read()
-        html_table = table_data.to_html(index=False)
-        return Response(content=css_style + html_table, media_type="text/html")
-    elif format == "json":
-        table_data = get_opsin_convertion(all_data, retranslate=False)
-        return JSONResponse(content=table_data.to_json())
-    else:
-        return all_iupac
+    valid_smiles = await rdkit_pool.run(
+        filter_valid_smiles, chemical_formulas_list[:50]
+    )
+    if format == "html":
+        # The first chunk is translated before answering, so errors still get a status code
+        smiles_chunks = list(
+            streaming.iter_chunks(iter(valid_smiles), rendering.html_chunk_size)
+        )
+        first_rows = (
+            await translate_rows(
+                smiles_chunks[0], retranslate, depict, confidence_threshold
+            )
+            if smiles_chunks
+            else []
+        )
+        return StreamingResponse(
+            rendering.stream_table(
+                iter_html_rows(
+                    first_rows,
+                    smiles_chunks[1:],
+                    retranslate,
+                    depict,
+                    confidence_threshold,
+                ),
+                tables.legacy_columns(retranslate, visualize=True),
+                cell_formatter(depictions),
+            ),
+            media_type="text/html",
+        )
+    predictions = await engines.stout_forward.submit_many(valid_smiles)
+    if format == "text" and not retranslate:
+        return [prediction.text for prediction in predictions]
+    rows = await opsin_pool.run(
+        get_opsin_convertion,
+        pair_predictions(valid_smiles, predictions),
+        retranslate=retranslate,
+        confidences=[prediction.confidence for prediction in predictions],
+        confidence_threshold=confidence_threshold,
+    )
+    if format == "records":
+        return ORJSONResponse(
+            content={"rows": tables.to_records(rows, retranslate)}
+        )
+    columns = tables.legacy_columns(retranslate, visualize=False)
+    return Response(
+        content=tables.to_legacy_json(rows, columns), media_type="application/json"
+    )
+
+
+async def translate_chunk(
+    smiles_chunk: List[str], retranslate: bool, threshold: Optional[float]
+) -> List[dict]:
+    """Translates one chunk of streamed SMILES into result records.
+
+    Args:
+        smiles_chunk (List[str]): Input SMILES strings.
+        retranslate (bool): Retranslate the predicted names using OPSIN.
+        threshold (float): Only retranslate names with a lower confidence, None for all.
+
+    Returns:
+        List[dict]: One record per input, invalid SMILES and SMILES with
+        characters STOUT does not know get an error record.
+    """
+    valid_smiles = await streaming.retry_when_overloaded(
+        rdkit_pool.run, filter_valid_smiles, smiles_chunk
+    )
+    try:
+        predictions = await streaming.retry_when_overloaded(
+            engines.stout_forward.submit_many, valid_smiles
+        )
+    except InvalidInputException:
+        if len(smiles_chunk) == 1:
+            return [{"Original SMILES": smiles_chunk[0], "error": "Unsupported characters"}]
+        return [
+            record
+            for smiles in smiles_chunk
+            for record in await translate_chunk([smiles], retranslate, threshold)
+        ]
+    rows = await streaming.retry_when_overloaded(
+        opsin_pool.run,
+        get_opsin_convertion,
+        pair_predictions(valid_smiles, predictions),
+        retranslate=retranslate,
+        confidences=[prediction.confidence for prediction in predictions],
+        confidence_threshold=threshold,
+    )
+    return build_records(smiles_chunk, valid_smiles, rows, retranslate)
+
+
+async def stream_translations(
+    spool, retranslate: bool, threshold: Optional[float]
+) -> AsyncIterator[str]:
+    """Yields one NDJSON line per input SMILES, chunk by chunk."""
+    for smiles_chunk in streaming.iter_chunks(streaming.iter_lines(spool)):
+        for record in await translate_chunk(smiles_chunk, retranslate, threshold):
+            yield orjson.dumps(record).decode() + "\n"
+
+
+@router.post(
+    "/SMILE2IUPAC/stream",
+    summary="Use STOUT to translate any number of SMILES into IUPAC names, streamed as NDJSON",
+    responses={
+        200: {
+            "description": "One JSON object per input line",
+            "content": {"application/x-ndjson": {}},
+        },
+        400: {"description": "Bad Request", "model": BadRequestModel},
+        404: {"description": "Not Found", "model": NotFoundModel},
+        422: {"description": "Unprocessable Entity", "model": ErrorResponse},
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/plain": {
+                    "schema": {"type": "string"},
+                    "example": "CN1C=NC2=C1C(=O)N(C(=O)N2C)C\nCC1(C)OC2COC3(COS(N)(=O)=O)OC(C)(C)OC3C2O1",
+                }
+            },
+        }
+    },
+)
+async def stout_molecules_stream(
+    request: Request,
+    retranslate: bool = Query(
+        False,
+        title="Retranslate(OPSIN)",
+        description="Retranslate the predicted IUPAC names using OPSIN",
+    ),
+    confidence_threshold: Optional[float] = Query(
+        None,
+        ge=0,
+        le=1,
+        title="Confidence threshold",
+        description="Only retranslate predicted names with a lower confidence, RETRANSLATION_THRESHOLD by default",
+    ),
+):
+    """Translate a newline separated list of SMILES of any length.
+
+    Unlike /SMILE2IUPAC, the input is not truncated to 50 lines. Results are
+    streamed as newline delimited JSON, one object per input line in input
+    order, as soon as each batch is translated. The upload is spooled to a
+    temporary file, so memory use does not grow with the input size.
+
+    Parameters:
+    - **retranslate**: optional (bool): Retranslate the predicted IUPAC names using OPSIN.
+    - **confidence_threshold**: optional (float): Names with at least this confidence are "not retranslated".
+
+    Returns:
+    - application/x-ndjson: One JSON object per line with the same columns as format=json, or an "error" for invalid SMILES.
+    """
+    if confidence_threshold is None:
+        confidence_threshold = retranslation_threshold
+    spool = await streaming.spool_request(request)
+    return StreamingResponse(
+        streaming.close_after(
+            stream_translations(spool, retranslate, confidence_threshold), spool
+        ),
+        media_type="application/x-ndjson",
+    )
 
 
 @router.get(
@@ -142,6 +407,7 @@ async def stout_molecules(
     },
 )
 async def iupac_name_to_smiles(
+    request: Request,
     input_text: str = Query(
         title="Input IUPAC name",
         description="IUPAC name of the molecule",
@@ -174,18 +440,79 @@ async def iupac_name_to_smiles(
     """
     try:
         if converter == "opsin":
-            smiles = get_smiles_opsin(input_text)
+            parsed = (await opsin_pool.run(parse_names, [input_text]))[0]
+            if parsed.smiles is None:
+                raise HTTPException(status_code=422, detail=parsed.failure_text)
+            smiles = parsed.smiles
+            confidence = None
         else:
-            smiles = predict_SMILES(input_text)
+            smiles, confidence = await engines.stout_reverse.submit(input_text)
         if smiles:
             if visualize == "2D":
-                depiction = get_svg_2d(smiles)
+                depiction = await rdkit_pool.run(get_svg_2d, smiles)
             elif visualize == "3D":
-                depiction = get_html_3d(smiles)
+                depiction = await rdkit_pool.run(
+                    get_html_3d,
+                    smiles,
+                    depiction_base_url(request, router.prefix) + "3d/",
+                )
 
-            return {"SMILES": str(smiles), "Depiction": depiction}
+            result = {"SMILES": str(smiles), "Depiction": depiction}
+            if converter == "stout":
+                result["Confidence"] = confidence
+            return result
         else:
             return str(smiles)
 
+    except (ServiceOverloadedException, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.get(
+    "/retranslate",
+    summary="Check a predicted IUPAC name by retranslating it with OPSIN",
+    responses={
+        200: {"description": "Successful response", "model": TranslationRecord},
+        400: {"description": "Bad Request", "model": BadRequestModel},
+        404: {"description": "Not Found", "model": NotFoundModel},
+        422: {"description": "Unprocessable Entity", "model": ErrorResponse},
+    },
+)
+async def retranslate_prediction(
+    smiles: str = Query(
+        title="Input SMILES",
+        description="SMILES the name was predicted for",
+        openapi_examples={
+            "example1": {
+                "summary": "Example: SMILES",
+                "value": "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+            },
+        },
+    ),
+    iupac_name: str = Query(
+        title="Predicted IUPAC name",
+        description="IUPAC name predicted by STOUT",
+        openapi_examples={
+            "example1": {
+                "summary": "Example: IUPAC name",
+                "value": "1,3,7-trimethylpurine-2,6-dione",
+            },
+        },
+    ),
+):
+    """Retranslate a predicted IUPAC name on demand.
+
+    Runs the OPSIN and InChI check of SMILE2IUPAC for one prediction, e.g.
+    for a row that was "not retranslated" because of its confidence.
+
+    Parameters:
+    - **smiles**: required (str): The input SMILES.
+    - **iupac_name**: required (str): The predicted IUPAC name.
+
+    Returns:
+    - TranslationRecord: The retranslation and the retranslated SMILES.
+    """
+    row = await opsin_pool.run(process_predicted_smiles, smiles, iupac_name)
+    return tables.to_records([row], retranslate=True)[0]
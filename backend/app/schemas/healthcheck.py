@@ -13,3 +13,17 @@ class HealthCheck(BaseModel):
     """
 
     status: str = "OK"
+
+
+class ReadinessCheck(BaseModel):
+    """Represents the response model of the readiness check.
+
+    Attributes:
+        ready (bool): Whether the service can serve requests.
+        mode (str): The startup mode (eager, background or lazy).
+        components (dict): Load status of every model, tokenizer and runtime.
+    """
+
+    ready: bool
+    mode: str
+    components: dict
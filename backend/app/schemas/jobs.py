@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from pydantic import BaseModel
+from pydantic import Field
+
+
+class JobStatus(BaseModel):
+    """Represents the state and progress of a bulk translation job.
+
+    Attributes:
+        id (str): The job id.
+        filename (str): Name of the uploaded file.
+        status (str): One of uploading, queued, running, completed, failed or cancelled.
+        retranslate (bool): Whether the predicted names are retranslated with OPSIN.
+        visualize (bool): Whether the results contain SVG depictions.
+        total (int): Number of molecules in the job.
+        processed (int): Number of molecules translated so far.
+        progress (float): Fraction of translated molecules.
+        error (str): Error message of a failed job.
+        created (float): Creation time as a UNIX timestamp.
+        updated (float): Time of the last change as a UNIX timestamp.
+    """
+
+    id: str
+    filename: Optional[str] = None
+    status: str
+    retranslate: bool
+    visualize: bool
+    total: int
+    processed: int
+    progress: float
+    error: Optional[str] = None
+    created: float
+    updated: float
+
+
+class JobResultsPage(BaseModel):
+    """Represents one page of the results of a bulk translation job.
+
+    Attributes:
+        job_id (str): The job id.
+        page (int): The page number, starting at 1.
+        size (int): The number of molecules per page.
+        total (int): Number of molecules in the job.
+        results (list): One record per molecule of the page, pending molecules have status "pending".
+    """
+
+    job_id: str
+    page: int
+    size: int
+    total: int
+    results: list = Field(
+        ...,
+        description="Records with the columns of SMILE2IUPAC format=json, plus position and status.",
+    )
@@ -1,3 +1,6 @@
+from typing import List
+from typing import Optional
+
 from pydantic import BaseModel
 from pydantic import Field
 
@@ -47,6 +50,71 @@ class STOUTtableModel(BaseModel):
         }
 
 
+class TranslationRecord(BaseModel):
+    """One translated molecule of a TranslationTable.
+
+    Attributes:
+        smiles (str): Input SMILES.
+        iupac (str): Predicted IUPAC name.
+        confidence (float, optional): Confidence of STOUT in the prediction.
+        retranslation (str, optional): OPSIN check of the prediction, only with retranslate.
+        retranslated_smiles (str, optional): SMILES parsed by OPSIN from the prediction, only with retranslate.
+    """
+
+    smiles: str = Field(..., title="SMILES", description="The input SMILES string.")
+    iupac: str = Field(
+        ..., title="IUPAC name", description="The IUPAC name predicted by STOUT."
+    )
+    confidence: Optional[float] = Field(
+        None,
+        title="Confidence",
+        description="Geometric mean of the token probabilities of the prediction, null if unknown.",
+    )
+    retranslation: Optional[str] = Field(
+        None,
+        title="Retranslation",
+        description="'same as input', 'not same as input', 'unable to assess' or 'not retranslated' for confident predictions.",
+    )
+    retranslated_smiles: Optional[str] = Field(
+        None,
+        title="Retranslated SMILES",
+        description="SMILES parsed by OPSIN from the predicted name, or 'failed to retranslate'.",
+    )
+
+
+class TranslationTable(BaseModel):
+    """Represents the rows of a translation table, returned with format=records.
+
+    Attributes:
+        rows (List[TranslationRecord]): One record per valid input SMILES, in input order.
+    """
+
+    rows: List[TranslationRecord]
+
+    class Config:
+        """Pydantic model configuration.
+
+        JSON Schema Extra:
+        - Includes examples of the response structure.
+        """
+
+        json_schema_extra = {
+            "examples": [
+                {
+                    "rows": [
+                        {
+                            "smiles": "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+                            "iupac": "1,3,7-trimethylpurine-2,6-dione",
+                            "confidence": 0.9987,
+                            "retranslation": "same as input",
+                            "retranslated_smiles": "CN1C=NC2=C1C(=O)N(C)C(=O)N2C",
+                        },
+                    ],
+                },
+            ],
+        }
+
+
 class GenerateSMILESResponse(BaseModel):
     """Represents a response containing a generated SMILES string and depiction.
 
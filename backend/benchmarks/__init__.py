@@ -0,0 +1,5 @@
+"""Benchmarks for the STOUT API backend.
+
+Run the scripts from the backend directory, e.g.
+``python -m benchmarks.length_buckets``.
+"""
@@ -0,0 +1,147 @@
+"""Accuracy and latency of the STOUT inference backends.
+
+Usage:
+    python -m benchmarks.backends [--count 128] [--smiles held_out.smi] [--output results.json]
+
+Translates held-out SMILES (a file with one SMILES per line, or a corpus
+generated with another seed than the other benchmarks) with every
+backend of app.modules.backends whose model exists, see
+app.modules.convert_models. Reports the per-molecule latency and the
+throughput of batched translation, how many names are identical to the
+SavedModel names and, when OPSIN is available, how many names parse back
+to the input molecule. Backends that cannot be loaded are listed as
+skipped with the reason.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import List, Optional
+
+from rdkit import RDLogger
+
+from app.modules import backends, stout_wrapper
+from app.modules.rdkit_wrapper import canonical_smiles, same_molecule
+from benchmarks import corpus
+
+backend_names = ["savedmodel"] + list(backends.backend_suffixes)
+
+
+def load_smiles(path: Optional[str], count: int, seed: int) -> List[str]:
+    """Returns the canonical held-out SMILES, read from path or generated."""
+    if path:
+        with open(path) as f:
+            smiles_list = [line.split()[0] for line in f if line.strip()][:count]
+    else:
+        smiles_list = corpus.generate_smiles(count, seed)
+    return [smiles for smiles in map(canonical_smiles, smiles_list) if smiles]
+
+
+def retranslation_rate(smiles_list: List[str], names: List[str]) -> Optional[float]:
+    """Returns the share of names OPSIN parses back to the input, None without OPSIN."""
+    try:
+        from app.modules.opsin_wrapper import parse_names
+
+        parsed = parse_names(names)
+    except Exception as e:
+        print(f"OPSIN unavailable, retranslation not checked: {e}")
+        return None
+    same = sum(
+        result.smiles is not None and same_molecule(smiles, result.smiles)
+        for smiles, result in zip(smiles_list, parsed)
+    )
+    return same / len(smiles_list)
+
+
+def run_backend(backend: str, model: tuple, smiles_list: List[str], batch_size: int) -> dict:
+    """Translates the SMILES with one backend, one at a time and in batches."""
+    inp_lang, targ_lang, inp_max_length, _ = model
+    load_start = time.perf_counter()
+    translator = backends.load_translator(
+        stout_wrapper.default_path.as_posix() + "/translator_forward", backend
+    )
+    load_seconds = time.perf_counter() - load_start
+    stout_wrapper.forward_model.override((inp_lang, targ_lang, inp_max_length, translator))
+
+    # The first call builds the graph or allocates the tensors
+    stout_wrapper.translate_IUPAC(smiles_list[:1])
+    start = time.perf_counter()
+    for smiles in smiles_list:
+        stout_wrapper.translate_IUPAC([smiles])
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = []
+    for i in range(0, len(smiles_list), batch_size):
+        predictions.extend(stout_wrapper.translate_IUPAC(smiles_list[i : i + batch_size]))
+    batch_seconds = time.perf_counter() - start
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "ms_per_molecule": round(single_seconds / len(smiles_list) * 1000, 2),
+        "molecules_per_second": round(len(smiles_list) / batch_seconds, 2),
+        "names": [prediction.text for prediction in predictions],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=128)
+    parser.add_argument("--smiles", help="file of held-out SMILES, one per line")
+    parser.add_argument("--seed", type=int, default=7, help="seed of the generated SMILES")
+    parser.add_argument("--batch-size", type=int, default=stout_wrapper.batch_size)
+    parser.add_argument("--backends", nargs="+", choices=backend_names, default=backend_names)
+    parser.add_argument("--skip-opsin", action="store_true")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    RDLogger.DisableLog("rdApp.*")
+    smiles_list = load_smiles(args.smiles, args.count, args.seed)
+    model = stout_wrapper.forward_model.get()
+
+    results = {"molecules": len(smiles_list), "backends": {}}
+    reference = None
+    for backend in dict.fromkeys(["savedmodel"] + args.backends):
+        try:
+            result = run_backend(backend, model, smiles_list, args.batch_size)
+        except Exception as e:
+            results["backends"][backend] = {"skipped": f"{type(e).__name__}: {e}"}
+            continue
+        names = result.pop("names")
+        if backend == "savedmodel":
+            reference = names
+        result["same_as_savedmodel"] = (
+            None
+            if reference is None
+            else round(sum(a == b for a, b in zip(names, reference)) / len(names), 4)
+        )
+        if not args.skip_opsin:
+            rate = retranslation_rate(smiles_list, names)
+            result["retranslated_to_input"] = None if rate is None else round(rate, 4)
+        results["backends"][backend] = result
+    stout_wrapper.forward_model.override(model)
+
+    print(
+        f"{'backend':>15} {'ms/molecule':>12} {'molecules/s':>12}"
+        f" {'= savedmodel':>13} {'retranslated':>13}"
+    )
+    for backend, result in results["backends"].items():
+        if "skipped" in result:
+            print(f"{backend:>15} skipped: {result['skipped']}")
+            continue
+        same, retranslated = (
+            "-" if result.get(key) is None else format(result[key], ".1%")
+            for key in ("same_as_savedmodel", "retranslated_to_input")
+        )
+        print(
+            f"{backend:>15} {result['ms_per_molecule']:>12.1f}"
+            f" {result['molecules_per_second']:>12.1f} {same:>13} {retranslated:>13}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""3D conformer generation time over molecules of increasing size.
+
+Usage:
+    python -m benchmarks.conformers [--repeats 1] [--skip-legacy]
+
+Compares the previous single conformer embedding (random coordinates,
+maxAttempts=5000, MMFF, re-embedding on failure) with the ETKDGv3 engine
+of rdkit_wrapper.embed_conformer, on chains, fused ring systems and
+macrocycles.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from rdkit import Chem, RDLogger
+from rdkit.Chem import AllChem
+
+from app.modules import rdkit_wrapper
+
+molecules = [
+    ("ethanol", "CCO"),
+    ("ibuprofen", "CC(C)Cc1ccc(cc1)C(C)C(=O)O"),
+    ("C30 chain", "C" * 30),
+    ("steroid", "CC12CCC3C(CCC4=CC(=O)CCC34C)C1CCC2O"),
+    ("peptide x6", "N" + "C(C)C(=O)N" * 5 + "C(C)C(=O)O"),
+    ("macrocycle 16", "C1" + "C" * 14 + "C1"),
+    ("macrocycle 30", "C1" + "C" * 28 + "C1"),
+    ("cyclosporin-like", "CC1C(=O)NC(C)C(=O)NC(C)C(=O)NC(C)C(=O)NC(C)C(=O)NC(C)C(=O)NC(C)C(=O)NC(C)C(=O)N1"),
+    ("peptide x16", "N" + "C(Cc1ccccc1)C(=O)N" * 15 + "C(C)C(=O)O"),
+]
+
+
+def legacy_conformer(molecule: Chem.Mol) -> str:
+    """The previous get_3d_conformers implementation."""
+    molecule = Chem.AddHs(molecule)
+    AllChem.EmbedMolecule(molecule, maxAttempts=5000, useRandomCoords=True)
+    try:
+        AllChem.MMFFOptimizeMolecule(molecule)
+    except Exception:
+        AllChem.EmbedMolecule(molecule, maxAttempts=5000, useRandomCoords=True)
+    return Chem.MolToMolBlock(molecule)
+
+
+def best_time(function, molecule: Chem.Mol, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(molecule)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--skip-legacy", action="store_true")
+    parser.add_argument(
+        "--timeout", type=int, default=60, help="RDKit embedding timeout of the engine"
+    )
+    args = parser.parse_args()
+
+    RDLogger.DisableLog("rdApp.*")
+    print(
+        f"{'molecule':>18} {'heavy atoms':>11} {'legacy ms':>10} {'engine ms':>10}"
+        f" (threads={rdkit_wrapper.conformer_threads or 'all'},"
+        f" conformers={rdkit_wrapper.conformer_count})"
+    )
+    for name, smiles in molecules:
+        molecule = Chem.MolFromSmiles(smiles)
+        legacy = (
+            "-"
+            if args.skip_legacy
+            else f"{best_time(legacy_conformer, molecule, args.repeats) * 1000:.0f}"
+        )
+        engine = best_time(
+            lambda mol: rdkit_wrapper.embed_conformer(mol, timeout=args.timeout),
+            molecule,
+            args.repeats,
+        )
+        print(
+            f"{name:>18} {molecule.GetNumHeavyAtoms():>11} {legacy:>10} {engine * 1000:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
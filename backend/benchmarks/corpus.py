@@ -0,0 +1,99 @@
+"""Generated benchmark corpus of SMILES, IUPAC names and structure images.
+
+Everything is generated from a seed, so runs on different machines see the
+same inputs.
+"""
+from __future__ import annotations
+
+import os
+import random
+from typing import List
+
+from rdkit import Chem
+from rdkit.Chem import Draw
+
+# Fragments that can be written one after the other into a valid SMILES
+fragments = [
+    "C",
+    "CC",
+    "C(C)",
+    "C(=O)",
+    "C(F)(F)",
+    "N",
+    "N(C)",
+    "O",
+    "S(=O)(=O)",
+    "c1ccc(cc1)",
+    "c1ccncc1",
+    "c1ccc2ccccc2c1",
+    "C1CCN(CC1)",
+    "C1CCOC1",
+    "c1ccoc1",
+]
+end_groups = ["C", "O", "N", "Cl", "Br", "F", "C(=O)O", "C#N", "c1ccccc1"]
+
+stems = ["meth", "eth", "prop", "but", "pent", "hex", "hept", "oct", "non", "dec"]
+suffixes = ["ane", "an-1-ol", "anoic acid", "an-1-amine", "anal", "anenitrile"]
+prefixes = ["", "2-methyl", "2-chloro", "3-bromo", "2,2-dimethyl", "4-phenyl"]
+
+
+def generate_smiles(count: int, seed: int = 0, max_fragments: int = 12) -> List[str]:
+    """Generates valid, mostly drug-sized SMILES.
+
+    Args:
+        count (int): Number of SMILES.
+        seed (int, optional): Random seed.
+        max_fragments (int, optional): Largest number of fragments per molecule.
+
+    Returns:
+        List[str]: SMILES strings, all parsed by RDKit.
+    """
+    rng = random.Random(seed)
+    smiles_list = []
+    while len(smiles_list) < count:
+        parts = rng.choices(fragments, k=rng.randint(1, max_fragments))
+        smiles = "".join(parts) + rng.choice(end_groups)
+        if Chem.MolFromSmiles(smiles):
+            smiles_list.append(smiles)
+    return smiles_list
+
+
+def generate_names(count: int, seed: int = 0) -> List[str]:
+    """Generates simple systematic names of substituted chains.
+
+    Args:
+        count (int): Number of names.
+        seed (int, optional): Random seed.
+
+    Returns:
+        List[str]: IUPAC names.
+    """
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        stem = rng.randrange(len(stems))
+        prefix = rng.choice(prefixes) if stem >= 4 else ""
+        names.append(prefix + stems[stem] + rng.choice(suffixes))
+    return names
+
+
+def generate_images(
+    smiles_list: List[str], directory: str, size: int = 1024
+) -> List[str]:
+    """Renders structure depictions as PNG files, like scanned DECIMER inputs.
+
+    Args:
+        smiles_list (List[str]): Molecules to draw.
+        directory (str): Output directory, created if necessary.
+        size (int, optional): Width and height in pixels.
+
+    Returns:
+        List[str]: Paths of the images in the order of smiles_list.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, smiles in enumerate(smiles_list):
+        path = os.path.join(directory, f"molecule_{i}.png")
+        Draw.MolToImage(Chem.MolFromSmiles(smiles), size=(size, size)).save(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,105 @@
+"""DECIMER throughput over interpreter pool sizes and interpreter threads.
+
+Usage:
+    python -m benchmarks.interpreter_pool [--sizes 1 2 4] [--threads 1 2 4] [--images 32] [--batch 1]
+
+For every combination, creates an InterpreterPool of the DECIMER TFLite
+model and predicts the same rendered structure images from one caller
+thread per interpreter, like the DECIMER engine with one batch per
+interpreter (DECIMER_INTERPRETERS, DECIMER_THREADS). Reports images per
+second, the mean call time and how long callers waited for an idle
+interpreter. Combinations using more threads than CPU cores are marked,
+and so are runs with --batch on a model without a batch dimension, like
+the shipped one, which runs every image in its own interpreter call.
+With --stub the harness runs on the stub interpreter, without TensorFlow.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from rdkit import RDLogger
+
+from app.modules import config, decimer_wrapper
+from benchmarks import corpus, stubs
+
+
+def model_inputs(count: int, use_stub: bool) -> np.ndarray:
+    """Returns DECIMER inputs of rendered structures, random ones with the stub."""
+    if use_stub:
+        return np.random.default_rng(0).random((count, 512, 512, 3), dtype=np.float32)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = corpus.generate_images(corpus.generate_smiles(count, 0), directory)
+        return np.asarray(config.model_inputs([config.preprocess_image(path) for path in paths]))
+
+
+def run_pool(size: int, threads: int, images: np.ndarray, batch: int, use_stub: bool) -> dict:
+    """Predicts all images with a pool of `size` interpreters of `threads` threads."""
+    if use_stub:
+        vocabulary = stubs.stub_vocabulary(list("CNOS()=#123"))
+        decimer_wrapper.decimer_tokenizer.override(vocabulary)
+        create = lambda: stubs.StubInterpreter(len(vocabulary))  # noqa: E731
+    else:
+        create = lambda: decimer_wrapper.load_tflite_model(  # noqa: E731
+            decimer_wrapper.decimer_model_path, threads
+        )
+    pool = decimer_wrapper.InterpreterPool(create, size, threads)
+    batches: List[np.ndarray] = [images[i : i + batch] for i in range(0, len(images), batch)]
+    with ThreadPoolExecutor(size) as callers:
+        # Warm up every interpreter with the batch shape
+        list(callers.map(pool.predict, batches[:size]))
+        calls, wait_seconds, run_seconds = pool.calls, pool.wait_seconds, pool.run_seconds
+        start = time.perf_counter()
+        list(callers.map(pool.predict, batches))
+        seconds = time.perf_counter() - start
+    calls = pool.calls - calls
+    return {
+        "interpreters": size,
+        "threads": threads,
+        "images_per_second": round(len(images) / seconds, 2),
+        "mean_call_ms": round((pool.run_seconds - run_seconds) / calls * 1000, 1),
+        "mean_wait_ms": round((pool.wait_seconds - wait_seconds) / calls * 1000, 1),
+        "batched": pool.stats()["batched"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=1, help="images per interpreter call")
+    parser.add_argument("--stub", action="store_true", help="use the stub interpreter")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    RDLogger.DisableLog("rdApp.*")
+    cores = os.cpu_count() or 1
+    images = model_inputs(args.images, args.stub)
+    print(f"{args.images} images, batches of {args.batch}, {cores} CPU cores")
+    print(f"{'interpreters':>12} {'threads':>8} {'images/s':>9} {'call ms':>8} {'wait ms':>8}")
+    results = []
+    for size in args.sizes:
+        for threads in args.threads:
+            result = run_pool(size, threads, images, args.batch, args.stub)
+            results.append(result)
+            print(
+                f"{size:>12} {threads:>8} {result['images_per_second']:>9.1f}"
+                f" {result['mean_call_ms']:>8.1f} {result['mean_wait_ms']:>8.1f}"
+                + ("  oversubscribed" if size * threads > cores else "")
+                + ("  one image per call" if args.batch > 1 and not result["batched"] else "")
+            )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpu_count": cores, "batch": args.batch, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Latency per padding bucket against the fixed 602-token padding.
+
+Usage:
+    python -m benchmarks.length_buckets [--batch 16] [--repeats 3]
+
+Requires the STOUT models, they are downloaded on first use.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.modules import stout_wrapper
+
+
+def generate_smiles(n_tokens: int) -> str:
+    """Generates a branched acyclic SMILES that splits into about n_tokens tokens.
+
+    Args:
+        n_tokens (int): Approximate number of tokens including start and end.
+
+    Returns:
+        str: SMILES string.
+    """
+    units = max((n_tokens - 3) // 5, 1)
+    return "C" + "CC(O)" * units
+
+
+def time_translation(sentences: list, buckets: tuple, repeats: int) -> float:
+    """Times the forward translation of one batch.
+
+    Args:
+        sentences (list): Split SMILES strings.
+        buckets (tuple): Padding buckets passed to tokenize_input_batch.
+        repeats (int): Number of timed runs, the fastest is reported.
+
+    Returns:
+        float: Best wall time in seconds.
+    """
+    inp_lang, _, inp_max_length, reloaded = stout_wrapper.forward_model.get()
+    decoded = stout_wrapper.tokenize_input_batch(
+        sentences, inp_lang, inp_max_length, buckets
+    )
+    # warm up the traced function for this input shape
+    stout_wrapper.run_translator(reloaded, decoded)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        stout_wrapper.run_translator(reloaded, decoded)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    max_length = stout_wrapper.inp_max_length_forward
+    buckets = stout_wrapper.get_buckets(max_length)
+    fixed = (max_length,)
+
+    print(f"{'bucket':>8} {'fixed ms':>10} {'bucketed ms':>12} {'speedup':>8}")
+    lower = 0
+    for bucket in buckets:
+        # molecules that land in the middle of the bucket
+        n_tokens = (lower + bucket) // 2
+        sentences = [stout_wrapper.split_smiles(generate_smiles(n_tokens))] * args.batch
+        fixed_time = time_translation(sentences, fixed, args.repeats)
+        bucketed_time = time_translation(sentences, buckets, args.repeats)
+        print(
+            f"{bucket:>8} {fixed_time * 1000:>10.1f} {bucketed_time * 1000:>12.1f}"
+            f" {fixed_time / bucketed_time:>7.2f}x"
+        )
+        lower = bucket
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""DECIMER image preprocessing time on large scanned images.
+
+Usage:
+    python -m benchmarks.preprocessing [--repeats 3] [--sizes 2480x3508 4960x7016]
+
+Compares the previous chain of config.decode_image (remove_transparent,
+increase_contrast, get_bnw_image, get_resize, central_square_image,
+increase_brightness and the PNG encoding) with the fused
+config.preprocess_image on simulated scans: a structure depiction on gray,
+noisy paper, saved as JPEG and as PNG. Every fused result is checked to be
+pixel-identical with the chain, also for grayscale, transparent and small
+images. With TensorFlow installed, the model inputs of both are compared too.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import time
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+from rdkit import Chem
+from rdkit.Chem import Draw
+
+from app.modules import config
+
+smiles = "CC(C)Cc1ccc(cc1)C(C)C(=O)O"
+
+
+def legacy_preprocess(image) -> Image.Image:
+    """The previous preprocessing chain of decode_image."""
+    img = config.remove_transparent(image)
+    img = config.increase_contrast(img)
+    img = config.get_bnw_image(img)
+    img = config.get_resize(img)
+    img = config.central_square_image(img)
+    return config.increase_brightness(img)
+
+
+def legacy_decode(image):
+    """The previous decode_image, from the chain over PNG bytes to the model input."""
+    import tensorflow as tf
+    import efficientnet.tfkeras as efn
+
+    img_tensor = tf.image.decode_png(
+        config.pil_image_to_bytes(legacy_preprocess(image)), channels=3
+    )
+    img_tensor = tf.image.resize(img_tensor, (512, 512), method="gaussian", antialias=True)
+    return efn.preprocess_input(img_tensor)
+
+
+def scanned_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Renders a depiction on gray paper with scanner noise."""
+    rng = np.random.default_rng(seed)
+    size = min(width, height) * 2 // 3
+    drawing = np.asarray(Draw.MolToImage(Chem.MolFromSmiles(smiles), size=(size, size)))
+    page = np.full((height, width, 3), 232, dtype=np.int16)
+    top, left = (height - size) // 2, (width - size) // 2
+    page[top : top + size, left : left + size] = np.minimum(drawing, 232)
+    page += rng.normal(0, 6, page.shape).astype(np.int16)
+    return Image.fromarray(np.clip(page, 0, 255).astype(np.uint8))
+
+
+def encode(image: Image.Image, image_format: str) -> bytes:
+    with io.BytesIO() as output:
+        image.save(output, format=image_format, quality=90)
+        return output.getvalue()
+
+
+def test_images(sizes: List[Tuple[int, int]]) -> List[Tuple[str, bytes]]:
+    """Returns (description, file content) pairs of the benchmarked and checked images."""
+    images = []
+    for width, height in sizes:
+        scan = scanned_image(width, height)
+        images.append((f"{width}x{height} JPEG", encode(scan, "JPEG")))
+        images.append((f"{width}x{height} PNG", encode(scan, "PNG")))
+    small = scanned_image(400, 300)
+    transparent = small.convert("RGBA")
+    transparent.putalpha(Image.fromarray((np.asarray(small)[:, :, 0] < 128).astype(np.uint8) * 255))
+    images.append(("400x300 PNG", encode(small, "PNG")))
+    images.append(("400x300 grayscale PNG", encode(small.convert("L"), "PNG")))
+    images.append(("400x300 transparent PNG", encode(transparent, "PNG")))
+    images.append(("512x512 palette PNG", encode(scanned_image(512, 512).convert("P"), "PNG")))
+    return images
+
+
+def best_time(function, image: bytes, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(image)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=["1240x1754", "2480x3508", "4960x7016"],
+        help="scan sizes, A4 at 150, 300 and 600 dpi by default",
+    )
+    args = parser.parse_args()
+
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes]
+    try:
+        import tensorflow  # noqa: F401
+
+        compare_model_input = True
+    except ImportError:
+        compare_model_input = False
+
+    print(f"{'image':>24} {'MiB':>6} {'chain ms':>9} {'fused ms':>9} {'speedup':>8} {'identical':>9}")
+    for name, image in test_images(sizes):
+        fused = config.preprocess_image(image)
+        identical = np.array_equal(fused, np.asarray(legacy_preprocess(image)))
+        chain = best_time(
+            lambda data: config.pil_image_to_bytes(legacy_preprocess(data)), image, args.repeats
+        )
+        fast = best_time(config.preprocess_image, image, args.repeats)
+        print(
+            f"{name:>24} {len(image) / 2**20:>6.1f} {chain * 1000:>9.1f} {fast * 1000:>9.1f}"
+            f" {chain / fast:>7.1f}x {str(identical):>9}"
+        )
+        if compare_model_input:
+            difference = np.abs(np.asarray(config.decode_image(image)) - np.asarray(legacy_decode(image)))
+            print(f"{'':>24} model input max abs difference {difference.max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
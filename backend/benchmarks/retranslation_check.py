@@ -0,0 +1,83 @@
+"""Retranslation check: InChI string comparison against same_molecule.
+
+Usage:
+    python -m benchmarks.retranslation_check [--count 512] [--repeats 3]
+
+Compares every input SMILES of a generated corpus with a differently
+written SMILES of the same molecule (as OPSIN would return it) and with an
+unrelated molecule. The memoized check is timed on a cold cache, as for a
+first request, and on a warm cache, as for repeated inputs.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from rdkit import Chem, RDLogger
+
+from app.modules import rdkit_wrapper
+from app.modules.opsin_wrapper import generate_inchi_from_smiles
+from app.modules.rdkit_wrapper import same_molecule
+from benchmarks import corpus
+
+
+def inchi_check(smiles: str, other_smiles: str) -> bool:
+    """The previous check, comparing freshly generated InChIs."""
+    return generate_inchi_from_smiles(smiles) == generate_inchi_from_smiles(other_smiles)
+
+
+def make_pairs(count: int, seed: int) -> list:
+    """Returns (input, retranslated) pairs, half of them describing the same molecule."""
+    rng = random.Random(seed)
+    smiles_list = corpus.generate_smiles(count, seed)
+    pairs = []
+    for i, smiles in enumerate(smiles_list):
+        if i % 2:
+            pairs.append((smiles, rng.choice(smiles_list)))
+        else:
+            pairs.append((smiles, Chem.MolToSmiles(Chem.MolFromSmiles(smiles), doRandom=True)))
+    return pairs
+
+
+def time_check(check, pairs: list) -> float:
+    start = time.perf_counter()
+    for smiles, other_smiles in pairs:
+        check(smiles, other_smiles)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    RDLogger.DisableLog("rdApp.*")
+    pairs = make_pairs(args.count, args.seed)
+    mismatches = sum(inchi_check(*pair) != same_molecule(*pair) for pair in pairs)
+
+    inchi = min(time_check(inchi_check, pairs) for _ in range(args.repeats))
+    cold = []
+    for _ in range(args.repeats):
+        rdkit_wrapper._canonical_cache.clear()
+        rdkit_wrapper._inchikey_cache.clear()
+        cold.append(time_check(same_molecule, pairs))
+    warm = min(time_check(same_molecule, pairs) for _ in range(args.repeats))
+
+    print(f"{'check':>22} {'ms total':>10} {'us/pair':>9} {'speedup':>8}")
+    for name, seconds in (
+        ("InChI comparison", inchi),
+        ("same_molecule, cold", min(cold)),
+        ("same_molecule, warm", warm),
+    ):
+        print(
+            f"{name:>22} {seconds * 1000:>10.1f} {seconds / len(pairs) * 1e6:>9.1f}"
+            f" {inchi / seconds:>7.1f}x"
+        )
+    print(f"{mismatches} of {len(pairs)} pairs judged differently")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Per-stage latency of the translation and image pipelines.
+
+Usage:
+    python -m benchmarks.stages [--count 256] [--output results.json]
+                                [--stub] [--compare baseline.json]
+
+Runs offline on CPU over a generated corpus. Without the downloaded STOUT
+models, or with --stub, the models are replaced by the stub engines of
+benchmarks.stubs. Stages whose dependencies are missing, e.g. OPSIN without
+a Java runtime or image decoding without TensorFlow, are reported as
+skipped. The translation caches are disabled so that every call does the
+full work of its stage.
+"""
+from __future__ import annotations
+
+import os
+
+# must be set before the app modules read their configuration
+os.environ["STOUT_CACHE_DIR"] = ""
+os.environ["STOUT_CACHE_SIZE"] = "0"
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from typing import Callable, List  # noqa: E402
+
+import numpy as np  # noqa: E402
+from rdkit import Chem, RDLogger  # noqa: E402
+
+from app.modules import config, stout_wrapper  # noqa: E402
+from app.modules.decimer_wrapper import decimer_model  # noqa: E402
+from app.modules.opsin_wrapper import (  # noqa: E402
+    _nametostruct,
+    generate_inchi_from_smiles,
+    get_smiles_opsin,
+    parse_names,
+)
+from app.modules.rdkit_wrapper import get_3d_conformers, same_molecule  # noqa: E402
+from app.modules.tables import TranslationRow, legacy_columns, to_legacy_json  # noqa: E402
+from app.modules.visualize_wrapper import get_svg_2d  # noqa: E402
+from benchmarks import corpus, stubs  # noqa: E402
+
+
+def time_calls(function: Callable, inputs: List, items_per_call: List[int] = None) -> dict:
+    """Times function on every input after one untimed warm-up call.
+
+    Args:
+        function (Callable): Stage function taking one input.
+        inputs (List): Inputs, one per call.
+        items_per_call (List[int], optional): Corpus items in each input, 1 per call by default.
+
+    Returns:
+        dict: Call and item counts, total seconds, latency percentiles and throughput.
+    """
+    function(inputs[0])
+    timings = []
+    for item in inputs:
+        start = time.perf_counter()
+        function(item)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings)
+    items = sum(items_per_call) if items_per_call else len(inputs)
+    total = float(timings.sum())
+    return {
+        "calls": len(inputs),
+        "items": items,
+        "total_seconds": total,
+        "mean_ms": float(timings.mean() * 1000),
+        "p50_ms": float(np.percentile(timings, 50) * 1000),
+        "p95_ms": float(np.percentile(timings, 95) * 1000),
+        "items_per_second": items / total if total else None,
+    }
+
+
+def run_stage(results: dict, name: str, setup: Callable[[], tuple]):
+    """Runs one stage and stores its timings or the reason it was skipped.
+
+    Args:
+        results (dict): Stage results by name.
+        name (str): Stage name.
+        setup (Callable[[], tuple]): Returns the arguments of time_calls.
+    """
+    try:
+        results[name] = time_calls(*setup())
+    except Exception as e:
+        results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+    result = results[name]
+    if "skipped" in result:
+        print(f"{name:>22}  skipped ({result['skipped']})")
+    else:
+        print(
+            f"{name:>22}  {result['mean_ms']:>9.3f} ms/call"
+            f"  p95 {result['p95_ms']:>9.3f} ms  {result['items_per_second']:>10.1f} items/s"
+        )
+
+
+def batches(items: List, size: int) -> List[List]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def run_benchmarks(count: int, image_count: int, use_stub: bool, seed: int) -> dict:
+    """Generates the corpus and times every stage.
+
+    Args:
+        count (int): Number of SMILES and names.
+        image_count (int): Number of images.
+        use_stub (bool): Use the stub engines even if the models are available.
+        seed (int): Corpus seed.
+
+    Returns:
+        dict: Run metadata and the results of every stage.
+    """
+    smiles_list = corpus.generate_smiles(count, seed)
+    names = corpus.generate_names(count, seed)
+    stubbed = use_stub or not stubs.weights_available()
+    if stubbed:
+        stubs.install_stubs(smiles_list, names)
+
+    results = {}
+    image_dir = tempfile.TemporaryDirectory()
+    try:
+        image_paths = corpus.generate_images(smiles_list[:image_count], image_dir.name)
+        molecules = [Chem.MolFromSmiles(smiles) for smiles in smiles_list]
+        batch_size = stout_wrapper.batch_size
+        split = [stout_wrapper.split_smiles(smiles) for smiles in smiles_list]
+        split_batches = batches(split, batch_size)
+        sizes = [len(batch) for batch in split_batches]
+
+        def tokenized():
+            inp_lang, _, inp_max_length, _ = stout_wrapper.forward_model.get()
+            return [
+                stout_wrapper.tokenize_input_batch(batch, inp_lang, inp_max_length)
+                for batch in split_batches
+            ]
+
+        def predicted():
+            reloaded = stout_wrapper.forward_model.get()[3]
+            return [stout_wrapper.run_translator(reloaded, batch) for batch in tokenized()]
+
+        def tokenize_stage():
+            inp_lang, _, inp_max_length, _ = stout_wrapper.forward_model.get()
+            return (
+                lambda batch: stout_wrapper.tokenize_input_batch(batch, inp_lang, inp_max_length),
+                split_batches,
+                sizes,
+            )
+
+        def model_stage():
+            reloaded = stout_wrapper.forward_model.get()[3]
+            return (
+                lambda batch: stout_wrapper.run_translator(reloaded, batch),
+                tokenized(),
+                sizes,
+            )
+
+        def table_stage():
+            columns = legacy_columns(retranslate=False, visualize=False)
+            rows = [TranslationRow(smiles, name) for smiles, name in zip(smiles_list, names)]
+            return (
+                lambda batch: to_legacy_json(batch, columns),
+                batches(rows, batch_size),
+                sizes,
+            )
+
+        def opsin_stage():
+            # start the JVM outside the timed calls
+            _nametostruct.get()
+            return (get_smiles_opsin, names)
+
+        def opsin_batch_stage():
+            _nametostruct.get()
+            name_batches = batches(names, batch_size)
+            return (parse_names, name_batches, [len(batch) for batch in name_batches])
+
+        def decimer_stage():
+            images = [config.decode_image(path) for path in image_paths]
+            pool = decimer_model.get()
+            return (lambda image: pool.predict(np.asarray(image)[np.newaxis]), images)
+
+        run_stage(results, "split_smiles", lambda: (stout_wrapper.split_smiles, smiles_list))
+        run_stage(results, "tokenize_input", tokenize_stage)
+        run_stage(results, "model_call", model_stage)
+        run_stage(
+            results,
+            "detokenize",
+            lambda: (stout_wrapper.detokenize_output_forward_batch, predicted(), sizes),
+        )
+        run_stage(results, "get_smiles_opsin", opsin_stage)
+        run_stage(results, "parse_names", opsin_batch_stage)
+        run_stage(
+            results, "generate_inchi_from_smiles", lambda: (generate_inchi_from_smiles, smiles_list)
+        )
+        run_stage(
+            results,
+            "same_molecule",
+            lambda: (lambda pair: same_molecule(*pair), list(zip(smiles_list, smiles_list[::-1]))),
+        )
+        run_stage(results, "get_svg_2d", lambda: (get_svg_2d, smiles_list))
+        run_stage(
+            results,
+            "get_3d_conformers",
+            lambda: (get_3d_conformers, molecules[: max(count // 8, 1)]),
+        )
+        run_stage(results, "decode_image", lambda: (config.decode_image, image_paths))
+        run_stage(results, "decimer_model_call", decimer_stage)
+        run_stage(results, "table_json", table_stage)
+    finally:
+        image_dir.cleanup()
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "stub_models": stubbed,
+            "count": count,
+            "image_count": image_count,
+            "batch_size": stout_wrapper.batch_size,
+            "seed": seed,
+        },
+        "stages": results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Compares the mean latency of every stage with a previous run.
+
+    Args:
+        results (dict): Results of this run.
+        baseline (dict): Results of a previous run, e.g. loaded from its JSON file.
+        tolerance (float): Allowed relative slowdown, 0.2 allows 20%.
+
+    Returns:
+        List[str]: Names of the stages that got slower than allowed.
+    """
+    regressions = []
+    print(f"\n{'stage':>22}  {'baseline ms':>11}  {'ms':>9}  {'ratio':>6}")
+    for name, result in results["stages"].items():
+        before = baseline.get("stages", {}).get(name, {})
+        if "mean_ms" not in result or "mean_ms" not in before:
+            continue
+        ratio = result["mean_ms"] / before["mean_ms"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:>22}  {before['mean_ms']:>11.3f}  {result['mean_ms']:>9.3f}  {ratio:>5.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=256, help="number of SMILES and names")
+    parser.add_argument("--images", type=int, default=8, help="number of images")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stub", action="store_true", help="use the stub engines")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="allowed relative slowdown per stage"
+    )
+    args = parser.parse_args()
+
+    RDLogger.DisableLog("rdApp.*")
+    results = run_benchmarks(args.count, args.images, args.stub, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Slower than the baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Stub engines replacing the STOUT and DECIMER models in benchmarks.
+
+The stubs have the call signatures of the real models and do a small,
+deterministic amount of NumPy work, so every stage around the models runs
+as in production without TensorFlow or the trained weights.
+"""
+from __future__ import annotations
+
+import os
+from typing import Iterable, List
+
+import numpy as np
+
+from app.modules import decimer_wrapper, stout_wrapper
+from app.modules.vocabulary import Vocabulary, end_token, start_token
+
+
+def stub_vocabulary(tokens: Iterable[str]) -> Vocabulary:
+    """Builds a vocabulary holding the given tokens after padding, start and end."""
+    tokens = sorted(set(tokens) - {"", start_token, end_token})
+    return Vocabulary(["", start_token, end_token] + tokens)
+
+
+class StubTranslator:
+    """Stands in for a STOUT SavedModel.
+
+    Predicts one target token per input token, so output lengths follow the
+    input lengths like a real translation, with a made-up probability per
+    predicted token as confidence.
+
+    Args:
+        target_vocabulary (Vocabulary): Vocabulary of the predicted tokens.
+        output_length (int): Number of columns of the prediction.
+    """
+
+    def __init__(self, target_vocabulary: Vocabulary, output_length: int = 300):
+        self.n_tokens = len(target_vocabulary)
+        self.start_id = target_vocabulary.start_id
+        self.end_id = target_vocabulary.end_id
+        self.output_length = output_length
+
+    def __call__(self, tokenized_input: np.ndarray):
+        tokens = np.asarray(tokenized_input)[:, : self.output_length - 1]
+        lengths = (tokens > 0).sum(axis=1)
+        predicted = np.zeros((len(tokens), self.output_length), dtype=np.int64)
+        predicted[:, 0] = self.start_id
+        predicted[:, 1 : tokens.shape[1] + 1] = np.where(
+            tokens > 0, 3 + tokens % (self.n_tokens - 3), 0
+        )
+        predicted[np.arange(len(tokens)), np.minimum(lengths + 1, self.output_length - 1)] = self.end_id
+        probabilities = 0.8 + 0.2 * (predicted[:, 1:] * 7919 % 100) / 100
+        return predicted, probabilities
+
+
+class StubInterpreter:
+    """Stands in for the DECIMER TFLite interpreter.
+
+    Args:
+        n_tokens (int): Size of the DECIMER vocabulary.
+        output_length (int): Number of predicted tokens.
+        batch_dimension (bool): Whether the input has a batch dimension,
+            the shipped model has none.
+    """
+
+    def __init__(self, n_tokens: int, output_length: int = 75, batch_dimension: bool = False):
+        self.n_tokens = n_tokens
+        self.output_length = output_length
+        self.tensors = {}
+        self.input_shape = np.array([1, 512, 512, 3] if batch_dimension else [512, 512, 3])
+
+    def get_input_details(self) -> List[dict]:
+        return [{"index": 0, "shape": self.input_shape, "dtype": np.float32}]
+
+    def resize_tensor_input(self, index: int, shape):
+        self.input_shape = np.array(shape)
+
+    def allocate_tensors(self):
+        pass
+
+    def get_output_details(self) -> List[dict]:
+        return [{"index": 1, "shape": np.array([1, self.output_length]), "dtype": np.int64}]
+
+    def set_tensor(self, index: int, value: np.ndarray):
+        self.tensors[index] = np.asarray(value)
+
+    def invoke(self):
+        image = self.tensors[0].reshape(-1, 512 * 512 * 3)
+        seeds = np.abs(image.sum(axis=1)).astype(np.int64)
+        columns = np.arange(self.output_length)
+        self.tensors[1] = 3 + (seeds[:, None] + columns) % (self.n_tokens - 3)
+
+    def get_tensor(self, index: int) -> np.ndarray:
+        return self.tensors[index]
+
+
+def weights_available() -> bool:
+    """Returns whether the STOUT models have been downloaded."""
+    return os.path.exists(stout_wrapper.model_path)
+
+
+def install_stubs(smiles_list: List[str], names: List[str]):
+    """Replaces the STOUT and DECIMER resources with stubs.
+
+    The stub vocabularies are built from the corpus, so every input can be
+    tokenized.
+
+    Args:
+        smiles_list (List[str]): SMILES of the benchmark corpus.
+        names (List[str]): IUPAC names of the benchmark corpus.
+    """
+    smiles_tokens = {
+        token
+        for smiles in smiles_list
+        for token in stout_wrapper.split_smiles(smiles).split(" ")
+    }
+    name_tokens = {token for name in names for token in stout_wrapper.split_iupac(name).split(" ")}
+    smiles_vocabulary = stub_vocabulary(smiles_tokens)
+    name_vocabulary = stub_vocabulary(name_tokens)
+
+    stout_wrapper.forward_model.override(
+        (
+            smiles_vocabulary,
+            name_vocabulary,
+            stout_wrapper.inp_max_length_forward,
+            StubTranslator(name_vocabulary),
+        )
+    )
+    stout_wrapper.backward_model.override(
+        (
+            name_vocabulary,
+            smiles_vocabulary,
+            stout_wrapper.inp_max_length_backward,
+            StubTranslator(smiles_vocabulary),
+        )
+    )
+    decimer_wrapper.decimer_tokenizer.override(smiles_vocabulary)
+    decimer_wrapper.decimer_model.override(
+        decimer_wrapper.InterpreterPool(lambda: StubInterpreter(len(smiles_vocabulary)))
+    )
@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+# Set before the app modules read their configuration: models load on first
+# use, caches stay in memory and everything written goes to a temporary directory
+_run_dir = tempfile.mkdtemp(prefix="stout-tests-")
+for name, value in {
+    "STARTUP_MODE": "lazy",
+    "STOUT_CACHE_DIR": "",
+    "DEPICTION_CACHE_DIR": "",
+    "CONFORMER_CACHE_DIR": "",
+    "DECIMER_CACHE_DIR": "",
+    "STOUT_JOBS_DIR": os.path.join(_run_dir, "jobs"),
+    "MODEL_SOCKET_DIR": os.path.join(_run_dir, "run"),
+    "OPSIN_SOCKET_DIR": os.path.join(_run_dir, "run"),
+}.items():
+    os.environ.setdefault(name, value)
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def stub_models():
+    """Replaces the STOUT and DECIMER models with the benchmark stubs."""
+    from benchmarks import stubs
+
+    smiles_list = ["CCO", "CN1C=NC2=C1C(=O)N(C(=O)N2C)C", "c1ccccc1O", "CC(=O)O"]
+    names = ["ethanol", "1,3,7-trimethylpurine-2,6-dione", "phenol", "acetic acid"]
+    stubs.install_stubs(smiles_list, names)
+    return smiles_list
@@ -0,0 +1,25 @@
+import pytest
+
+from app.modules import backends
+
+
+def test_backend_paths():
+    assert backends.backend_path("models/translator_forward/", "savedmodel") == "models/translator_forward/"
+    assert backends.backend_path("models/translator_forward/", "onnx") == "models/translator_forward.onnx"
+    with pytest.raises(ValueError):
+        backends.backend_path("models/translator_forward", "torch")
+
+
+def test_unvalidated_backends_need_opting_in(monkeypatch, tmp_path):
+    monkeypatch.setattr(backends, "stout_backend", "tflite-dynamic")
+    with pytest.raises(ValueError, match="STOUT_EXPERIMENTAL_BACKENDS"):
+        backends.load_translator(str(tmp_path / "translator_forward"))
+    monkeypatch.setattr(backends, "experimental_backends", True)
+    with pytest.raises(FileNotFoundError):
+        backends.load_translator(str(tmp_path / "translator_forward"))
+
+
+def test_explicit_backends_are_loaded_for_benchmarks(tmp_path):
+    # benchmarks.backends compares every backend, whatever STOUT_BACKEND says
+    with pytest.raises(FileNotFoundError):
+        backends.load_translator(str(tmp_path / "translator_forward"), "onnx")
@@ -0,0 +1,83 @@
+import time
+
+from app.modules import translation_cache
+from app.modules.cache import LRUCache, TwoTierCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("a") == "1" and cache.get("b") is None and len(cache) == 2
+
+
+def test_lru_entries_expire():
+    cache = LRUCache(maxsize=2, ttl=0.1)
+    cache.set("a", "1")
+    time.sleep(0.15)
+    assert cache.get("a") is None
+
+
+def test_two_tier_cache_survives_restarts(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = TwoTierCache("test", maxsize=10, path=path)
+    cache.set_many([("a", "1"), ("b", "2")])
+    restarted = TwoTierCache("test", maxsize=10, path=path)
+    assert restarted.get_many(["a", "b", "c"]) == {"a": "1", "b": "2"}
+    assert restarted.get("a") == "1"
+    stats = restarted.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (2, 1, 1)
+    assert stats["disk_entries"] == 2
+
+
+def test_disk_store_is_bounded(tmp_path):
+    cache = TwoTierCache("test", maxsize=10, path=str(tmp_path / "cache.sqlite"), max_entries=5)
+    cache.set_many((str(i), str(i)) for i in range(20))
+    cache.disk.purge()
+    assert len(cache.disk) <= 5
+
+
+def test_memory_only_cache():
+    cache = TwoTierCache("test", maxsize=10)
+    cache.set("a", "1")
+    assert cache.get("a") == "1"
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_translations_are_cached_in_both_directions():
+    translation_cache.store_iupac([("CCO", ("ethanol", 0.9))])
+    assert translation_cache.get_iupac(["CCO"]) == {"CCO": ("ethanol", 0.9)}
+    # The reverse direction has no confidence of its own
+    assert translation_cache.get_smiles(["ethanol"]) == {"ethanol": ("CCO", None)}
+
+
+def test_names_are_normalized():
+    assert translation_cache.normalize_name("2-methyl  propan-1-ol ") == "2-methyl propan-1-ol"
+
+
+def test_add_many_keeps_existing_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = TwoTierCache("test", maxsize=10, path=path)
+    cache.set("a", "1")
+    cache.add_many([("a", "2"), ("b", "2")])
+    assert cache.get_many(["a", "b"]) == {"a": "1", "b": "2"}
+    restarted = TwoTierCache("test", maxsize=10, path=path)
+    restarted.add_many([("a", "3")])
+    assert restarted.get("a") == "1"
+
+
+def test_reverse_translations_keep_forward_entries():
+    caffeine = "Cn1c(=O)c2c(ncn2C)n(C)c1=O"
+    name = "1,3,7-trimethylpurine-2,6-dione"
+    translation_cache.store_iupac([(caffeine, (name, 0.9))])
+    translation_cache.store_smiles([("coffee stuff", (caffeine, 0.3))])
+    assert translation_cache.get_iupac([caffeine]) == {caffeine: (name, 0.9)}
+    assert translation_cache.get_smiles(["coffee stuff"]) == {"coffee stuff": (caffeine, 0.3)}
+
+
+def test_forward_translations_keep_reverse_entries():
+    translation_cache.store_smiles([("propan-1-ol", ("CCCO", 0.8))])
+    translation_cache.store_iupac([("OCCC", ("propan-1-ol", 0.5))])
+    assert translation_cache.get_smiles(["propan-1-ol"]) == {"propan-1-ol": ("CCCO", 0.8)}
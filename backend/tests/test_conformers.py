@@ -0,0 +1,57 @@
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+from app.modules import conformers, rdkit_wrapper
+
+
+def test_conformer_is_computed_once_and_cached():
+    result = conformers.get_conformer("CCO", budget=None)
+    assert result.status == "done" and "M  END" in result.molblock
+    hits = conformers.molblock_cache.memory_hits
+    assert conformers.get_conformer("OCC", budget=None) == result
+    assert conformers.molblock_cache.memory_hits == hits + 1
+
+
+def test_slow_conformers_are_pending_until_done():
+    smiles = "CC(C)Cc1ccc(cc1)C(C)C(=O)OCCCCCCCCCCCCCCCCCC"
+    result = conformers.get_conformer(smiles, budget=0)
+    assert result.status in ("pending", "done")
+    done = conformers.lookup(result.key, budget=None)
+    assert done.status == "done" and done.molblock
+
+
+def test_invalid_smiles_and_unknown_keys():
+    assert conformers.get_conformer("not a smiles") is None
+    assert conformers.lookup("0" * 32) is None
+
+
+def test_timeouts_are_not_cached(monkeypatch):
+    def embed(mol, hydrogens, timeout):
+        raise TimeoutError("No conformer embedded")
+
+    monkeypatch.setattr(conformers, "embed_conformer", embed)
+    result = conformers.get_conformer("CCCO", budget=None)
+    assert result.status == "failed"
+    assert conformers.molblock_cache.get(result.key) is None
+    monkeypatch.undo()
+    assert conformers.lookup(result.key, budget=None).status == "done"
+
+
+def test_molecules_that_cannot_be_embedded_are_cached(monkeypatch):
+    monkeypatch.setattr(conformers, "embed_conformer", lambda mol, hydrogens, timeout: None)
+    result = conformers.get_conformer("CCCCO", budget=None)
+    assert result.status == "failed"
+    assert conformers.molblock_cache.get(result.key) == ""
+
+
+def test_one_conformer_is_embedded_by_default(monkeypatch):
+    counts = []
+    embed = AllChem.EmbedMultipleConfs
+
+    def embed_multiple(mol, count, params):
+        counts.append(count)
+        return embed(mol, count, params)
+
+    monkeypatch.setattr(AllChem, "EmbedMultipleConfs", embed_multiple)
+    assert "M  END" in rdkit_wrapper.embed_conformer(Chem.MolFromSmiles("CCN"))
+    assert counts == [1]
@@ -0,0 +1,134 @@
+import io
+import json
+import zipfile
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+from app.modules import config, engines, image_cache
+from benchmarks.preprocessing import encode, legacy_preprocess, scanned_image
+
+
+def png(width, height, seed=0):
+    return encode(scanned_image(width, height, seed), "PNG")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Client with DECIMER replaced by a fake that stacks its batch like the model."""
+    batches = []
+
+    def predict(images):
+        stacked = np.stack(images)
+        batches.append(len(stacked))
+        return [f"C{image.shape[0]}_{int(image.mean())}" for image in stacked]
+
+    monkeypatch.setattr(engines.decimer, "batch_function", predict)
+    for cache in (image_cache.upload_cache, image_cache.preprocessed_cache):
+        cache.memory.clear()
+    client = TestClient(app)
+    client.batches = batches
+    return client
+
+
+def test_preprocessed_size_depends_on_aspect_ratio():
+    # resize_by_ratio truncates 561 px to 511 px, which gives a smaller square
+    assert config.preprocess_image(png(561, 300)).shape == (613, 613)
+    assert config.preprocess_image(png(800, 600)).shape == (614, 614)
+
+
+def test_fused_preprocessing_matches_the_previous_chain():
+    page = scanned_image(400, 300)
+    transparent = page.convert("RGBA")
+    transparent.putalpha(Image.fromarray((np.asarray(page)[:, :, 0] < 128).astype(np.uint8) * 255))
+    images = [
+        encode(page, "PNG"),
+        encode(page, "JPEG"),
+        encode(page.convert("L"), "PNG"),
+        encode(transparent, "PNG"),
+        encode(page.convert("P"), "PNG"),
+        encode(scanned_image(120, 90), "PNG"),
+    ]
+    for data in images:
+        assert np.array_equal(config.preprocess_image(data), np.asarray(legacy_preprocess(data)))
+
+
+def test_model_inputs_of_mixed_sizes():
+    pytest.importorskip("tensorflow")
+    images = [config.preprocess_image(png(561, 300)), config.preprocess_image(png(800, 600))]
+    batch = np.asarray(config.model_inputs(images))
+    assert batch.shape == (2, 512, 512, 3)
+    for image, model_input in zip(images, batch):
+        assert np.allclose(np.asarray(config.model_inputs([image]))[0], model_input, atol=1e-5)
+
+
+def test_batch_of_mixed_sizes(client):
+    files = [
+        ("files", ("wide.png", png(561, 300))),
+        ("files", ("page.png", png(800, 600))),
+        ("files", ("other.png", png(644, 400, seed=1))),
+    ]
+    response = client.post("/latest/decimer/image2SMILES/batch", files=files)
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["filename"] for record in records] == ["wide.png", "page.png", "other.png"]
+    assert all("SMILES" in record for record in records)
+    assert records[0]["SMILES"].startswith("C613")
+
+
+def test_batch_keeps_upload_order_and_reports_errors(client):
+    files = [("files", (f"{i}.png", png(400 + 20 * i, 300, seed=i))) for i in range(6)]
+    files.insert(2, ("files", ("broken.png", b"not an image")))
+    response = client.post("/latest/decimer/image2SMILES/batch", files=files)
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["index"] for record in records] == list(range(7))
+    assert "error" in records[2]
+    assert sum("SMILES" in record for record in records) == 6
+
+
+def test_batch_expands_archives(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as f:
+        f.writestr("a.png", png(400, 300))
+        f.writestr("__MACOSX/._a.png", b"")
+        f.writestr("sub/b.png", png(500, 300, seed=1))
+    response = client.post(
+        "/latest/decimer/image2SMILES/batch",
+        files=[("files", ("images.zip", archive.getvalue()))],
+    )
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["filename"] for record in records] == ["images.zip/a.png", "images.zip/sub/b.png"]
+
+
+def test_single_image(client):
+    response = client.post("/latest/decimer/image2SMILES", files={"file": ("a.png", png(400, 300))})
+    assert response.status_code == 200
+    assert response.json()["SMILES"].startswith("C")
+
+
+def test_cache_hits_on_repeated_and_reencoded_uploads(client):
+    image = scanned_image(400, 300)
+    first = encode(image, "PNG")
+    with io.BytesIO() as output:
+        image.save(output, format="PNG", compress_level=1)
+        reencoded = output.getvalue()
+    assert first != reencoded
+    for data in (first, first, reencoded):
+        response = client.post("/latest/decimer/image2SMILES", files={"file": ("a.png", data)})
+        assert response.status_code == 200
+    assert client.batches == [1]
+    stats = client.get("/latest/decimer/cache").json()
+    assert stats["uploads"]["memory_hits"] == 1
+    assert stats["images"]["memory_hits"] == 1
+
+
+def test_repeated_images_in_a_batch_are_predicted_once(client):
+    data = png(400, 300)
+    files = [("files", (f"{i}.png", data)) for i in range(3)]
+    response = client.post("/latest/decimer/image2SMILES/batch", files=files)
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len({record["SMILES"] for record in records}) == 1
+    assert sum(client.batches) == 1
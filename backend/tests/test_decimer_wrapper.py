@@ -0,0 +1,92 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.modules import decimer_wrapper
+from app.modules.decimer_wrapper import InterpreterPool
+from benchmarks.stubs import StubInterpreter
+
+
+@pytest.fixture
+def n_tokens(stub_models):
+    return len(decimer_wrapper.decimer_tokenizer.get())
+
+
+def images(count):
+    rng = np.random.default_rng(count)
+    return rng.random((count, 512, 512, 3), dtype=np.float32)
+
+
+class UnbatchedInterpreter(StubInterpreter):
+    """Fails to run a resized batch input, like some converted models."""
+
+    def invoke(self):
+        if self.input_shape[0] > 1:
+            raise RuntimeError("batch input not supported")
+        super().invoke()
+
+
+def test_batch_predicts_like_single_images(n_tokens):
+    pool = InterpreterPool(lambda: StubInterpreter(n_tokens, batch_dimension=True))
+    batch = images(3)
+    single = [pool.predict(image[np.newaxis])[0] for image in batch]
+    assert pool.predict(batch) == single
+    assert all(single)
+
+
+def test_falls_back_to_single_images(n_tokens):
+    pool = InterpreterPool(lambda: UnbatchedInterpreter(n_tokens, batch_dimension=True))
+    batch = images(3)
+    expected = InterpreterPool(lambda: StubInterpreter(n_tokens, batch_dimension=True)).predict(batch)
+    assert pool.predict(batch) == expected
+    with pool.acquire() as interpreter:
+        assert not interpreter.batched
+    # Later batches skip the failing batched call
+    assert pool.predict(batch) == expected
+    assert not pool.stats()["batched"]
+
+
+def test_model_without_batch_dimension_runs_images_one_by_one(n_tokens):
+    pool = InterpreterPool(lambda: StubInterpreter(n_tokens))
+    batch = images(3)
+    expected = InterpreterPool(lambda: StubInterpreter(n_tokens, batch_dimension=True)).predict(batch)
+    assert pool.predict(batch) == expected
+    stats = pool.stats()
+    assert not stats["batched"]
+    assert (stats["calls"], stats["images"], stats["invocations"]) == (1, 3, 3)
+
+
+def test_callers_wait_for_an_idle_interpreter(n_tokens):
+    pool = InterpreterPool(lambda: StubInterpreter(n_tokens), size=2, num_threads=4)
+    acquired = threading.Event()
+
+    def third():
+        with pool.acquire():
+            acquired.set()
+
+    with pool.acquire() as first, pool.acquire() as second:
+        assert first is not second
+        waiter = threading.Thread(target=third)
+        waiter.start()
+        assert not acquired.wait(0.2)
+        assert (pool.stats()["busy"], pool.stats()["waiting"]) == (2, 1)
+    waiter.join(5)
+    assert acquired.is_set()
+    assert (pool.stats()["busy"], pool.stats()["waiting"]) == (0, 0)
+
+
+def test_stats(n_tokens):
+    pool = InterpreterPool(lambda: StubInterpreter(n_tokens, batch_dimension=True), size=2, num_threads=4)
+    assert pool.stats()["mean_call_ms"] == 0.0
+    pool.predict(images(3))
+    pool.predict(images(1))
+    stats = pool.stats()
+    assert set(stats) == {
+        "interpreters", "threads", "batched", "busy", "waiting", "calls", "images", "invocations",
+        "mean_wait_ms", "mean_call_ms",
+    }
+    assert stats["batched"]
+    assert (stats["interpreters"], stats["threads"], stats["calls"], stats["images"]) == (2, 4, 2, 4)
+    assert stats["invocations"] == 2
+    assert stats["mean_call_ms"] > 0
@@ -0,0 +1,43 @@
+import base64
+import json
+import zlib
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.modules import depiction
+
+caffeine = "CN1C=NC2=C1C(=O)N(C(=O)N2C)C"
+
+
+def test_same_molecule_same_key():
+    assert depiction.depiction_key(caffeine) == depiction.depiction_key("CN1C(=O)N(C)C2=C(N(C)C=N2)C1=O")
+    assert depiction.depiction_key(caffeine) != depiction.depiction_key(caffeine, rotate=90)
+    assert depiction.depiction_key("not a smiles") is None
+
+
+def test_key_renders_without_shared_cache():
+    key = depiction.depiction_key(caffeine)
+    # Another web worker has not seen the key and has its own memory cache
+    depiction.svg_cache.memory.clear()
+    assert depiction.get_depiction(key).lstrip().startswith("<?xml")
+
+
+def test_invalid_keys():
+    def encode(source):
+        return base64.urlsafe_b64encode(zlib.compress(json.dumps(source).encode())).decode()
+
+    assert depiction.get_depiction("not-a-key") is None
+    assert depiction.get_depiction(encode([caffeine, [100000, 100000], 0, True])) is None
+    assert depiction.get_depiction(encode({"smiles": caffeine})) is None
+
+
+def test_depiction_endpoint():
+    client = TestClient(app)
+    key = depiction.depiction_key(caffeine)
+    response = client.get(f"/latest/depict/{key}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/svg+xml"
+    etag = response.headers["etag"]
+    assert client.get(f"/latest/depict/{key}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/latest/depict/unknown").status_code == 404
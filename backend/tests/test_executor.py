@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.exception_handlers import ServiceOverloadedException
+from app.main import app
+from app.modules import executor
+from app.modules import streaming
+from app.modules.executor import BoundedExecutor
+
+
+def test_tasks_beyond_workers_and_queue_are_rejected():
+    pool = BoundedExecutor("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        running = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(ServiceOverloadedException):
+            await pool.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+
+    asyncio.run(main())
+    stats = pool.stats()
+    assert (stats["completed"], stats["rejected"], stats["queue_depth"]) == (2, 1, 0)
+
+
+def test_streams_wait_for_room_instead_of_failing():
+    attempts = []
+
+    async def overloaded_once():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ServiceOverloadedException("test", 0)
+        return "done"
+
+    assert asyncio.run(streaming.retry_when_overloaded(overloaded_once)) == "done"
+    assert len(attempts) == 2
+
+
+def test_full_pool_answers_503_with_retry_after(monkeypatch):
+    pool = executor.rdkit_pool
+    monkeypatch.setattr(pool, "_pending", pool.max_workers + pool.max_queue)
+    response = TestClient(app).post(
+        "/latest/stout/SMILE2IUPAC", content="CCO", headers={"Content-Type": "text/plain"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(executor.retry_after)
+
+
+def test_queues_report_every_pool():
+    queues = TestClient(app).get("/queues").json()
+    assert set(queues["pools"]) == {"model", "opsin", "rdkit", "image"}
+    assert set(queues["engines"]) >= {"stout_forward", "stout_reverse", "decimer"}
@@ -0,0 +1,61 @@
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from app.modules import ipc
+
+
+def serve_in_thread(address, functions):
+    threading.Thread(target=ipc.serve, args=(address, functions), daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(address):
+            return
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def run_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ipc, "ipc_authkey", b"")
+    return str(tmp_path / "run")
+
+
+def test_private_directory_is_created_with_mode_0700(run_dir):
+    ipc.private_directory(run_dir)
+    assert stat.S_IMODE(os.stat(run_dir).st_mode) == 0o700
+
+
+def test_private_directory_rejects_wider_permissions(run_dir):
+    os.makedirs(run_dir)
+    os.chmod(run_dir, 0o755)
+    with pytest.raises(PermissionError):
+        ipc.private_directory(run_dir)
+
+
+def test_random_key_per_directory(run_dir, tmp_path):
+    key = ipc.authkey(os.path.join(run_dir, "a.sock"))
+    assert len(key) == 64 and key != b"stout-webapp"
+    assert ipc.authkey(os.path.join(run_dir, "b.sock")) == key
+    key_file = os.path.join(run_dir, ipc.authkey_filename)
+    assert stat.S_IMODE(os.stat(key_file).st_mode) == 0o600
+    assert ipc.authkey(str(tmp_path / "other" / "a.sock")) != key
+
+
+def test_calls_and_remote_errors(run_dir):
+    address = os.path.join(run_dir, "test.sock")
+    serve_in_thread(address, {"add": lambda a, b: a + b, "fail": lambda: 1 / 0})
+    client = ipc.Client([address], timeout=5)
+    assert client.call("add", 1, 2) == 3
+    with pytest.raises(ZeroDivisionError):
+        client.call("fail")
+    client.close()
+
+
+def test_wrong_key_is_rejected(run_dir, monkeypatch):
+    address = os.path.join(run_dir, "test.sock")
+    serve_in_thread(address, {"ping": os.getpid})
+    monkeypatch.setattr(ipc, "ipc_authkey", b"guessed")
+    with pytest.raises(ipc.ServiceUnavailableError):
+        ipc.Client([address], timeout=5).call("ping")
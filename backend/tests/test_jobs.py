@@ -0,0 +1,221 @@
+import io
+import time
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.modules import jobs
+from app.routers import jobs as jobs_router
+
+
+@pytest.fixture
+def store(tmp_path):
+    return jobs.JobStore(str(tmp_path / "jobs.sqlite"))
+
+
+def test_read_smiles_and_csv():
+    assert list(jobs.read_smiles(io.BytesIO(b"CCO ethanol\n\nc1ccccc1\n"))) == ["CCO", "c1ccccc1"]
+    data = b"name,SMILES\nethanol,CCO\nempty,\nphenol,Oc1ccccc1\n"
+    assert list(jobs.read_smiles(io.BytesIO(data), "library.csv")) == ["CCO", "Oc1ccccc1"]
+
+
+def test_leases_are_exclusive_until_they_expire(store):
+    job_id = store.create(iter(["C", "CC", "CCC"]))
+    job, items = store.claim("a", 2, lease_seconds=0.2)
+    assert job["id"] == job_id and [item[:2] for item in items] == [(0, "C"), (1, "CC")]
+    _, items = store.claim("b", 2, lease_seconds=0.2)
+    assert [item[0] for item in items] == [2]
+    assert store.claim("c", 2) is None
+    time.sleep(0.25)
+    _, items = store.claim("c", 3)
+    assert [(item[0], item[2]) for item in items] == [(0, 2), (1, 2), (2, 2)]
+
+
+def test_completing_all_items_completes_the_job(store):
+    job_id = store.create(iter(["C", "CC"]))
+    _, items = store.claim("a", 10)
+    store.complete_items(job_id, [(item[0], {"Original SMILES": item[1]}) for item in items])
+    job = store.get(job_id)
+    assert job["status"] == "completed" and job["progress"] == 1.0
+    assert [record["status"] for record in store.results(job_id, 0, 10)] == ["done", "done"]
+
+
+def test_released_items_are_claimed_again_after_the_delay(store):
+    job_id = store.create(iter(["C"]))
+    store.claim("a", 10)
+    store.release(job_id, [0], delay=0.2)
+    assert store.claim("b", 10) is None
+    time.sleep(0.25)
+    assert store.claim("b", 10)[1] == [(0, "C", 2)]
+
+
+def run_one_batch(store, monkeypatch, translate):
+    """Runs the worker loop until it sleeps for lack of work."""
+    import app.modules.pipeline as pipeline
+
+    class Idle(Exception):
+        pass
+
+    def sleep(seconds):
+        raise Idle
+
+    monkeypatch.setattr(pipeline, "translate_records", translate)
+    monkeypatch.setattr(jobs.time, "sleep", sleep)
+    with pytest.raises(Idle):
+        jobs.run_worker(store.path, "test")
+
+
+def test_failing_batches_are_retried_then_recorded_as_errors(store, monkeypatch):
+    monkeypatch.setattr(jobs, "job_retry_delay", 0)
+    calls = []
+
+    def translate(smiles_list, retranslate, visualize):
+        calls.append(smiles_list)
+        raise ConnectionError("OPSIN service restarted")
+
+    job_id = store.create(iter(["C", "CC"]))
+    run_one_batch(store, monkeypatch, translate)
+    assert len(calls) == jobs.job_max_attempts
+    job = store.get(job_id)
+    assert job["status"] == "completed" and job["error"] is None
+    results = store.results(job_id, 0, 10)
+    assert all("OPSIN service restarted" in record["error"] for record in results)
+
+
+def test_transient_errors_do_not_fail_the_job(store, monkeypatch):
+    monkeypatch.setattr(jobs, "job_retry_delay", 0)
+    calls = []
+
+    def translate(smiles_list, retranslate, visualize):
+        calls.append(smiles_list)
+        if len(calls) == 1:
+            raise ConnectionError("model service restarted")
+        return [{"Original SMILES": smiles, "IUPAC name": "x"} for smiles in smiles_list]
+
+    job_id = store.create(iter(["C", "CC"]))
+    run_one_batch(store, monkeypatch, translate)
+    assert len(calls) == 2
+    assert all("error" not in record for record in store.results(job_id, 0, 10))
+    assert store.get(job_id)["status"] == "completed"
+
+
+def test_interrupted_uploads_expire(store):
+    def interrupted():
+        yield "C"
+        raise ConnectionError("client went away")
+
+    with pytest.raises(ConnectionError):
+        store.create(interrupted())
+    assert store.expire_uploads(timeout=60) == 0
+    assert store.expire_uploads(timeout=0) == 1
+    with store._connect() as connection:
+        job = dict(connection.execute("SELECT * FROM jobs").fetchone())
+        assert connection.execute("SELECT COUNT(*) FROM job_items").fetchone()[0] == 0
+    assert job["status"] == "failed"
+
+
+def test_cancelled_jobs_can_be_resumed(store):
+    job_id = store.create(iter(["C", "CC"]))
+    store.claim("a", 1)
+    assert store.cancel(job_id)
+    assert store.claim("a", 10) is None
+    assert store.resume(job_id)
+    assert store.get(job_id)["status"] == "queued"
+    assert [item[0] for item in store.claim("a", 10)[1]] == [0, 1]
+
+
+class FakeProcess:
+    """Stands in for a spawned worker process, alive until it is stopped."""
+
+    started = []
+
+    def __init__(self, target, args, name, daemon):
+        self.args = args
+        self.alive = True
+        self.exitcode = None
+
+    def start(self):
+        self.started.append(self)
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.alive = False
+
+    def join(self, timeout=None):
+        pass
+
+
+@pytest.fixture
+def fake_processes(monkeypatch):
+    FakeProcess.started = []
+    context = types.SimpleNamespace(Process=FakeProcess)
+    monkeypatch.setattr(jobs.multiprocessing, "get_context", lambda method: context)
+    yield FakeProcess.started
+    if jobs._workers_lock is not None:
+        jobs._workers_lock.close()
+        jobs._workers_lock = None
+
+
+def test_one_set_of_workers_per_deployment(tmp_path, fake_processes):
+    path = str(tmp_path / "jobs.sqlite")
+    processes = jobs.start_workers(2, path)
+    assert len(processes) == 2
+    lock, jobs._workers_lock = jobs._workers_lock, None
+    # Another web worker finds the lock taken
+    assert jobs.start_workers(2, path) == []
+    jobs._workers_lock = lock
+    jobs.stop_workers(processes)
+
+
+def test_exited_workers_are_restarted_and_their_leases_released(tmp_path, fake_processes, monkeypatch):
+    monkeypatch.setattr(jobs, "restart_delay", 0)
+    path = str(tmp_path / "jobs.sqlite")
+    store = jobs.JobStore(path)
+    job_id = store.create(iter(["C", "CC"]))
+    processes = jobs.start_workers(2, path)
+    first, second = processes
+    _, items = store.claim(first.args[1], 1)
+    assert [item[0] for item in items] == [0]
+    first.alive, first.exitcode = False, -9
+    deadline = time.monotonic() + 5
+    while processes[0] is first and time.monotonic() < deadline:
+        time.sleep(0.05)
+    jobs.stop_workers(processes)
+    assert processes[0] is not first and processes[1] is second
+    assert processes[0].args[1] == first.args[1]
+    # The item leased by the exited worker is claimed again without waiting for the lease
+    _, items = store.claim("other", 2)
+    assert [item[:3] for item in items] == [(0, "C", 2), (1, "CC", 1)]
+    assert store.get(job_id)["status"] == "running"
+
+
+def test_batches_that_keep_stopping_their_worker_are_recorded_as_errors(store, monkeypatch):
+    job_id = store.create(iter(["C"]))
+    for _ in range(jobs.job_max_attempts):
+        store.claim("crashed", 10)
+        store.release_worker("crashed")
+
+    def translate(smiles_list, retranslate, visualize):
+        raise AssertionError("not translated again")
+
+    run_one_batch(store, monkeypatch, translate)
+    assert store.results(job_id, 0, 10)[0]["error"] == "Translation failed: the worker stopped"
+    assert store.get(job_id)["status"] == "completed"
+
+
+def test_job_api(store, monkeypatch):
+    monkeypatch.setattr(jobs_router, "store", store)
+    client = TestClient(app)
+    response = client.post("/latest/jobs/", files={"file": ("library.smi", b"CCO\nc1ccccc1\n")})
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued" and job["total"] == 2
+    page = client.get(f"/latest/jobs/{job['id']}/results", params={"size": 1}).json()
+    assert page["results"] == [{"position": 0, "status": "pending", "Original SMILES": "CCO"}]
+    assert client.delete(f"/latest/jobs/{job['id']}").json()["status"] == "cancelled"
+    assert client.post(f"/latest/jobs/{job['id']}/resume").json()["status"] == "queued"
+    assert client.get("/latest/jobs/unknown").status_code == 404
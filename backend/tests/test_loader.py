@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.modules import jobs, loader
+
+
+@pytest.fixture
+def resources(monkeypatch):
+    registered = {}
+    monkeypatch.setattr(loader, "resources", registered)
+    return registered
+
+
+def test_concurrent_callers_share_one_load(resources):
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.1)
+        return "model"
+
+    resource = loader.register("model", load)
+    threads = [threading.Thread(target=resource.get) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert resource.get() == "model" and len(loads) == 1
+    assert resource.status()["loaded"]
+
+
+def test_failed_loads_are_recorded_and_retried(resources, monkeypatch):
+    attempts = []
+
+    def load():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("weights not downloaded")
+        return "model"
+
+    resource = loader.register("model", load)
+    monkeypatch.setattr(loader, "startup_mode", "lazy")
+    loader.load_all()
+    assert resource.status()["error"] == "weights not downloaded"
+    assert not loader.is_ready()
+    assert resource.get() == "model" and loader.is_ready()
+
+
+def test_eager_modes_are_ready_once_everything_is_loaded(resources, monkeypatch):
+    monkeypatch.setattr(loader, "startup_mode", "background")
+    loader.register("model", lambda: "model")
+    assert not loader.is_ready()
+    loader.start_background_loading().join()
+    assert loader.is_ready()
+
+
+def test_ready_endpoint(resources, monkeypatch):
+    monkeypatch.setattr(loader, "startup_mode", "background")
+    resource = loader.register("model", lambda: "model")
+    client = TestClient(app)
+    response = client.get("/ready")
+    assert response.status_code == 503 and response.json()["components"]["model"]["loaded"] is False
+    resource.get()
+    assert client.get("/ready").status_code == 200
+
+
+def test_lifespan_loads_models_and_runs_job_workers(monkeypatch):
+    events = []
+    monkeypatch.setattr(loader, "startup_mode", "background")
+    monkeypatch.setattr(loader, "start_background_loading", lambda: events.append("load"))
+    monkeypatch.setattr(jobs, "job_workers", 2)
+    monkeypatch.setattr(jobs, "start_workers", lambda count: events.append(("start", count)) or ["w"])
+    monkeypatch.setattr(jobs, "stop_workers", lambda workers: events.append(("stop", workers)))
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+        assert events == ["load", ("start", 2)]
+    assert events[-1] == ("stop", ["w"])
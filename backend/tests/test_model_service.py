@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+from app.modules import ipc, model_service
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """Serves fake model functions on a socket, like run_service does with the models."""
+    monkeypatch.setattr(ipc, "ipc_authkey", b"")
+    address = str(tmp_path / "run" / "models.sock")
+    calls = []
+
+    def decimer(images):
+        calls.append(images)
+        return [f"image {type(image).__name__}" for image in images]
+
+    functions = {
+        "predict_iupac": lambda smiles_list: [smiles.lower() for smiles in smiles_list],
+        "decimer": decimer,
+    }
+    ipc.private_directory(os.path.dirname(address))
+    threading.Thread(target=ipc.serve, args=(address, functions), daemon=True).start()
+    while not os.path.exists(address):
+        time.sleep(0.01)
+    client = ipc.Client([address], timeout=5)
+    monkeypatch.setattr(model_service, "_client", types.SimpleNamespace(get=lambda: client))
+    yield calls
+    client.close()
+
+
+def test_batches_run_in_the_service(service):
+    assert model_service.remote("predict_iupac")(["CCO", "C"]) == ["cco", "c"]
+
+
+def test_decimer_images_are_sent_as_paths_or_contents(service):
+    results = model_service.remote_decimer(["image.png", b"\x89PNG", np.zeros((2, 2), dtype=np.uint8)])
+    assert results == ["image str", "image bytes", "image ndarray"]
+    path, data, array = service[0]
+    assert path == os.path.abspath("image.png")
+    assert data == b"\x89PNG" and array.shape == (2, 2)
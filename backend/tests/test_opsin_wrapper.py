@@ -0,0 +1,71 @@
+import types
+
+import pytest
+
+from app.modules import opsin_wrapper
+from app.modules.translation_cache import opsin_cache
+
+known_names = {"ethanol": "CCO", "methanol": "CO", "acetic acid": "CC(=O)O"}
+
+
+class FakeNameToStructure:
+    """Stands in for OPSIN's NameToStructure without a JVM."""
+
+    def __init__(self):
+        self.parsed = []
+
+    def parseToSmiles(self, name):
+        self.parsed.append(name)
+        return known_names.get(name)
+
+    def parseChemicalName(self, name):
+        return types.SimpleNamespace(getMessage=lambda: f"{name} is not a name")
+
+
+@pytest.fixture
+def opsin(monkeypatch):
+    fake = FakeNameToStructure()
+    monkeypatch.setattr(opsin_wrapper, "_nametostruct", types.SimpleNamespace(get=lambda: fake))
+    monkeypatch.setattr(opsin_wrapper, "_service", None)
+    monkeypatch.setattr(opsin_wrapper, "_parser_pool", None)
+    monkeypatch.setattr(opsin_wrapper, "_attach_thread", lambda: None)
+    opsin_cache.memory.clear()
+    return fake
+
+
+def test_names_are_parsed_once_in_input_order(opsin):
+    results = opsin_wrapper.parse_names(["ethanol", "unknown", "ethanol", " methanol"])
+    assert [result.smiles for result in results] == ["CCO", None, "CCO", "CO"]
+    assert results[1].failure_text.startswith("Failed to convert 'unknown'")
+    assert results[3].name == " methanol"
+    assert opsin.parsed == ["ethanol", "unknown", "methanol"]
+    # Successful names are cached, failures are parsed again
+    opsin_wrapper.parse_names(["ethanol", "unknown"])
+    assert opsin.parsed[3:] == ["unknown"]
+
+
+def test_long_lists_are_parsed_in_chunks_on_the_pool(opsin, monkeypatch):
+    monkeypatch.setattr(opsin_wrapper, "opsin_chunk_size", 2)
+    names = [f"name {i}" for i in range(7)] + ["acetic acid"]
+    results = opsin_wrapper.parse_names(names)
+    assert [result.name for result in results] == names
+    assert results[-1].smiles == "CC(=O)O"
+    assert sorted(opsin.parsed) == sorted(names)
+
+
+def test_needs_retranslation():
+    assert opsin_wrapper.needs_retranslation(0.5, 0.9)
+    assert not opsin_wrapper.needs_retranslation(0.95, 0.9)
+    assert opsin_wrapper.needs_retranslation(None, 0.9)
+    assert opsin_wrapper.needs_retranslation(0.99, None)
+
+
+def test_confident_predictions_are_not_retranslated(opsin):
+    rows = opsin_wrapper.get_opsin_convertion(
+        ["CCO\tethanol", "CO\tethanol", "CC(=O)O\tacetic acid"],
+        confidences=[0.99, 0.5, None],
+        confidence_threshold=0.9,
+    )
+    assert [row.retranslation for row in rows] == ["not retranslated", "not same as input", "same as input"]
+    assert [row.confidence for row in rows] == [0.99, 0.5, None]
+    assert opsin.parsed == ["ethanol", "acetic acid"]
@@ -0,0 +1,32 @@
+from app.modules import rdkit_wrapper
+from app.modules.rdkit_wrapper import canonical_smiles, filter_valid_smiles, same_molecule
+
+
+def test_canonical_smiles_is_kekulized():
+    assert canonical_smiles("c1ccccc1") == canonical_smiles("C1=CC=CC=C1")
+    assert canonical_smiles("not a smiles") is None
+
+
+def test_filter_valid_smiles_keeps_order():
+    assert filter_valid_smiles(["CCO", "C1CC", "c1ccccc1", "X"]) == ["CCO", "c1ccccc1"]
+
+
+def test_same_molecule():
+    assert same_molecule("OCC", "CCO")
+    # Tautomers have the same standard InChIKey
+    assert same_molecule("Oc1ccccn1", "O=c1cccc[nH]1")
+    assert not same_molecule("CCO", "COC")
+    assert not same_molecule("CCO", "not a smiles")
+    assert not same_molecule("not a smiles", "not a smiles")
+
+
+def test_identities_are_memoized(monkeypatch):
+    same_molecule("CCCO", "OCCC")
+    key = rdkit_wrapper.inchikey_from_smiles("CCCO")
+    calls = []
+    monkeypatch.setattr(rdkit_wrapper.Chem, "MolFromSmiles", lambda *args: calls.append(args))
+    assert same_molecule("CCCO", "OCCC")
+    assert rdkit_wrapper.inchikey_from_smiles("CCCO") == key
+    # Spelled differently, the canonical form already has a key
+    assert rdkit_wrapper.inchikey_from_smiles("OCCC") == key
+    assert calls == []
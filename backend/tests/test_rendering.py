@@ -0,0 +1,42 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.modules import rendering, tables
+from app.modules.tables import TranslationRow
+
+
+def test_stream_table_sends_head_rows_and_foot():
+    async def chunks():
+        yield [TranslationRow("CCO", "ethanol")]
+        yield [TranslationRow("C", "methane"), TranslationRow("O", "water")]
+
+    async def collect():
+        return [piece async for piece in rendering.stream_table(chunks(), tables.legacy_columns(False, False))]
+
+    pieces = asyncio.run(collect())
+    assert pieces[0].startswith(rendering.stylesheet) and "<thead>" in pieces[0]
+    assert [piece.count("<tr>") for piece in pieces[1:-1]] == [1, 2]
+    assert pieces[-1] == tables.html_table_foot
+
+
+def test_viewer_renders_a_molecule_or_polls_for_it():
+    assert "molblock-line" in rendering.render_viewer(molecule="molblock-line")
+    assert "/depict/3d/abc" in rendering.render_viewer(conformer_url="/depict/3d/abc")
+
+
+def test_smile2iupac_html_table(stub_models, monkeypatch):
+    monkeypatch.setattr(rendering, "html_chunk_size", 2)
+    lines = "\n".join(["CCO", "CC(=O)O", "c1ccccc1O", "CCO", "invalid"])
+    response = TestClient(app).post(
+        "/latest/stout/SMILE2IUPAC",
+        params={"format": "html", "depictions": "url"},
+        content=lines,
+        headers={"Content-Type": "text/plain"},
+    )
+    assert response.status_code == 200
+    html = response.text
+    # The header and the four valid molecules
+    assert html.count("<tr>") == 5
+    assert "/depict/" in html and html.endswith("</table>")
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import numpy as np
+
+from app.modules.executor import BoundedExecutor
+from app.modules.scheduler import MicroBatcher
+
+
+def run_concurrently(batcher, items):
+    async def main():
+        return await asyncio.gather(
+            *(batcher.submit(item) for item in items), return_exceptions=True
+        )
+
+    return asyncio.run(main())
+
+
+def test_batches_concurrent_submissions():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher("test", double, BoundedExecutor("test", 1, 16), max_batch_size=4, max_wait_ms=50)
+    assert run_concurrently(batcher, range(6)) == [0, 2, 4, 6, 8, 10]
+    assert [len(batch) for batch in calls] == [4, 2]
+    assert batcher.stats()["items"] == 6
+
+
+def test_failed_batch_is_retried_per_item():
+    # Stacking arrays of different shapes fails the whole batch
+    def stack(images):
+        return [int(image.sum()) for image in np.stack(images)]
+
+    batcher = MicroBatcher("test", stack, BoundedExecutor("test", 1, 16), max_batch_size=4, max_wait_ms=50)
+    images = [np.ones((614, 614)), np.ones((613, 613)), np.ones((614, 614))]
+    assert run_concurrently(batcher, images) == [614 * 614, 613 * 613, 614 * 614]
+
+
+def test_only_failing_items_get_the_error():
+    def check(items):
+        if "bad" in items:
+            raise ValueError("bad item")
+        return items
+
+    batcher = MicroBatcher("test", check, BoundedExecutor("test", 1, 16), max_batch_size=4, max_wait_ms=50)
+    results = run_concurrently(batcher, ["a", "bad", "b"])
+    assert results[0] == "a" and results[2] == "b"
+    assert isinstance(results[1], ValueError)
+
+
+def test_concurrent_batches():
+    def slow(items):
+        time.sleep(0.2)
+        return items
+
+    batcher = MicroBatcher(
+        "test", slow, BoundedExecutor("test", 4, 16), max_batch_size=1, max_wait_ms=0, max_concurrent_batches=4
+    )
+    start = time.perf_counter()
+    assert run_concurrently(batcher, range(4)) == [0, 1, 2, 3]
+    assert time.perf_counter() - start < 0.6
@@ -0,0 +1,62 @@
+import asyncio
+import io
+import json
+
+from fastapi.testclient import TestClient
+
+from app.exception_handlers import ServiceOverloadedException
+from app.main import app
+from app.modules import streaming
+
+
+def stream(client, lines):
+    response = client.post(
+        "/latest/stout/SMILE2IUPAC/stream",
+        content="\n".join(lines),
+        headers={"Content-Type": "text/plain"},
+    )
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_stream_has_one_record_per_line(stub_models):
+    lines = stub_models * 50
+    records = stream(TestClient(app), lines)
+    assert [record["Original SMILES"] for record in records] == lines
+    assert all("error" not in record for record in records)
+
+
+def test_unsupported_characters_do_not_abort_the_stream(stub_models):
+    # The stub vocabulary has no Si
+    lines = stub_models * 50 + ["C[Si](C)C"] + stub_models
+    records = stream(TestClient(app), lines)
+    assert len(records) == len(lines)
+    assert records[200] == {"Original SMILES": "C[Si](C)C", "error": "Unsupported characters"}
+    assert sum("error" in record for record in records) == 1
+
+
+def test_invalid_smiles_get_an_error_record(stub_models):
+    records = stream(TestClient(app), ["CCO", "not a smiles", "CCO"])
+    assert len(records) == 3
+    assert "error" in records[1]
+
+
+def test_lines_and_chunks():
+    spool = io.BytesIO(b"CCO\r\n\n  c1ccccc1 \nC\xffC\nCC")
+    lines = list(streaming.iter_lines(spool))
+    assert lines == ["CCO", "c1ccccc1", "C\ufffdC", "CC"]
+    assert list(streaming.iter_chunks(iter(lines), 3)) == [lines[:3], lines[3:]]
+    assert list(streaming.iter_chunks(iter([]), 3)) == []
+
+
+def test_overloaded_calls_are_retried():
+    calls = []
+
+    async def submit(value):
+        calls.append(value)
+        if len(calls) < 3:
+            raise ServiceOverloadedException("stout", retry_after=0)
+        return value
+
+    assert asyncio.run(streaming.retry_when_overloaded(submit, "CCO")) == "CCO"
+    assert calls == ["CCO"] * 3
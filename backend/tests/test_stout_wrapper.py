@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from app.modules import stout_wrapper
+
+start_id, end_id = 1, 2
+
+
+def test_confidence_stops_at_the_first_end_token():
+    # <start> a b <end> c d: tokens after <end> are ignored
+    predicted = np.array([[start_id, 5, 6, end_id, 7, 8]])
+    scores = np.array([[0.5, 0.5, 0.5, 0.01, 0.01]])
+    confidence = stout_wrapper.sequence_confidence(scores, predicted, end_id)
+    assert confidence[0] == pytest.approx(0.5)
+
+
+def test_confidence_of_rows_without_end_token_uses_the_full_width():
+    predicted = np.array([[start_id, 5, 6, 7], [start_id, 5, end_id, 0]])
+    scores = np.array([[0.8, 0.8, 0.2], [0.9, 0.9, 0.1]])
+    confidence = stout_wrapper.sequence_confidence(scores, predicted, end_id)
+    assert confidence[0] == pytest.approx((0.8 * 0.8 * 0.2) ** (1 / 3))
+    assert confidence[1] == pytest.approx(0.9)
+
+
+def test_confidence_passes_single_scores_through():
+    predicted = np.array([[start_id, 5, end_id], [start_id, 6, end_id]])
+    confidence = stout_wrapper.sequence_confidence(np.array([0.7, 0.3]), predicted, end_id)
+    assert confidence.tolist() == [0.7, 0.3]
+    assert np.isnan(stout_wrapper.sequence_confidence(None, predicted, end_id)).all()
+
+
+class FirstRowTranslator:
+    """Translates only the first row of a batch, like a single-sequence export."""
+
+    def __call__(self, tokenized_input):
+        first = np.asarray(tokenized_input)[:1]
+        return np.concatenate([[[start_id]], first + 10, [[end_id]]], axis=1), None
+
+
+def test_batches_with_missing_rows_are_translated_row_by_row():
+    translator = FirstRowTranslator()
+    tokens = np.array([[3, 4], [5, 6], [7, 0]])
+    result, confidences = stout_wrapper.run_translator_scored(translator, tokens, end_id)
+    assert result[:, 1:3].tolist() == [[13, 14], [15, 16], [17, 10]]
+    assert len(confidences) == 3
+    assert translator.single_input
+
+
+class SingleRowTranslator(FirstRowTranslator):
+    """Rejects batches with the given error."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def __call__(self, tokenized_input):
+        if len(tokenized_input) > 1:
+            raise self.error
+        return super().__call__(tokenized_input)
+
+
+def test_rejected_batches_are_translated_row_by_row():
+    translator = SingleRowTranslator(ValueError("expected one row"))
+    tokens = np.array([[3, 4], [5, 6]])
+    result, _ = stout_wrapper.run_translator_scored(translator, tokens, end_id)
+    assert result[:, 1:3].tolist() == [[13, 14], [15, 16]]
+    assert translator.single_input
+
+
+def test_other_translator_errors_are_raised():
+    translator = SingleRowTranslator(RuntimeError("out of memory"))
+    with pytest.raises(RuntimeError, match="out of memory"):
+        stout_wrapper.run_translator_scored(translator, np.array([[3, 4], [5, 6]]), end_id)
+
+
+def test_translate_iupac_covers_every_input(stub_models):
+    smiles_list = ["CCO", "CC(=O)O", "CCO"]
+    predictions = stout_wrapper.translate_IUPAC(smiles_list)
+    assert len(predictions) == len(smiles_list)
+    assert all(prediction.text for prediction in predictions)
+
+
+def test_buckets_end_with_the_model_maximum(monkeypatch):
+    monkeypatch.setattr(stout_wrapper, "length_buckets", (64, 128, 1024))
+    assert stout_wrapper.get_buckets(602) == (64, 128, 602)
+    assert stout_wrapper.bucket_length(10, (64, 128, 602)) == 64
+    assert stout_wrapper.bucket_length(65, (64, 128, 602)) == 128
+    assert stout_wrapper.bucket_length(700, (64, 128, 602)) == 602
+
+
+def test_batches_share_a_bucket(monkeypatch):
+    monkeypatch.setattr(stout_wrapper, "length_buckets", (8, 16))
+    monkeypatch.setattr(stout_wrapper, "batch_size", 2)
+    sentences = ["C C", "C " * 10, "C", "O", "C C C"]
+    batches = list(stout_wrapper.bucket_batches(sentences, 602))
+    assert sorted(i for batch in batches for i in batch) == list(range(5))
+    assert batches == [[0, 2], [3, 4], [1]]
+    assert all(len(batch) <= 2 for batch in batches)
@@ -0,0 +1,57 @@
+import json
+
+import orjson
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.modules import tables
+from app.modules.tables import TranslationRow
+
+rows = [
+    TranslationRow("CCO", "ethanol", confidence=0.9, retranslation="same as input", retranslated_smiles="CCO"),
+    TranslationRow("C<O", "a & b", confidence=None),
+]
+
+
+def test_legacy_json_is_column_oriented():
+    columns = tables.legacy_columns(retranslate=False, visualize=False)
+    assert [name for name, _ in columns] == ["Original SMILES", "Predicted IUPAC name", "Confidence"]
+    assert orjson.loads(tables.to_legacy_json(rows, columns)) == {
+        "Original SMILES": {"1": "CCO", "2": "C<O"},
+        "Predicted IUPAC name": {"1": "ethanol", "2": "a & b"},
+        "Confidence": {"1": 0.9, "2": None},
+    }
+
+
+def test_visualized_retranslated_columns_keep_their_legacy_names():
+    columns = tables.legacy_columns(retranslate=True, visualize=True)
+    assert [name for name, _ in columns].count("Retranslated Structure") == 2
+    assert tables.to_legacy_record(rows[0], columns)["Retranslated SMILES"] == "CCO"
+
+
+def test_records():
+    assert tables.to_records(rows, retranslate=False)[0] == {"smiles": "CCO", "iupac": "ethanol", "confidence": 0.9}
+    assert tables.to_records(rows, retranslate=True)[0]["retranslation"] == "same as input"
+
+
+def test_html_cells_are_escaped():
+    html = tables.to_html(rows, tables.legacy_columns(False, False))
+    assert html.count("<tr>") == 3
+    assert "<td>C&lt;O</td>" in html and "<td>a &amp; b</td>" in html
+    assert html.endswith("</tbody>\n</table>")
+
+
+def test_smile2iupac_formats(stub_models):
+    client = TestClient(app)
+
+    def post(format):
+        return client.post(
+            "/latest/stout/SMILE2IUPAC",
+            params={"format": format},
+            content="CCO\nCC(=O)O",
+            headers={"Content-Type": "text/plain"},
+        )
+
+    assert len(post("text").json()) == 2
+    assert list(json.loads(post("json").content)["Original SMILES"].values()) == ["CCO", "CC(=O)O"]
+    assert [row["smiles"] for row in post("records").json()["rows"]] == ["CCO", "CC(=O)O"]
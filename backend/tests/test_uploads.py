@@ -0,0 +1,118 @@
+import asyncio
+import io
+import threading
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.main import app
+from app.modules import uploads
+from app.modules.uploads import Upload, UploadError, UploadTooLargeError
+from app.routers import decimer as decimer_router
+
+boundary = "boundary123"
+
+
+def multipart(parts):
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+def read(body, content_type=f"multipart/form-data; boundary={boundary}", chunk_size=7, send_length=True, received=None, **kwargs):
+    headers = [(b"content-type", content_type.encode())]
+    if send_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    received = [] if received is None else received
+
+    async def receive():
+        chunk = chunks[len(received)]
+        received.append(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": len(received) < len(chunks)}
+
+    request = Request({"type": "http", "method": "POST", "headers": headers}, receive)
+    result = asyncio.run(uploads.read_uploads(request, **kwargs))
+    return result, received
+
+
+def test_reads_the_files_of_one_field_in_order():
+    body = multipart([("file", "a.png", b"A" * 100), ("comment", None, b"ignored"), ("file", "b.png", b"\r\nB--")])
+    files, _ = read(body, field="file", max_files=2)
+    assert files == [Upload("a.png", b"A" * 100), Upload("b.png", b"\r\nB--")]
+
+
+def test_limits():
+    body = multipart([("file", "a.png", b"A"), ("file", "b.png", b"B")])
+    with pytest.raises(UploadError, match="At most 1"):
+        read(body)
+    with pytest.raises(UploadError, match="No file"):
+        read(multipart([("other", "a.png", b"A")]))
+    with pytest.raises(UploadError, match="multipart/form-data"):
+        read(b"CCO", content_type="text/plain")
+
+
+def test_oversized_bodies_are_rejected_early():
+    body = multipart([("file", "a.png", b"A" * 10000)])
+    received = []
+    with pytest.raises(UploadTooLargeError):
+        read(body, max_bytes=1000, received=received)
+    assert not received
+    # Without Content-Length, reading stops once the limit is exceeded
+    received = []
+    with pytest.raises(UploadTooLargeError):
+        read(body, send_length=False, chunk_size=100, max_bytes=1000, received=received)
+    assert 10 <= len(received) < 20
+
+
+def zip_archive(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_archives_are_expanded_in_place():
+    archive = zip_archive({"x.png": b"X", "dir/": b"", ".hidden": b"H", "__MACOSX/._x.png": b"M", "dir/y.png": b"Y"})
+    files = uploads.expand_archives(
+        [Upload("a.png", b"A"), Upload("images.zip", archive)], max_files=10, max_bytes=1000
+    )
+    assert [file.filename for file in files] == ["a.png", "images.zip/x.png", "images.zip/dir/y.png"]
+
+
+def test_archive_limits():
+    archive = zip_archive({f"{i}.png": b"X" * 100 for i in range(5)})
+    with pytest.raises(UploadError, match="At most 3"):
+        uploads.expand_archives([Upload("images.zip", archive)], max_files=3, max_bytes=10000)
+    with pytest.raises(UploadTooLargeError):
+        uploads.expand_archives([Upload("images.zip", archive)], max_files=10, max_bytes=300)
+    with pytest.raises(UploadError, match="no files"):
+        uploads.expand_archives([Upload("empty.zip", zip_archive({"dir/": b""}))], 10, 1000)
+
+
+def test_endpoint_status_codes(monkeypatch):
+    client = TestClient(app)
+    response = client.post("/latest/decimer/image2SMILES", content=b"CCO", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 400
+    monkeypatch.setattr(decimer_router, "batch_max_bytes", 1000)
+    response = client.post("/latest/decimer/image2SMILES/batch", files=[("files", ("a.png", b"A" * 5000))])
+    assert response.status_code == 413
+
+
+def test_archives_are_expanded_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def expand(*args):
+        threads.append(threading.current_thread())
+        raise UploadError("stop")
+
+    monkeypatch.setattr(decimer_router, "expand_archives", expand)
+    client = TestClient(app)
+    response = client.post("/latest/decimer/image2SMILES/batch", files=[("files", ("a.zip", b"A"))])
+    assert response.status_code == 400
+    assert threads[0].name.startswith("image")
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from app.exception_handlers import InvalidInputException
+from app.modules.vocabulary import Vocabulary, end_token, start_token
+
+
+@pytest.fixture
+def vocabulary():
+    return Vocabulary(["", start_token, end_token, "C", "O", "(", ")", "§"])
+
+
+def test_encode_pads_and_truncates_like_pad_sequences(vocabulary):
+    encoded = vocabulary.encode_batch([["C", "O"], ["C", "(", "O", ")", "C"]], pad_length=4)
+    assert encoded.dtype == np.int32
+    assert encoded.tolist() == [[3, 4, 0, 0], [5, 4, 6, 3]]
+
+
+def test_unknown_tokens(vocabulary):
+    with pytest.raises(InvalidInputException):
+        vocabulary.encode_batch([["C"], ["Si"]], pad_length=4)
+    assert vocabulary.unknown_tokens(["C", "Si", "Br", "Si"]) == ["Si", "Br"]
+    assert vocabulary.known_rows([["C"], ["Si"], ["O", "C"]]).tolist() == [True, False, True]
+
+
+def test_decode_stops_at_the_end_token(vocabulary):
+    predicted = np.array([[1, 3, 7, 4, 2, 3], [1, 3, 99, 4, 0, 0]])
+    assert vocabulary.decode_batch(predicted, replacements={"§": " "}) == ["C O", "CO"]
+    assert vocabulary.decode_batch(predicted, stop_at_end=False)[0] == "C§OC"
+
+
+def test_save_and_load(vocabulary, tmp_path):
+    path = str(tmp_path / "vocabulary.npz")
+    vocabulary.save(path)
+    loaded = Vocabulary.load(path)
+    assert loaded.tokens.tolist() == vocabulary.tokens.tolist()
+    assert (loaded.start_id, loaded.end_id) == (1, 2)